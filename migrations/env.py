@@ -4,22 +4,16 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from sqlmodel import SQLModel
 from src.ton_analyze.models import base
+from src.ton_analyze.db import database_url
 
 from alembic import context
 from dotenv import load_dotenv
-import os
 
 # Загружаем переменные окружения из .env
 load_dotenv()
 
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-db_name = os.getenv("DB_NAME")
-
-# Формируем строку подключения
-SQLALCHEMY_DATABASE_URL = f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+# Строка подключения та же, что у приложения (DATABASE_URL или DB_*)
+SQLALCHEMY_DATABASE_URL = database_url()
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,53 @@
+"""Add unique key on jettonholder (jetton_id, holder_address)
+
+Revision ID: 3f6a1c9b7e20
+Revises: de10d5cc2c6b
+Create Date: 2026-10-18 10:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6a1c9b7e20'
+down_revision: Union[str, None] = 'de10d5cc2c6b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Перед созданием уникального ключа схлопываем дубликаты холдеров:
+    # снимки переназначаем на самую свежую запись, остальные удаляем
+    op.execute("""
+        WITH ranked AS (
+            SELECT id,
+                   max(id) OVER (PARTITION BY jetton_id, holder_address) AS keep_id
+            FROM jettonholder
+        )
+        UPDATE snapshot SET jetton_holder_id = ranked.keep_id
+        FROM ranked
+        WHERE snapshot.jetton_holder_id = ranked.id AND ranked.id <> ranked.keep_id
+    """)
+    op.execute("""
+        DELETE FROM jettonholder
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id,
+                       max(id) OVER (PARTITION BY jetton_id, holder_address) AS keep_id
+                FROM jettonholder
+            ) ranked
+            WHERE id <> keep_id
+        )
+    """)
+    # batch: в SQLite ограничение добавляется пересозданием таблицы, в PostgreSQL - обычным ALTER
+    with op.batch_alter_table('jettonholder') as batch_op:
+        batch_op.create_unique_constraint('uq_jettonholder_jetton_id_holder_address', ['jetton_id', 'holder_address'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('jettonholder') as batch_op:
+        batch_op.drop_constraint('uq_jettonholder_jetton_id_holder_address', type_='unique')
@@ -0,0 +1,117 @@
+"""Store balances as raw NUMERIC(40,0) amounts, add snapshot.jetton_id
+
+Revision ID: 5e8b1f7a0c92
+Revises: d4a9e2c61f07
+Create Date: 2026-10-18 16:40:52.118034
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8b1f7a0c92'
+down_revision: Union[str, None] = 'd4a9e2c61f07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# decimals холдера: жетон мог не сохраниться (jetton_id NULL) - тогда стандартные 9 знаков
+HOLDER_DECIMALS = "COALESCE((SELECT jetton_decimals FROM jetton WHERE jetton.id = jettonholder.jetton_id), 9)"
+
+
+def _numeric(sql):
+    # В SQLite (локальные прогоны) нет приведения ::numeric - типы там приводятся неявно
+    return sql if op.get_bind().dialect.name == "sqlite" else f"{sql}::numeric"
+
+
+def _replace_column(table, column, new_type, nullable, *fill_sql):
+    # Новая колонка заполняется пересчетом старой, затем занимает ее место.
+    # batch: в SQLite смена колонки идет пересозданием таблицы, в PostgreSQL - обычными ALTER
+    op.add_column(table, sa.Column(f'{column}_new', new_type, nullable=True))
+    for sql in fill_sql:
+        op.execute(sql)
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.drop_column(column)
+        batch_op.alter_column(f'{column}_new', new_column_name=column, existing_type=new_type, nullable=nullable)
+
+
+def _to_raw(amount, decimals):
+    return f"round({_numeric(amount)} * power({_numeric('10')}, {decimals}))"
+
+
+def _from_raw(amount, decimals):
+    return f"{amount} / power({_numeric('10')}, {decimals})"
+
+
+def upgrade() -> None:
+    # Во float хранилось количество жетонов (баланс / 10 ** decimals) - возвращаем минимальные единицы
+    _replace_column('jetton', 'total_supply', sa.Numeric(40, 0), True, f"""
+        UPDATE jetton SET total_supply_new = {_to_raw('total_supply', 'jetton_decimals')}
+    """)
+    _replace_column('jettonholder', 'balance', sa.Numeric(40, 0), False, f"""
+        UPDATE jettonholder SET balance_new = {_to_raw('balance', HOLDER_DECIMALS)}
+    """)
+
+    op.add_column('snapshot', sa.Column('jetton_id', sa.Integer(), nullable=True))
+    # Индекс с balance в INCLUDE пересоздается после замены колонки
+    op.drop_index('ix_snapshot_jetton_holder_id_snapshot_date', table_name='snapshot')
+    _replace_column('snapshot', 'balance', sa.Numeric(40, 0), False, f"""
+        UPDATE snapshot SET
+            jetton_id = jettonholder.jetton_id,
+            balance_new = {_to_raw('snapshot.balance', HOLDER_DECIMALS)}
+        FROM jettonholder
+        WHERE jettonholder.id = snapshot.jetton_holder_id
+    """, f"""
+        UPDATE snapshot SET balance_new = {_to_raw('balance', '9')} WHERE balance_new IS NULL
+    """)
+    with op.batch_alter_table('snapshot') as batch_op:
+        batch_op.create_foreign_key('snapshot_jetton_id_fkey', 'jetton', ['jetton_id'], ['id'])
+    op.create_index(
+        'ix_snapshot_jetton_holder_id_snapshot_date', 'snapshot', ['jetton_holder_id', 'snapshot_date'],
+        unique=False, postgresql_include=['balance']
+    )
+    op.create_index('ix_snapshot_jetton_id_snapshot_date', 'snapshot', ['jetton_id', 'snapshot_date'], unique=False)
+
+    _replace_column('snapshot_daily', 'balance', sa.Numeric(40, 0), False, f"""
+        UPDATE snapshot_daily SET
+            balance_new = {_to_raw('snapshot_daily.balance', HOLDER_DECIMALS)}
+        FROM jettonholder
+        WHERE jettonholder.id = snapshot_daily.jetton_holder_id
+    """)
+
+
+def downgrade() -> None:
+    _replace_column('snapshot_daily', 'balance', sa.Float(), False, f"""
+        UPDATE snapshot_daily SET
+            balance_new = {_from_raw('snapshot_daily.balance', HOLDER_DECIMALS)}
+        FROM jettonholder
+        WHERE jettonholder.id = snapshot_daily.jetton_holder_id
+    """)
+
+    op.drop_index('ix_snapshot_jetton_id_snapshot_date', table_name='snapshot')
+    with op.batch_alter_table('snapshot') as batch_op:
+        batch_op.drop_constraint('snapshot_jetton_id_fkey', type_='foreignkey')
+    op.drop_index('ix_snapshot_jetton_holder_id_snapshot_date', table_name='snapshot')
+    _replace_column('snapshot', 'balance', sa.Float(), False, f"""
+        UPDATE snapshot SET balance_new = {_from_raw('snapshot.balance', HOLDER_DECIMALS)}
+        FROM jettonholder
+        WHERE jettonholder.id = snapshot.jetton_holder_id
+    """, f"""
+        UPDATE snapshot SET balance_new = {_from_raw('balance', '9')} WHERE balance_new IS NULL
+    """)
+    op.create_index(
+        'ix_snapshot_jetton_holder_id_snapshot_date', 'snapshot', ['jetton_holder_id', 'snapshot_date'],
+        unique=False, postgresql_include=['balance']
+    )
+    with op.batch_alter_table('snapshot') as batch_op:
+        batch_op.drop_column('jetton_id')
+
+    _replace_column('jettonholder', 'balance', sa.Float(), False, f"""
+        UPDATE jettonholder SET balance_new = {_from_raw('balance', HOLDER_DECIMALS)}
+    """)
+    _replace_column('jetton', 'total_supply', sa.Float(), True, f"""
+        UPDATE jetton SET total_supply_new = {_from_raw('total_supply', 'jetton_decimals')}
+    """)
@@ -0,0 +1,37 @@
+"""Add jetton_price time series
+
+Revision ID: 7b9d3e5a1c60
+Revises: e6f0b2c84d19
+Create Date: 2026-10-18 18:47:09.218351
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b9d3e5a1c60'
+down_revision: Union[str, None] = 'e6f0b2c84d19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('jetton_price',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jetton_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('price_usd', sa.Float(), nullable=False),
+    sa.Column('source', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['jetton_id'], ['jetton.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('jetton_id', 'bucket', name='uq_jetton_price_jetton_id_bucket')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('jetton_price')
@@ -0,0 +1,36 @@
+"""Add indexes for hot lookups and jetton master address
+
+Revision ID: 8c2d4e5f9a13
+Revises: 3f6a1c9b7e20
+Create Date: 2026-10-18 11:05:09.284417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2d4e5f9a13'
+down_revision: Union[str, None] = '3f6a1c9b7e20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('jetton', sa.Column('master_address', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index(op.f('ix_jetton_master_address'), 'jetton', ['master_address'], unique=True)
+    op.create_index(op.f('ix_jetton_jetton_symbol'), 'jetton', ['jetton_symbol'], unique=False)
+    op.create_index(
+        'ix_snapshot_jetton_holder_id_snapshot_date', 'snapshot', ['jetton_holder_id', 'snapshot_date'],
+        unique=False, postgresql_include=['balance']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_snapshot_jetton_holder_id_snapshot_date', table_name='snapshot')
+    op.drop_index(op.f('ix_jetton_jetton_symbol'), table_name='jetton')
+    op.drop_index(op.f('ix_jetton_master_address'), table_name='jetton')
+    op.drop_column('jetton', 'master_address')
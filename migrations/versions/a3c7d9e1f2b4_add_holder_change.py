@@ -0,0 +1,43 @@
+"""Add holder_change table with balance-change events
+
+Revision ID: a3c7d9e1f2b4
+Revises: 5e8b1f7a0c92
+Create Date: 2026-10-18 17:25:31.402716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c7d9e1f2b4'
+down_revision: Union[str, None] = '5e8b1f7a0c92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'holder_change',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('change_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('previous_balance', sa.Numeric(40, 0), nullable=False),
+        sa.Column('balance', sa.Numeric(40, 0), nullable=False),
+        sa.Column('delta', sa.Numeric(40, 0), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.Column('jetton_id', sa.Integer(), nullable=False),
+        sa.Column('jetton_holder_id', sa.Integer(), nullable=False),
+        sa.Column('run_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['jetton_id'], ['jetton.id'], ),
+        sa.ForeignKeyConstraint(['jetton_holder_id'], ['jettonholder.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_holder_change_jetton_id_changed_at', 'holder_change', ['jetton_id', 'changed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_holder_change_jetton_id_changed_at', table_name='holder_change')
+    op.drop_table('holder_change')
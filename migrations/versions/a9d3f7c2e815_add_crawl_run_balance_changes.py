@@ -0,0 +1,36 @@
+"""Add crawl_run.balance_changes
+
+Revision ID: a9d3f7c2e815
+Revises: f2b8c4d6a913
+Create Date: 2026-10-18 21:04:37.582164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3f7c2e815'
+down_revision: Union[str, None] = 'f2b8c4d6a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('crawl_run', sa.Column('balance_changes', sa.Integer(), server_default='0', nullable=False))
+    # Для прошлых обходов известны только записанные события holder_change
+    op.execute(
+        """
+        UPDATE crawl_run SET balance_changes = changes.count
+        FROM (SELECT run_id, count(*) AS count FROM holder_change GROUP BY run_id) AS changes
+        WHERE changes.run_id = crawl_run.id
+        """
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('crawl_run') as batch_op:
+        batch_op.drop_column('balance_changes')
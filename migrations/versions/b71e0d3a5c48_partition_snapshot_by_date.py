@@ -0,0 +1,137 @@
+"""Partition snapshot by snapshot_date, keep only balance changes, add snapshot_daily
+
+Revision ID: b71e0d3a5c48
+Revises: 8c2d4e5f9a13
+Create Date: 2026-10-18 12:31:47.902155
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e0d3a5c48'
+down_revision: Union[str, None] = '8c2d4e5f9a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('snapshot_daily',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('snapshot_day', sa.Date(), nullable=False),
+    sa.Column('snapshot_date', sa.DateTime(), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=False),
+    sa.Column('jetton_holder_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['jetton_holder_id'], ['jettonholder.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('jetton_holder_id', 'snapshot_day', name='uq_snapshot_daily_jetton_holder_id_snapshot_day')
+    )
+
+    if op.get_bind().dialect.name == "sqlite":
+        # В SQLite (локальные прогоны) секций нет: таблица остается прежней, из нее удаляются
+        # снимки без изменения баланса
+        op.execute("""
+            DELETE FROM snapshot WHERE jetton_holder_id IS NULL OR id IN (
+                SELECT id FROM (
+                    SELECT id, balance,
+                           lag(balance) OVER (PARTITION BY jetton_holder_id ORDER BY snapshot_date, id) AS previous_balance
+                    FROM snapshot
+                ) history
+                WHERE previous_balance IS balance
+            )
+        """)
+        return
+
+    # Старую таблицу переименовываем и переливаем в партиционированную.
+    # Ключ партиционирования обязан входить в первичный ключ - PK становится (id, snapshot_date)
+    op.execute("ALTER TABLE snapshot RENAME TO snapshot_legacy")
+    op.execute("ALTER TABLE snapshot_legacy RENAME CONSTRAINT snapshot_pkey TO snapshot_legacy_pkey")
+    op.execute("ALTER INDEX ix_snapshot_jetton_holder_id_snapshot_date RENAME TO ix_snapshot_legacy_holder_date")
+    op.execute("ALTER SEQUENCE snapshot_id_seq RENAME TO snapshot_legacy_id_seq")
+    op.execute("""
+        CREATE TABLE snapshot (
+            id SERIAL NOT NULL,
+            snapshot_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            balance FLOAT NOT NULL,
+            jetton_holder_id INTEGER REFERENCES jettonholder (id),
+            PRIMARY KEY (id, snapshot_date)
+        ) PARTITION BY RANGE (snapshot_date)
+    """)
+    op.execute("CREATE TABLE snapshot_default PARTITION OF snapshot DEFAULT")
+    op.create_index(
+        'ix_snapshot_jetton_holder_id_snapshot_date', 'snapshot', ['jetton_holder_id', 'snapshot_date'],
+        unique=False, postgresql_include=['balance']
+    )
+
+    # Дневные партиции под уже накопленные данные
+    op.execute("""
+        DO $$
+        DECLARE
+            day date;
+        BEGIN
+            FOR day IN SELECT DISTINCT snapshot_date::date FROM snapshot_legacy LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF snapshot FOR VALUES FROM (%L) TO (%L)',
+                    'snapshot_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+                );
+            END LOOP;
+        END $$
+    """)
+
+    # Переносим только строки, где баланс холдера изменился относительно предыдущего снимка
+    op.execute("""
+        INSERT INTO snapshot (id, snapshot_date, balance, jetton_holder_id)
+        SELECT id, snapshot_date, balance, jetton_holder_id
+        FROM (
+            SELECT id, snapshot_date, balance, jetton_holder_id,
+                   lag(balance) OVER (PARTITION BY jetton_holder_id ORDER BY snapshot_date, id) AS previous_balance
+            FROM snapshot_legacy
+            WHERE jetton_holder_id IS NOT NULL
+        ) history
+        WHERE previous_balance IS DISTINCT FROM balance
+    """)
+    op.execute("SELECT setval('snapshot_id_seq', COALESCE((SELECT max(id) FROM snapshot_legacy), 0) + 1, false)")
+    op.execute("DROP TABLE snapshot_legacy")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("""
+            INSERT INTO snapshot (snapshot_date, balance, jetton_holder_id)
+            SELECT snapshot_date, balance, jetton_holder_id FROM snapshot_daily
+        """)
+        op.drop_table('snapshot_daily')
+        return
+
+    op.execute("ALTER TABLE snapshot RENAME TO snapshot_partitioned")
+    op.execute("ALTER TABLE snapshot_partitioned RENAME CONSTRAINT snapshot_pkey TO snapshot_partitioned_pkey")
+    op.execute("ALTER INDEX ix_snapshot_jetton_holder_id_snapshot_date RENAME TO ix_snapshot_partitioned_holder_date")
+    op.execute("ALTER SEQUENCE snapshot_id_seq RENAME TO snapshot_partitioned_id_seq")
+    op.create_table('snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('snapshot_date', sa.DateTime(), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=False),
+    sa.Column('jetton_holder_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['jetton_holder_id'], ['jettonholder.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO snapshot (id, snapshot_date, balance, jetton_holder_id)
+        SELECT id, snapshot_date, balance, jetton_holder_id FROM snapshot_partitioned
+    """)
+    op.execute("SELECT setval('snapshot_id_seq', COALESCE((SELECT max(id) FROM snapshot), 0) + 1, false)")
+    # Дневные свертки возвращаем обычными снимками
+    op.execute("""
+        INSERT INTO snapshot (snapshot_date, balance, jetton_holder_id)
+        SELECT snapshot_date, balance, jetton_holder_id FROM snapshot_daily
+    """)
+    op.execute("DROP TABLE snapshot_partitioned")
+    op.create_index(
+        'ix_snapshot_jetton_holder_id_snapshot_date', 'snapshot', ['jetton_holder_id', 'snapshot_date'],
+        unique=False, postgresql_include=['balance']
+    )
+    op.drop_table('snapshot_daily')
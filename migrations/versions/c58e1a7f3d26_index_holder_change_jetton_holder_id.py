@@ -0,0 +1,27 @@
+"""Index holder_change.jetton_holder_id
+
+Revision ID: c58e1a7f3d26
+Revises: 7b9d3e5a1c60
+Create Date: 2026-10-18 19:21:43.870512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c58e1a7f3d26'
+down_revision: Union[str, None] = '7b9d3e5a1c60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_holder_change_jetton_holder_id'), 'holder_change', ['jetton_holder_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_holder_change_jetton_holder_id'), table_name='holder_change')
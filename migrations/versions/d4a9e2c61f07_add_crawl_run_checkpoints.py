@@ -0,0 +1,42 @@
+"""Add crawl_run checkpoints and jettonholder.last_seen_run_id
+
+Revision ID: d4a9e2c61f07
+Revises: b71e0d3a5c48
+Create Date: 2026-10-18 14:02:16.730561
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9e2c61f07'
+down_revision: Union[str, None] = 'b71e0d3a5c48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('crawl_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jetton_id', sa.Integer(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('last_offset', sa.Integer(), nullable=False),
+    sa.Column('holders_seen', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['jetton_id'], ['jetton.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_crawl_run_jetton_id'), 'crawl_run', ['jetton_id'], unique=False)
+    op.add_column('jettonholder', sa.Column('last_seen_run_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('jettonholder', 'last_seen_run_id')
+    op.drop_index(op.f('ix_crawl_run_jetton_id'), table_name='crawl_run')
+    op.drop_table('crawl_run')
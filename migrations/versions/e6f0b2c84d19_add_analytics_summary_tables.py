@@ -0,0 +1,71 @@
+"""Add per-jetton analytics summary tables
+
+Revision ID: e6f0b2c84d19
+Revises: a3c7d9e1f2b4
+Create Date: 2026-10-18 18:02:14.655210
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f0b2c84d19'
+down_revision: Union[str, None] = 'a3c7d9e1f2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('cohort_summary',
+    sa.Column('jetton_id', sa.Integer(), nullable=False),
+    sa.Column('band', sa.Integer(), nullable=False),
+    sa.Column('holders', sa.Integer(), nullable=False),
+    sa.Column('total_balance', sa.Numeric(40, 0), nullable=False),
+    sa.ForeignKeyConstraint(['jetton_id'], ['jetton.id'], ),
+    sa.PrimaryKeyConstraint('jetton_id', 'band')
+    )
+    op.create_table('top_holder',
+    sa.Column('jetton_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('jetton_holder_id', sa.Integer(), nullable=False),
+    sa.Column('holder_address', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('owner_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('balance', sa.Numeric(40, 0), nullable=False),
+    sa.ForeignKeyConstraint(['jetton_id'], ['jetton.id'], ),
+    sa.ForeignKeyConstraint(['jetton_holder_id'], ['jettonholder.id'], ),
+    sa.PrimaryKeyConstraint('jetton_id', 'rank')
+    )
+    op.create_table('jetton_stats',
+    sa.Column('jetton_id', sa.Integer(), nullable=False),
+    sa.Column('holders', sa.Integer(), nullable=False),
+    sa.Column('total_balance', sa.Numeric(40, 0), nullable=False),
+    sa.Column('top10_share', sa.Float(), nullable=False),
+    sa.Column('top100_share', sa.Float(), nullable=False),
+    sa.Column('liquidity_share', sa.Float(), nullable=False),
+    sa.Column('gini', sa.Float(), nullable=False),
+    sa.Column('hhi', sa.Float(), nullable=False),
+    sa.Column('price_usd', sa.Float(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=True),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['jetton_id'], ['jetton.id'], ),
+    sa.PrimaryKeyConstraint('jetton_id')
+    )
+    op.create_table('holder_count_history',
+    sa.Column('jetton_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('holders', sa.Integer(), nullable=False),
+    sa.Column('total_balance', sa.Numeric(40, 0), nullable=False),
+    sa.ForeignKeyConstraint(['jetton_id'], ['jetton.id'], ),
+    sa.PrimaryKeyConstraint('jetton_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('holder_count_history')
+    op.drop_table('jetton_stats')
+    op.drop_table('top_holder')
+    op.drop_table('cohort_summary')
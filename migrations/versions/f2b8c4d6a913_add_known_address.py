@@ -0,0 +1,79 @@
+"""Add known_address registry, drop jettonholder.owner_name
+
+Revision ID: f2b8c4d6a913
+Revises: c58e1a7f3d26
+Create Date: 2026-10-18 20:12:05.417930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8c4d6a913'
+down_revision: Union[str, None] = 'c58e1a7f3d26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Начальный список пулов и бирж (раньше - KNOWN_LIQUIDITY_POOLS в ton_analize.py)
+SEED_KNOWN_ADDRESSES = [
+    ('0:6bebcc2448012bba42e151f5d140448cf7be8e22a2233d8da3a1423bdc244aac', 'DEX DeDust', 'dex'),
+    ('0:779dcc815138d9500e449c5291e7f12738c23d575b5310000f6a253bd607384e', 'DEX StonFi', 'dex'),
+    ('0:45614fee399c43d77bb597558791831bc0ee31754cbb2b5b1fbf5a3488ed9940', 'CEX xRocket Cold Storage', 'cex'),
+    ('0:011a8f0a0b36b779af033473274966666d1cd6fb4e77df679375fbd6f970d012', 'CEX xRocket Bot', 'cex'),
+    ('0:d887d0e2d1c4fc4126e71c970d33ab1896940000eae703bb1ab6cecc830777e3', 'MEXC 3', 'cex'),
+    ('0:0000000000000000000000000000000000000000000000000000000000000000', 'Burned', 'burn'),
+    ('0:e3fa13950c93bab4f9b7901abd7959f8111e8dabc0aae76e6c6000683068241d', 'Anon Space Staking', 'staking'),
+]
+
+
+def upgrade() -> None:
+    op.create_table('known_address',
+    sa.Column('address', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('label', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('category', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('source', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('address')
+    )
+    # Имена от TonAPI переезжают из jettonholder: одно на адрес, а не на каждую пару (жетон, адрес)
+    op.execute(
+        """
+        INSERT INTO known_address (address, label, category, source, updated_at)
+        SELECT holder_address, max(owner_name), 'other', 'tonapi', CURRENT_TIMESTAMP
+        FROM jettonholder
+        WHERE owner_name IS NOT NULL AND owner_name <> 'Unknown'
+        GROUP BY holder_address
+        """
+    )
+    values = ", ".join(
+        f"('{address}', '{label}', '{category}', 'seed', CURRENT_TIMESTAMP)"
+        for address, label, category in SEED_KNOWN_ADDRESSES
+    )
+    op.execute(
+        f"""
+        INSERT INTO known_address (address, label, category, source, updated_at)
+        VALUES {values}
+        ON CONFLICT (address) DO UPDATE
+        SET label = EXCLUDED.label, category = EXCLUDED.category, source = EXCLUDED.source,
+            updated_at = EXCLUDED.updated_at
+        """
+    )
+    # batch: в SQLite колонка удаляется пересозданием таблицы
+    with op.batch_alter_table('jettonholder') as batch_op:
+        batch_op.drop_column('owner_name')
+
+
+def downgrade() -> None:
+    op.add_column('jettonholder', sa.Column('owner_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.execute(
+        """
+        UPDATE jettonholder SET owner_name = known_address.label
+        FROM known_address
+        WHERE known_address.address = jettonholder.holder_address
+        """
+    )
+    op.drop_table('known_address')
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from dotenv import load_dotenv
+import asyncio
+import os
+import time
+
+load_dotenv()
+
+# Сколько ответов держит кэш бота и сколько секунд ответ живет без инвалидации
+BOT_CACHE_SIZE = int(os.getenv("BOT_CACHE_SIZE", 1024))
+BOT_CACHE_TTL = float(os.getenv("BOT_CACHE_TTL", 60))
+
+
+class ResponseCache:
+    """LRU-кэш ответов с временем жизни ttl и объединением одинаковых запросов.
+
+    Пока ответ на ключ загружается, остальные запросы с тем же ключом ждут ту же загрузку,
+    а не идут в базу сами. У ответа есть теги - id жетонов, из данных которых он собран;
+    tags=None - ответ зависит от всех жетонов (например, поиск холдера по всем жетонам).
+    """
+
+    def __init__(self, maxsize=BOT_CACHE_SIZE, ttl=BOT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # ключ -> (истекает в, ответ, теги)
+        self._loading = {}  # ключ -> Future загрузки
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value, tags=None):
+        self._entries[key] = (time.monotonic() + self.ttl, value, frozenset(tags) if tags is not None else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, key, loader):
+        """Ответ из кэша или результат loader(); loader - корутина, возвращающая (ответ, теги).
+
+        Возвращает (ответ, откуда): "hit" - из кэша, "miss" - загружен этим вызовом,
+        "coalesced" - дождался загрузки, начатой другим запросом.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, "hit"
+
+        task = self._loading.get(key)
+        if task is None:
+            self.misses += 1
+            source = "miss"
+            task = self._loading[key] = asyncio.create_task(self._load(key, loader))
+        else:
+            self.coalesced += 1
+            source = "coalesced"
+        # Загрузка идет отдельной задачей: отмена одного ожидающего не отменяет ее для остальных
+        return await asyncio.shield(task), source
+
+    async def _load(self, key, loader):
+        generation = self._generation
+        try:
+            value, tags = await loader()
+        finally:
+            if self._loading.get(key) is asyncio.current_task():
+                del self._loading[key]
+        # Данные сменились во время загрузки - ответ отдается ожидающим, но не кэшируется
+        if generation == self._generation:
+            self.put(key, value, tags)
+        return value
+
+    def invalidate(self, jetton_id=None):
+        """Удаляет ответы по данным жетона jetton_id и ответы по всем жетонам; без jetton_id - все."""
+        self._generation += 1
+        # Начатые загрузки могли прочитать старые данные: новые запросы их уже не ждут
+        self._loading.clear()
+        if jetton_id is None:
+            self._entries.clear()
+            return
+        for key in [key for key, (_, _, tags) in self._entries.items() if tags is None or jetton_id in tags]:
+            del self._entries[key]
@@ -0,0 +1,101 @@
+from src.telegram_bot.telegram_bot import HolderBot
+from src.ton_analyze.stats import percentile
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+load_dotenv()
+
+
+class StubMessageEvent:
+    """Входящее сообщение в духе events.NewMessage.Event: raw_text и reply()."""
+
+    def __init__(self, raw_text, sender_id=0):
+        self.raw_text = raw_text
+        self.sender_id = sender_id
+        self.replies = []
+
+    async def reply(self, text):
+        self.replies.append(text)
+
+
+class StubTelegramClient:
+    """Локальная замена TelegramClient для проверки бота без сети и токена.
+
+    Обработчики регистрируются так же, как в Telethon (add_event_handler), а send()
+    доставляет им сообщение и возвращает ответ бота (None, если ответа не было).
+    """
+
+    def __init__(self):
+        self.handlers = []
+
+    def add_event_handler(self, callback, event=None):
+        self.handlers.append(callback)
+
+    async def send(self, text, sender_id=0):
+        event = StubMessageEvent(text, sender_id)
+        for handler in self.handlers:
+            await handler(event)
+        return event.replies[-1] if event.replies else None
+
+
+async def burst(client, commands, users):
+    """users одновременных пользователей шлют по случайной команде; задержки ответов в секундах."""
+    rng = random.Random(0)
+
+    async def user(sender_id):
+        text = rng.choice(commands)
+        start_time = time.perf_counter()
+        await client.send(text, sender_id)
+        return time.perf_counter() - start_time
+
+    return await asyncio.gather(*(user(sender_id) for sender_id in range(users)))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Burst of bot commands through a local stub Telegram client")
+    parser.add_argument("--jetton", default=os.getenv("TON_JETTON_ADDRESS"), help="jetton address or symbol")
+    parser.add_argument("--holder", action="append", default=[], help="holder address for /holder (repeatable)")
+    parser.add_argument("--users", type=int, default=1000, help="concurrent users per burst")
+    parser.add_argument("--bursts", type=int, default=5, help="number of bursts")
+    parser.add_argument("--invalidate", action="store_true", help="drop the response cache before every burst")
+    args = parser.parse_args()
+
+    commands = [f"/cohorts {args.jetton}", f"/top {args.jetton}", f"/top {args.jetton} 50"]
+    commands += [f"/holder {address}" for address in args.holder]
+
+    client = StubTelegramClient()
+    bot = HolderBot()
+    bot.register(client)
+    console.log(f"[cyan]{await client.send(commands[0])}[/cyan]")
+
+    table = Table(title=f"{args.users} concurrent users per burst")
+    for column in ("burst", "p50 ms", "p99 ms", "max ms", "db queries", "cache hits", "coalesced"):
+        table.add_column(column, justify="right")
+    for number in range(1, args.bursts + 1):
+        if args.invalidate:
+            bot.cache.invalidate()
+        queries, hits, coalesced = bot.queries, bot.cache.hits, bot.cache.coalesced
+        latencies = await burst(client, commands, args.users)
+        table.add_row(
+            str(number),
+            f"{percentile(latencies, 50) * 1000:.2f}",
+            f"{percentile(latencies, 99) * 1000:.2f}",
+            f"{max(latencies) * 1000:.2f}",
+            str(bot.queries - queries),
+            str(bot.cache.hits - hits),
+            str(bot.cache.coalesced - coalesced),
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,315 @@
+from telethon import TelegramClient, events
+from sqlalchemy import func
+from sqlmodel import select
+from src.telegram_bot.response_cache import ResponseCache
+from src.ton_analyze.address_converter import TONAddressConverter
+from src.ton_analyze.analytics import TOP_HOLDERS_LIMIT, cohort_summary, jetton_stats, top_holders
+from src.ton_analyze.db import DB_POOL_SIZE, get_async_session
+from src.ton_analyze.metrics import BOT_COMMAND_SECONDS, BOT_INVALIDATIONS_TOTAL, metrics_exporter
+from src.ton_analyze.models.base import CrawlRun, Jetton, JettonHolder, JettonStats, KnownAddress, TopHolder
+from dotenv import load_dotenv
+import asyncio
+import os
+import re
+import time
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Доступ к Telegram: api_id/api_hash приложения (my.telegram.org) и токен бота (@BotFather)
+TELEGRAM_API_ID = os.getenv("TELEGRAM_API_ID")
+TELEGRAM_API_HASH = os.getenv("TELEGRAM_API_HASH")
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_SESSION = os.getenv("TELEGRAM_SESSION", "smarty_bot")
+
+# Жетон для команд без аргумента
+BOT_DEFAULT_JETTON = os.getenv("TON_JETTON_ADDRESS")
+BOT_DEFAULT_TOP = int(os.getenv("BOT_DEFAULT_TOP", 10))
+# Как часто (секунды) бот проверяет, не закончился ли новый обход, чтобы сбросить кэш ответов
+BOT_VERSION_POLL_SECONDS = float(os.getenv("BOT_VERSION_POLL_SECONDS", 5))
+# Сколько запросов бота одновременно идут в базу (остальные ждут в процессе, а не в очереди пула)
+BOT_DB_CONCURRENCY = int(os.getenv("BOT_DB_CONCURRENCY", DB_POOL_SIZE))
+
+# Ограничение Telegram на длину сообщения
+MAX_MESSAGE_LENGTH = 4096
+
+# /команда, /команда@имя_бота (в группах) и аргументы через пробел
+COMMAND_PATTERN = re.compile(r"^/(\w+)(?:@\w+)?(?:\s+(.*))?$", re.DOTALL)
+
+HELP_TEXT = (
+    "/cohorts [jetton] - holder cohorts by USD value\n"
+    "/top [jetton] [count] - largest holders\n"
+    "/holder <address> [jetton] - balances of a holder\n"
+    "jetton - master contract address or symbol"
+)
+
+
+# Ответы собираются синхронными функциями: бот выполняет их через AsyncSession.run_sync
+# на общем пуле, а локально их можно вызвать с обычной Session
+
+# Адрес мастер-контракта: raw-форма "workchain:64 hex" или 48 символов user-friendly формы.
+# Короткие hex-строки (ACE, CAFE) - это символы, а не адреса
+RAW_ADDRESS_PATTERN = re.compile(r"^-?\d+:[0-9a-fA-F]{64}$")
+
+
+def master_address(query):
+    """Raw-адрес, если query - полный адрес, иначе None."""
+    if not RAW_ADDRESS_PATTERN.match(query) and len(query) != 48:
+        return None
+    try:
+        return TONAddressConverter.to_raw(query)
+    except ValueError:
+        return None
+
+
+def find_jettons(session, query):
+    """Жетоны по адресу мастер-контракта в любой форме или по символу (без учета регистра).
+
+    Символы у разных жетонов совпадают, поэтому по символу может найтись несколько жетонов.
+    """
+    raw_address = master_address(query)
+    if raw_address is not None:
+        jetton = session.exec(select(Jetton).where(Jetton.master_address == raw_address)).first()
+        if jetton is not None:
+            return [jetton]
+    return session.exec(
+        select(Jetton).where(func.upper(Jetton.jetton_symbol) == query.upper()).order_by(Jetton.id)
+    ).all()
+
+
+def resolve_jetton(session, query):
+    """(жетон, None) или (None, ответ), если жетон не найден или символ неоднозначен."""
+    jettons = find_jettons(session, query)
+    if len(jettons) == 1:
+        return jettons[0], None
+    if not jettons:
+        return None, unknown_jetton(query)
+    return None, ambiguous_jetton(query, jettons)
+
+
+def unknown_jetton(query):
+    # Жетон может появиться после следующего обхода - ответ зависит от всех жетонов
+    return f"Jetton {query} not found", None
+
+
+def ambiguous_jetton(query, jettons):
+    lines = [f"Several jettons have symbol {query}, use the master address:"]
+    for jetton in jettons:
+        address = TONAddressConverter.account_forms(jetton.master_address)["bounceable"]["b64url"] \
+            if jetton.master_address else "address unknown"
+        lines.append(f"{jetton.jetton_name} ({jetton.jetton_symbol}): {address}")
+    # Новый жетон с тем же символом меняет список - ответ зависит от всех жетонов
+    return "\n".join(lines), None
+
+
+def jetton_amount(balance, jetton):
+    return f"{balance / 10 ** jetton.jetton_decimals:,.2f} {jetton.jetton_symbol}"
+
+
+def cohorts_reply(session, jetton_query):
+    jetton, reply = resolve_jetton(session, jetton_query)
+    if jetton is None:
+        return reply
+    stats = jetton_stats(session, jetton.id)
+    if stats is None:
+        return f"No analytics for {jetton.jetton_symbol} yet, wait for the next crawl", (jetton.id,)
+
+    lines = [f"{jetton.jetton_symbol}: {stats.holders:,} holders, price ${stats.price_usd:.6g}"]
+    for name, data in cohort_summary(session, jetton.id).items():
+        lines.append(f"{name}: {data['holders']:,} holders, {data['total_balance']:,.2f} {jetton.jetton_symbol} "
+                     f"(${data['total_value_usd']:,.2f})")
+    lines.append(f"Gini {stats.gini:.4f}, HHI {stats.hhi:.4f}, top 10 share {stats.top10_share:.2%}")
+    lines.append(f"Updated {stats.refreshed_at:%Y-%m-%d %H:%M} UTC")
+    return "\n".join(lines), (jetton.id,)
+
+
+def top_reply(session, jetton_query, limit):
+    jetton, reply = resolve_jetton(session, jetton_query)
+    if jetton is None:
+        return reply
+    holders = top_holders(session, jetton.id, limit)
+    if not holders:
+        return f"No analytics for {jetton.jetton_symbol} yet, wait for the next crawl", (jetton.id,)
+
+    lines = [f"Top {len(holders)} holders of {jetton.jetton_symbol}:"]
+    for holder in holders:
+        owner = f" ({holder.owner_name})" if holder.owner_name else ""
+        lines.append(f"{holder.rank}. {holder.holder_address}{owner} {jetton_amount(holder.balance, jetton)}")
+    return "\n".join(lines), (jetton.id,)
+
+
+def holder_reply(session, address, jetton_query=None):
+    try:
+        raw_address = TONAddressConverter.to_raw(address)
+    except ValueError:
+        return f"Invalid address {address}", ()
+
+    if jetton_query is None:
+        jettons = session.exec(select(Jetton)).all()
+        tags = None
+    else:
+        jetton, reply = resolve_jetton(session, jetton_query)
+        if jetton is None:
+            return reply
+        jettons = [jetton]
+        tags = (jetton.id,)
+
+    # Поиск по ключу (jetton_id, holder_address) для каждого жетона - без сканирования холдеров
+    jettons = {jetton.id: jetton for jetton in jettons}
+    rows = session.exec(select(JettonHolder.jetton_id, JettonHolder.balance, TopHolder.rank)
+                        .outerjoin(TopHolder, TopHolder.jetton_holder_id == JettonHolder.id)
+                        .where(JettonHolder.jetton_id.in_(list(jettons)), JettonHolder.holder_address == raw_address,
+                               JettonHolder.balance > 0)
+                        .order_by(JettonHolder.jetton_id)).all()
+    if not rows:
+        return f"{raw_address} holds no tracked jettons", tags
+
+    lines = [raw_address]
+    # Имя владельца - одно на адрес, из known_address
+    label = session.exec(select(KnownAddress.label).where(KnownAddress.address == raw_address)).first()
+    if label:
+        lines.append(f"Owner: {label}")
+    for jetton_id, balance, rank in rows:
+        rank_text = f", rank {rank}" if rank is not None else ""
+        lines.append(f"{jetton_amount(balance, jettons[jetton_id])}{rank_text}")
+    return "\n".join(lines), tags
+
+
+def data_versions(session):
+    """Версия данных каждого жетона: (время пересчета сводок, конец последнего завершенного обхода)."""
+    versions = {}
+    for jetton_id, refreshed_at in session.exec(select(JettonStats.jetton_id, JettonStats.refreshed_at)):
+        versions[jetton_id] = (refreshed_at, None)
+    finished = select(CrawlRun.jetton_id, func.max(CrawlRun.finished_at)).where(
+        CrawlRun.status == "completed"
+    ).group_by(CrawlRun.jetton_id)
+    for jetton_id, finished_at in session.exec(finished):
+        versions[jetton_id] = (versions.get(jetton_id, (None, None))[0], finished_at)
+    return versions
+
+
+class HolderBot:
+    """Команды бота поверх сводных таблиц аналитики.
+
+    Ответы кэшируются (ResponseCache) и сбрасываются по жетону, когда для него закончился
+    обход или пересчитались сводки. Одинаковые одновременные команды дают один запрос к базе.
+    Запросы идут через общий AsyncEngine: соединение берется из пула на время запроса.
+    """
+
+    def __init__(self, cache=None, session_factory=get_async_session, db_concurrency=BOT_DB_CONCURRENCY,
+                 default_jetton=BOT_DEFAULT_JETTON):
+        self.cache = cache or ResponseCache()
+        self.session_factory = session_factory
+        self.default_jetton = default_jetton
+        self.versions = None
+        self.queries = 0
+        self._db_slots = asyncio.Semaphore(db_concurrency)
+        self.commands = {"cohorts": self.cohorts, "top": self.top, "holder": self.holder}
+
+    async def query(self, reader, *args):
+        """Выполняет reader(session, *args) с синхронной Session поверх соединения из общего пула."""
+        async with self._db_slots:
+            self.queries += 1
+            async with self.session_factory() as session:
+                return await session.run_sync(reader, *args)
+
+    async def cohorts(self, args):
+        jetton_query = args[0] if args else self.default_jetton
+        if jetton_query is None:
+            return "Usage: /cohorts <jetton>", ()
+        return await self.query(cohorts_reply, jetton_query)
+
+    async def top(self, args):
+        # /top, /top 20, /top <jetton>, /top <jetton> 20
+        limit = BOT_DEFAULT_TOP
+        if args and args[-1].isdigit():
+            limit = min(int(args.pop()), TOP_HOLDERS_LIMIT)
+        jetton_query = args[0] if args else self.default_jetton
+        if jetton_query is None or limit < 1:
+            return "Usage: /top <jetton> [count]", ()
+        return await self.query(top_reply, jetton_query, limit)
+
+    async def holder(self, args):
+        if not args:
+            return "Usage: /holder <address> [jetton]", ()
+        return await self.query(holder_reply, args[0], args[1] if len(args) > 1 else None)
+
+    async def handle(self, text):
+        """Ответ на текст сообщения; None - сообщение не команда бота."""
+        match = COMMAND_PATTERN.match(text.strip())
+        if match is None:
+            return None
+        command, args = match.group(1).lower(), (match.group(2) or "").split()
+        if command in ("start", "help"):
+            return HELP_TEXT
+        handler = self.commands.get(command)
+        if handler is None:
+            return None
+
+        start_time = time.perf_counter()
+        reply, source = await self.cache.get_or_load((command, *args), lambda: handler(list(args)))
+        BOT_COMMAND_SECONDS.observe(time.perf_counter() - start_time, command=command, cache=source)
+        return reply
+
+    async def on_message(self, event):
+        try:
+            reply = await self.handle(event.raw_text)
+        except Exception as e:
+            console.log(f"[red]Failed to answer {event.raw_text!r}: {e}[/red]")
+            reply = "Temporary error, please try again later"
+        if reply is not None:
+            await event.reply(reply[:MAX_MESSAGE_LENGTH])
+
+    def register(self, client):
+        """Подписывает бота на входящие команды клиента Telethon (или StubTelegramClient)."""
+        client.add_event_handler(self.on_message, events.NewMessage(incoming=True, pattern=COMMAND_PATTERN))
+
+    async def check_versions(self):
+        """Сбрасывает кэш жетонов, данные которых изменились с прошлой проверки. Возвращает их id."""
+        versions = await self.query(data_versions)
+        changed = set()
+        if self.versions is not None:
+            changed = {jetton_id for jetton_id in versions.keys() | self.versions.keys()
+                       if versions.get(jetton_id) != self.versions.get(jetton_id)}
+        for jetton_id in changed:
+            self.cache.invalidate(jetton_id)
+            BOT_INVALIDATIONS_TOTAL.inc()
+        self.versions = versions
+        return changed
+
+    async def watch_versions(self, interval=BOT_VERSION_POLL_SECONDS):
+        while True:
+            try:
+                changed = await self.check_versions()
+                if changed:
+                    console.log(f"[cyan]New data for jettons {sorted(changed)}, bot cache invalidated[/cyan]")
+            except Exception as e:
+                console.log(f"[yellow]Failed to check data versions: {e}[/yellow]")
+            await asyncio.sleep(interval)
+
+
+async def main():
+    if not (TELEGRAM_API_ID and TELEGRAM_API_HASH and TELEGRAM_BOT_TOKEN):
+        console.log("[red]Set TELEGRAM_API_ID, TELEGRAM_API_HASH and TELEGRAM_BOT_TOKEN[/red]")
+        return
+
+    # Telethon обрабатывает обновления конкурентно: медленный ответ одному чату не задерживает другие
+    client = TelegramClient(TELEGRAM_SESSION, int(TELEGRAM_API_ID), TELEGRAM_API_HASH)
+    bot = HolderBot()
+    bot.register(client)
+    await client.start(bot_token=TELEGRAM_BOT_TOKEN)
+    console.log("[green]Bot started[/green]")
+
+    async with metrics_exporter():
+        watcher = asyncio.create_task(bot.watch_versions())
+        try:
+            await client.run_until_disconnected()
+        finally:
+            watcher.cancel()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
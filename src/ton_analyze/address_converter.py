@@ -0,0 +1,139 @@
+import base64
+import binascii
+
+# user-friendly адрес: тег (1 байт) + workchain (1 байт) + hash (32 байта) + CRC16 (2 байта)
+FRIENDLY_ADDRESS_BYTES = 36
+TEST_ONLY_FLAG = 0x80
+
+# Размер пачки адресов, отправляемой в один процесс пула
+CONVERT_CHUNK_SIZE = 10000
+
+_URLSAFE_TABLE = str.maketrans("+/", "-_")
+
+
+class TONAddressConverter:
+    bounceable_tag = b"\x11"
+    non_bounceable_tag = b"\x51"
+    b64_abc = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890+/")
+    b64_abc_urlsafe = set(
+        "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890_-"
+    )
+
+    @staticmethod
+    def is_int(x):
+        try:
+            int(x)
+            return True
+        except:
+            return False
+
+    @staticmethod
+    def is_hex(x):
+        try:
+            int(x, 16)
+            return True
+        except:
+            return False
+
+    @staticmethod
+    def calcCRC(message):
+        # CRC16-XMODEM (poly 0x1021, init 0): binascii.crc_hqx считает его табличным методом на C
+        return binascii.crc_hqx(message, 0).to_bytes(2, "big")
+
+    @classmethod
+    def account_forms(cls, raw_form, test_only=False):
+        workchain, address = raw_form.split(":")
+        workchain, address = int(workchain), int(address, 16)
+        address = address.to_bytes(32, "big")
+        workchain_tag = b"\xff" if workchain == -1 else workchain.to_bytes(1, "big")
+        btag = cls.bounceable_tag
+        nbtag = cls.non_bounceable_tag
+        if test_only:
+            btag = bytes([btag[0] | TEST_ONLY_FLAG])
+            nbtag = bytes([nbtag[0] | TEST_ONLY_FLAG])
+        preaddr_b = btag + workchain_tag + address
+        preaddr_u = nbtag + workchain_tag + address
+        # CRC считается один раз на форму, url-safe вариант - замена двух символов
+        b64_b = base64.b64encode(preaddr_b + cls.calcCRC(preaddr_b)).decode("utf8")
+        b64_u = base64.b64encode(preaddr_u + cls.calcCRC(preaddr_u)).decode("utf8")
+        b64_b_us = b64_b.translate(_URLSAFE_TABLE)
+        b64_u_us = b64_u.translate(_URLSAFE_TABLE)
+        return {
+            "raw_form": raw_form,
+            "bounceable": {"b64": b64_b, "b64url": b64_b_us},
+            "non_bounceable": {"b64": b64_u, "b64url": b64_u_us},
+            "given_type": "raw_form",
+            "test_only": test_only,
+        }
+
+    @classmethod
+    def read_friendly_address(cls, address):
+        """Разбирает user-friendly адрес (base64 или base64url) и возвращает все его формы."""
+        if len(address) != 48:
+            raise ValueError(f"User-friendly address must be 48 characters long: {address}")
+        if set(address) <= cls.b64_abc_urlsafe:
+            data = base64.urlsafe_b64decode(address)
+        elif set(address) <= cls.b64_abc:
+            data = base64.b64decode(address)
+        else:
+            raise ValueError(f"Not a base64 address: {address}")
+
+        if len(data) != FRIENDLY_ADDRESS_BYTES:
+            raise ValueError(f"Wrong user-friendly address length: {address}")
+        if cls.calcCRC(data[:34]) != data[34:]:
+            raise ValueError(f"Wrong address checksum: {address}")
+
+        tag = data[0]
+        test_only = bool(tag & TEST_ONLY_FLAG)
+        tag &= ~TEST_ONLY_FLAG
+        if tag == cls.bounceable_tag[0]:
+            given_type = "friendly_bounceable"
+        elif tag == cls.non_bounceable_tag[0]:
+            given_type = "friendly_non_bounceable"
+        else:
+            raise ValueError(f"Unknown address tag {tag:#x}: {address}")
+
+        workchain = -1 if data[1] == 0xFF else data[1]
+        forms = cls.account_forms(f"{workchain}:{data[2:34].hex()}", test_only)
+        forms["given_type"] = given_type
+        return forms
+
+    @classmethod
+    def detect_address(cls, unknown_form):
+        if cls.is_hex(unknown_form):
+            return cls.account_forms("-1:" + unknown_form)
+        elif (
+            (":" in unknown_form)
+            and cls.is_int(unknown_form.split(":")[0])
+            and cls.is_hex(unknown_form.split(":")[1])
+        ):
+            return cls.account_forms(unknown_form)
+        else:
+            return cls.read_friendly_address(unknown_form)
+
+    @classmethod
+    def to_raw(cls, unknown_form):
+        """Raw-форма ("workchain:hex") адреса в любом формате - так адреса хранятся в базе."""
+        return cls.detect_address(unknown_form)["raw_form"]
+
+    @classmethod
+    def convert_many(cls, addresses, processes=None, chunk_size=CONVERT_CHUNK_SIZE):
+        """Формы для списка адресов (как detect_address), в том же порядке.
+
+        При processes > 1 пачки по chunk_size адресов разбираются в пуле процессов.
+        """
+        addresses = list(addresses)
+        if not processes or processes <= 1 or len(addresses) <= chunk_size:
+            return [cls.detect_address(address) for address in addresses]
+
+        # Импорт пула процессов заметно дорогой - только когда он действительно нужен
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunks = [addresses[start:start + chunk_size] for start in range(0, len(addresses), chunk_size)]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return [forms for chunk_forms in executor.map(_convert_chunk, chunks) for forms in chunk_forms]
+
+
+def _convert_chunk(addresses):
+    # Функция верхнего уровня - чтобы ее можно было передать в процесс пула
+    return [TONAddressConverter.detect_address(address) for address in addresses]
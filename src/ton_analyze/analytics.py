@@ -0,0 +1,165 @@
+from sqlalchemy import Float, cast, delete, func, insert, literal
+from sqlmodel import select
+from src.ton_analyze.cohorts import COHORT_NAMES, DEFAULT_JETTON_DECIMALS, LIQUIDITY_BAND, cohort_bands_statement, cohorts_from_bands
+from src.ton_analyze.models.base import (
+    CohortSummary, CrawlRun, HolderCountHistory, Jetton, JettonHolder, JettonStats, KnownAddress, TopHolder,
+)
+from dotenv import load_dotenv
+from datetime import datetime
+import os
+import time
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Сколько крупнейших холдеров хранится в top_holder
+TOP_HOLDERS_LIMIT = int(os.getenv("TOP_HOLDERS_LIMIT", 100))
+
+
+def needs_refresh(session, jetton_id, token_price_usd, run_id=None):
+    """Нужно ли пересчитывать сводные таблицы жетона.
+
+    Пересчет нужен, если сводки еще нет, когорты посчитаны по другой цене или обход run_id
+    изменил хотя бы один баланс (crawl_run.balance_changes: в отличие от holder_change, сюда
+    попадают и изменения меньше HOLDER_CHANGE_MIN_RATIO). Без run_id (полная перезагрузка) - всегда.
+    """
+    stats = session.get(JettonStats, jetton_id)
+    if stats is None or stats.price_usd != token_price_usd or run_id is None:
+        return True
+    balance_changes = session.exec(select(CrawlRun.balance_changes).where(CrawlRun.id == run_id)).first()
+    return bool(balance_changes)
+
+
+def concentration_statement(jetton_id):
+    """Количество холдеров, сумма балансов и суммы для коэффициента Джини и HHI одним проходом.
+
+    Джини по балансам x_1 <= ... <= x_n: G = 2 * sum(i * x_i) / (n * sum(x)) - (n + 1) / n.
+    Произведения считаются во float: для долей точность double достаточна, а целые
+    i * x_i и x_i ** 2 переполнили бы INTEGER в SQLite.
+    """
+    balance = cast(JettonHolder.balance, Float)
+    ranked = select(
+        JettonHolder.balance.label("balance"),
+        balance.label("balance_f"),
+        func.row_number().over(order_by=(JettonHolder.balance, JettonHolder.id)).label("rank"),
+    ).where(JettonHolder.jetton_id == jetton_id, JettonHolder.balance > 0).subquery()
+    return select(
+        func.count(),
+        func.coalesce(func.sum(ranked.c.balance), 0),
+        func.coalesce(func.sum(ranked.c.balance_f), 0.0),
+        func.coalesce(func.sum(ranked.c.rank * ranked.c.balance_f), 0.0),
+        func.coalesce(func.sum(ranked.c.balance_f * ranked.c.balance_f), 0.0),
+    )
+
+
+def top_holders_statement(jetton_id, limit):
+    # Имя владельца берется из known_address: в сводке оно хранится рядом с адресом
+    order = (JettonHolder.balance.desc(), JettonHolder.id)
+    return select(
+        literal(jetton_id), func.row_number().over(order_by=order), JettonHolder.id,
+        JettonHolder.holder_address, KnownAddress.label, JettonHolder.balance,
+    ).outerjoin(KnownAddress, KnownAddress.address == JettonHolder.holder_address).where(
+        JettonHolder.jetton_id == jetton_id, JettonHolder.balance > 0
+    ).order_by(*order).limit(limit)
+
+
+def refresh_jetton_analytics(session, jetton_id, token_price_usd, liquidity_addresses=None,
+                             jetton_decimals=DEFAULT_JETTON_DECIMALS, run_id=None, top_limit=TOP_HOLDERS_LIMIT):
+    """Пересчитывает сводные таблицы жетона: когорты, топ холдеров, концентрацию и историю числа холдеров.
+
+    Строки жетона заменяются в одной транзакции: читатели до коммита видят прежнюю сводку
+    и не блокируются (в отличие от REFRESH MATERIALIZED VIEW без CONCURRENTLY),
+    остальные жетоны не затрагиваются. Пулы и CEX - из known_address, если не задан liquidity_addresses.
+    Коммит - здесь же.
+    """
+    start_time = time.perf_counter()
+    refreshed_at = datetime.utcnow()
+
+    bands = session.exec(cohort_bands_statement(
+        session, token_price_usd, liquidity_addresses, jetton_id, jetton_decimals
+    )).all()
+    session.exec(delete(CohortSummary).where(CohortSummary.jetton_id == jetton_id))
+    if bands:
+        session.exec(insert(CohortSummary), params=[
+            {"jetton_id": jetton_id, "band": band, "holders": holders, "total_balance": total_balance}
+            for band, holders, total_balance in bands
+        ])
+
+    session.exec(delete(TopHolder).where(TopHolder.jetton_id == jetton_id))
+    session.exec(insert(TopHolder).from_select(
+        ["jetton_id", "rank", "jetton_holder_id", "holder_address", "owner_name", "balance"],
+        top_holders_statement(jetton_id, top_limit),
+    ))
+    top_share = {
+        rank: session.exec(select(func.coalesce(func.sum(TopHolder.balance), 0)).where(
+            TopHolder.jetton_id == jetton_id, TopHolder.rank <= rank
+        )).one()
+        for rank in (10, 100)
+    }
+
+    holders, total_balance, total_f, weighted_f, squares_f = session.exec(concentration_statement(jetton_id)).one()
+    liquidity_balance = sum(total for band, _, total in bands if band == LIQUIDITY_BAND)
+
+    def share(amount):
+        return float(amount) / float(total_balance) if total_balance else 0.0
+
+    stats = session.get(JettonStats, jetton_id) or JettonStats(jetton_id=jetton_id)
+    stats.holders = holders
+    stats.total_balance = total_balance
+    stats.top10_share = share(top_share[10])
+    stats.top100_share = share(top_share[100])
+    stats.liquidity_share = share(liquidity_balance)
+    stats.gini = 2 * weighted_f / (holders * total_f) - (holders + 1) / holders if total_f else 0.0
+    stats.hhi = squares_f / total_f ** 2 if total_f else 0.0
+    stats.price_usd = token_price_usd
+    stats.run_id = run_id
+    stats.refreshed_at = refreshed_at
+    session.add(stats)
+
+    # История: одна строка на день, в течение дня перезаписывается последним обходом
+    day = refreshed_at.date()
+    session.exec(delete(HolderCountHistory).where(
+        HolderCountHistory.jetton_id == jetton_id, HolderCountHistory.day == day
+    ))
+    session.add(HolderCountHistory(jetton_id=jetton_id, day=day, holders=holders, total_balance=total_balance))
+    session.commit()
+
+    elapsed_time = time.perf_counter() - start_time
+    console.log(f"[cyan]Refreshed analytics for jetton {jetton_id} ({holders} holders) "
+                f"in {elapsed_time:.3f} seconds[/cyan]")
+    return stats
+
+
+# Чтение сводок: поиск по первичному ключу, без обращения к jettonholder
+
+def jetton_stats(session, jetton_id):
+    return session.get(JettonStats, jetton_id)
+
+
+def cohort_summary(session, jetton_id, names=COHORT_NAMES):
+    """Когорты жетона из cohort_summary в формате aggregate_cohorts; None, если сводки еще нет."""
+    stats = session.get(JettonStats, jetton_id)
+    if stats is None:
+        return None
+    jetton = session.get(Jetton, jetton_id)
+    bands = session.exec(select(
+        CohortSummary.band, CohortSummary.holders, CohortSummary.total_balance
+    ).where(CohortSummary.jetton_id == jetton_id))
+    return cohorts_from_bands(bands, stats.price_usd, jetton.jetton_decimals, names)
+
+
+def top_holders(session, jetton_id, limit=TOP_HOLDERS_LIMIT):
+    return session.exec(select(TopHolder).where(
+        TopHolder.jetton_id == jetton_id, TopHolder.rank <= limit
+    ).order_by(TopHolder.rank)).all()
+
+
+def holder_count_history(session, jetton_id, since=None):
+    """Количество холдеров жетона по дням: список HolderCountHistory по возрастанию дня."""
+    statement = select(HolderCountHistory).where(HolderCountHistory.jetton_id == jetton_id)
+    if since is not None:
+        statement = statement.where(HolderCountHistory.day >= since)
+    return session.exec(statement.order_by(HolderCountHistory.day)).all()
@@ -0,0 +1,280 @@
+from sqlmodel import SQLModel, Session, delete, select
+from src.ton_analyze.fake_tonapi import FAKE_JETTON_ADDRESS, FakeTonapi
+from src.ton_analyze.models.base import (
+    CohortSummary, CrawlRun, HolderChange, HolderCountHistory, Jetton, JettonHolder, JettonPrice, JettonStats,
+    Snapshot, SnapshotDaily, TopHolder,
+)
+from src.ton_analyze.rate_limiter import RateLimiter
+from src.ton_analyze.stats import percentile
+from datetime import datetime, timezone
+from functools import partial
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+SCENARIOS = ("fetch", "process", "stream", "sharded", "cohorts")
+
+# Метрики, для которых рост значения - это ухудшение (для остальных ухудшение - падение)
+LOWER_IS_BETTER = ("elapsed_seconds", "page_latency_p50_ms", "page_latency_p99_ms", "peak_rss_mb",
+                   "cohorts_mean_ms", "cohorts_p50_ms", "analytics_refresh_ms", "cohorts_stream_ms")
+
+
+def peak_rss_mb():
+    # ru_maxrss - пик за всю жизнь процесса: в Linux в килобайтах, в macOS в байтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_benchmark_jetton(engine, master_address):
+    """Удаляет синтетический жетон со всеми холдерами, снимками, событиями, сводками и обходами - каждый сценарий пишет с нуля."""
+    with Session(engine) as session:
+        jetton_ids = session.exec(select(Jetton.id).where(Jetton.master_address == master_address)).all()
+        if not jetton_ids:
+            return
+        holder_ids = select(JettonHolder.id).where(JettonHolder.jetton_id.in_(jetton_ids))
+        session.exec(delete(Snapshot).where(Snapshot.jetton_holder_id.in_(holder_ids)))
+        session.exec(delete(SnapshotDaily).where(SnapshotDaily.jetton_holder_id.in_(holder_ids)))
+        session.exec(delete(HolderChange).where(HolderChange.jetton_id.in_(jetton_ids)))
+        for summary in (CohortSummary, TopHolder, JettonStats, HolderCountHistory, JettonPrice):
+            session.exec(delete(summary).where(summary.jetton_id.in_(jetton_ids)))
+        session.exec(delete(JettonHolder).where(JettonHolder.jetton_id.in_(jetton_ids)))
+        session.exec(delete(CrawlRun).where(CrawlRun.jetton_id.in_(jetton_ids)))
+        session.exec(delete(Jetton).where(Jetton.id.in_(jetton_ids)))
+        session.commit()
+
+
+class PageTimer:
+    """Обертка над ton_get_data.fetch_jetton_holders: задержка страницы с точки зрения
+    загрузчика - вместе с ожиданием ограничителя и повторами.
+    """
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.latencies = []
+
+    async def __call__(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return await self.fetch(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start_time)
+
+    def metrics(self):
+        return {
+            "pages": len(self.latencies),
+            "page_latency_p50_ms": round(percentile(self.latencies, 50) * 1000, 2) if self.latencies else None,
+            "page_latency_p99_ms": round(percentile(self.latencies, 99) * 1000, 2) if self.latencies else None,
+        }
+
+
+async def run_scenario(name, args, ton_get_data, ton_analize):
+    from src.ton_analyze.cohort_engine import holder_chunks
+    from src.ton_analyze.db import get_engine, get_session
+
+    tonapi = FakeTonapi(holders=args.holders, latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    limiter = RateLimiter(rate=args.rate, max_in_flight=args.workers)
+    timer = PageTimer(ton_get_data.fetch_jetton_holders)
+    ton_get_data.fetch_jetton_holders = timer
+    reset_benchmark_jetton(get_engine(), FAKE_JETTON_ADDRESS)
+    jetton_info = await tonapi.jettons.get_info(account_id=FAKE_JETTON_ADDRESS)
+
+    result = {}
+    start_time = time.perf_counter()
+    try:
+        if name == "fetch":
+            holders = await ton_get_data.get_all_jetton_holders(tonapi, FAKE_JETTON_ADDRESS, limiter)
+            result["holders"] = len(holders)
+        elif name == "process":
+            # Запись измеряется отдельно от загрузки: список холдеров готовится заранее
+            holders = await ton_get_data.get_all_jetton_holders(tonapi, FAKE_JETTON_ADDRESS, limiter)
+            start_time = time.perf_counter()
+            await ton_get_data.process_jetton_holders(holders, jetton_info)
+            result["holders"] = len(holders)
+        elif name == "stream":
+            result["holders"] = await ton_get_data.stream_jetton_holders(
+                tonapi, FAKE_JETTON_ADDRESS, jetton_info, limiter
+            )
+        elif name == "sharded":
+            # Процессы-шарды создают свои FakeTonapi с теми же параметрами; страницы PageTimer-у не видны
+            tonapi_factory = partial(
+                FakeTonapi, holders=args.holders, latency=args.latency, error_rate=args.error_rate, seed=args.seed
+            )
+            result["shards"] = args.shards
+            result["holders"] = await ton_get_data.stream_jetton_holders_sharded(
+                tonapi_factory, FAKE_JETTON_ADDRESS, jetton_info, args.shards, args.rate
+            )
+        elif name == "cohorts":
+            await ton_get_data.stream_jetton_holders(tonapi, FAKE_JETTON_ADDRESS, jetton_info, limiter)
+            with get_session() as session:
+                jetton_id = ton_get_data.get_or_create_jetton(session, jetton_info).id
+                # Полный пересчет сводных таблиц (без run_id - независимо от изменений)
+                refresh_start = time.perf_counter()
+                ton_analize.refresh_analytics(session, jetton_id)
+                result["analytics_refresh_ms"] = round((time.perf_counter() - refresh_start) * 1000, 2)
+                # Те же когорты по порциям из серверного курсора (cohort_engine) - сверяются с SQL-расчетом
+                jetton = session.get(Jetton, jetton_id)
+                token_price_usd = ton_analize.get_token_price_in_usd(session, jetton_id)
+                stream_start = time.perf_counter()
+                streamed = ton_analize.create_cohorts_from_chunks(
+                    session, holder_chunks(session, jetton_id), token_price_usd, jetton.jetton_decimals
+                )
+                result["cohorts_stream_ms"] = round((time.perf_counter() - stream_start) * 1000, 2)
+                result["cohorts_stream_matches"] = streamed == ton_analize.create_cohorts(session, jetton_id=jetton_id)
+                # Чтение когорт идет из сводки cohort_summary
+                timings = []
+                start_time = time.perf_counter()
+                for _ in range(args.repeat):
+                    cohort_start = time.perf_counter()
+                    cohorts = ton_analize.create_cohorts(session, jetton_id=jetton_id)
+                    timings.append(time.perf_counter() - cohort_start)
+            result["holders"] = sum(cohort["holders"] for cohort in cohorts.values())
+            result["cohorts_mean_ms"] = round(sum(timings) / len(timings) * 1000, 2)
+            result["cohorts_p50_ms"] = round(percentile(timings, 50) * 1000, 2)
+    finally:
+        ton_get_data.fetch_jetton_holders = timer.fetch
+
+    elapsed_time = time.perf_counter() - start_time
+    result["elapsed_seconds"] = round(elapsed_time, 3)
+    if name in ("fetch", "stream", "sharded"):
+        result["holders_per_second"] = round(result["holders"] / elapsed_time, 1) if elapsed_time > 0 else None
+    if name in ("process", "stream", "sharded"):
+        result["db_rows_per_second"] = round(result["holders"] / elapsed_time, 1) if elapsed_time > 0 else None
+    if name not in ("cohorts", "sharded"):
+        result.update(timer.metrics())
+    if name != "sharded":
+        result["api_requests"] = tonapi.requests
+        result["api_errors_injected"] = tonapi.errors_injected
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+
+def compare_with_baseline(results, baseline, max_regression):
+    """Сравнивает метрики с прошлым прогоном. Возвращает список регрессий больше max_regression."""
+    regressions = []
+    table = Table(title=f"Compared with {baseline.get('revision') or 'baseline'}")
+    for column in ("Scenario", "Metric", "Baseline", "Current", "Change"):
+        table.add_column(column)
+
+    for scenario, metrics in results["scenarios"].items():
+        baseline_metrics = baseline.get("scenarios", {}).get(scenario, {})
+        for metric, value in metrics.items():
+            previous = baseline_metrics.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(previous, (int, float)) or not previous:
+                continue
+            if not (metric in LOWER_IS_BETTER or metric.endswith("_per_second")):
+                continue
+            change = (value - previous) / previous
+            worse = change > max_regression if metric in LOWER_IS_BETTER else change < -max_regression
+            if worse:
+                regressions.append(f"{scenario}.{metric}: {previous} -> {value}")
+            table.add_row(scenario, metric, str(previous), str(value),
+                          f"[{'red' if worse else 'green'}]{change:+.1%}[/]")
+    console.print(table)
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark holder ingest and cohort analysis against a fake TonAPI")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated scenarios to run ({', '.join(SCENARIOS)})")
+    parser.add_argument("--holders", type=int, default=10000, help="number of synthetic holders (10k-5M)")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean fake API latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake API responses failing with 429/5xx")
+    parser.add_argument("--rate", type=float, default=1000, help="request rate limit, requests per second")
+    parser.add_argument("--workers", type=int, default=10, help="maximum concurrent API requests")
+    parser.add_argument("--page-size", type=int, default=1000, help="holders per API page (API_LIMIT)")
+    parser.add_argument("--shards", type=int, default=4, help="worker processes in the sharded scenario")
+    parser.add_argument("--repeat", type=int, default=5, help="cohort query repetitions")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic dataset and injected errors")
+    parser.add_argument("--database-url", default=os.getenv("BENCHMARK_DATABASE_URL", "sqlite:///./benchmark.db"),
+                        help="database to benchmark against (local PostgreSQL or SQLite)")
+    parser.add_argument("--db-backend", choices=("sync", "async"), default=os.getenv("DB_BACKEND", "sync"),
+                        help="holder write path: sync (psycopg2 in a thread) or async (asyncpg)")
+    parser.add_argument("--output", help="where to write JSON results (default: benchmark-<revision>-<time>.json)")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="relative slowdown against the baseline that fails the run")
+    parser.add_argument("--verbose", action="store_true", help="keep per-batch ingest logs")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # Подключение к БД, драйвер записи и размер страницы читаются из окружения при импорте
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["API_LIMIT"] = str(args.page_size)
+    os.environ["DB_BACKEND"] = args.db_backend
+    # Бенчмарк работает без сети: цена синтетического жетона - фиксированная
+    os.environ["PRICE_PROVIDER"] = "stub"
+    from src.ton_analyze import ingest, pipeline, ton_analize, ton_get_data
+    from src.ton_analyze.db import get_engine, get_session
+    from src.ton_analyze.known_addresses import seed_known_addresses
+
+    # Схему рабочей БД ведет Alembic; здесь - одноразовая база бенчмарка (для PostgreSQL - уже мигрированная)
+    SQLModel.metadata.create_all(get_engine())
+    with get_session() as session:
+        seed_known_addresses(session)
+
+    if not args.verbose:
+        for module in (ingest, pipeline, ton_get_data):
+            module.console.quiet = True
+
+    results = {
+        "revision": git_revision(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": get_engine().dialect.name,
+        "db_backend": args.db_backend,
+        "parameters": {
+            "holders": args.holders, "latency": args.latency, "error_rate": args.error_rate,
+            "rate": args.rate, "workers": args.workers, "page_size": args.page_size, "shards": args.shards,
+            "repeat": args.repeat, "seed": args.seed,
+        },
+        "scenarios": {},
+    }
+    for scenario in scenarios:
+        console.log(f"[bold cyan]Running {scenario} benchmark on {args.holders} holders...[/bold cyan]")
+        results["scenarios"][scenario] = await run_scenario(scenario, args, ton_get_data, ton_analize)
+        console.log(results["scenarios"][scenario])
+
+    output = args.output or f"benchmark-{results['revision'] or 'unknown'}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    console.log(f"[bold yellow]Benchmark results written to {output}[/bold yellow]")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare_with_baseline(results, json.load(file), args.max_regression)
+        if regressions:
+            console.log("[red]Performance regressions:[/red]\n" + "\n".join(regressions))
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,194 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from bisect import bisect_right
+from sqlmodel import select
+from src.ton_analyze.cohorts import (
+    COHORT_NAMES, COHORT_THRESHOLDS_USD, DEFAULT_JETTON_DECIMALS, LIQUIDITY_BAND, cohorts_from_bands, raw_thresholds,
+)
+from src.ton_analyze.models.base import JettonHolder
+from src.ton_analyze.snapshots import to_utc_naive
+from dotenv import load_dotenv
+import glob
+import os
+
+load_dotenv()
+
+# Сколько холдеров обрабатывается за раз: в памяти одновременно только одна порция
+COHORT_CHUNK_SIZE = int(os.getenv("COHORT_CHUNK_SIZE", 100000))
+
+MASK_64 = 2 ** 64 - 1
+MASK_32 = np.uint64(2 ** 32 - 1)
+
+
+def split_balances(balances):
+    """Балансы порции -> (hi, lo): два массива uint64, баланс = hi * 2 ** 64 + lo.
+
+    Баланс жетона доходит до 2 ** 120 и в int64 не помещается. decimal128 из Parquet
+    раскладывается на слова без копирования, целые из курсора - одним np.array, пока
+    все меньше 2 ** 64 (иначе - поштучно).
+    """
+    if isinstance(balances, pa.ChunkedArray):
+        balances = balances.combine_chunks()
+    if isinstance(balances, pa.Array):
+        if balances.null_count:
+            balances = pc.fill_null(balances, pa.scalar(0, type=pa.int64()).cast(balances.type))
+        if pa.types.is_decimal128(balances.type):
+            if balances.type.scale != 0:
+                raise ValueError(f"Balances must be integer, got {balances.type}")
+            # Значение decimal128 - 16 байт little-endian: младшее слово, затем старшее
+            words = np.frombuffer(balances.buffers()[1], dtype="<u8")
+            words = words[2 * balances.offset:2 * (balances.offset + len(balances))].reshape(-1, 2)
+            return words[:, 1], words[:, 0]
+        balances = balances.to_numpy(zero_copy_only=False)
+    if isinstance(balances, np.ndarray) and balances.dtype.kind in "iu":
+        return np.zeros(len(balances), dtype=np.uint64), balances.astype(np.uint64)
+
+    try:
+        lo = np.array(balances, dtype=np.uint64)
+        return np.zeros(len(lo), dtype=np.uint64), lo
+    except OverflowError:
+        hi = np.fromiter((balance >> 64 for balance in balances), dtype=np.uint64, count=len(balances))
+        lo = np.fromiter((balance & MASK_64 for balance in balances), dtype=np.uint64, count=len(balances))
+        return hi, lo
+
+
+def exact_sum(hi, lo):
+    """Точная сумма балансов (Python int): младшее слово суммируется половинами по 32 бита,
+    поэтому uint64 не переполняется при порциях до 2 ** 32 строк."""
+    total = int((lo & MASK_32).sum(dtype=np.uint64)) + (int((lo >> np.uint64(32)).sum(dtype=np.uint64)) << 32)
+    # Балансы от 2 ** 64 - редкость: старшие слова суммируются без векторизации
+    return total + (sum(int(word) for word in hi[hi != 0]) << 64)
+
+
+class CohortAccumulator:
+    """Частичный агрегат когорт по порциям холдеров.
+
+    Порции (адреса, балансы в минимальных единицах) раскладываются по когортам через
+    np.searchsorted по границам raw_thresholds, адреса пулов/CEX проверяются по хеш-множеству.
+    Агрегаты независимых порций (например, из разных процессов) объединяются merge().
+    Результат совпадает с aggregate_cohorts: суммы точные, нулевые балансы не учитываются.
+    """
+
+    def __init__(self, token_price_usd, excluded_addresses, jetton_decimals=DEFAULT_JETTON_DECIMALS,
+                 thresholds=COHORT_THRESHOLDS_USD):
+        self.token_price_usd = token_price_usd
+        self.jetton_decimals = jetton_decimals
+        self.balance_thresholds = raw_thresholds(thresholds, token_price_usd, jetton_decimals)
+        # Границы меньше 2 ** 64 сравниваются с младшим словом; остальные больше любого такого баланса
+        self._low_thresholds = np.array([t for t in self.balance_thresholds if t <= MASK_64], dtype=np.uint64)
+        self.excluded_addresses = frozenset(excluded_addresses)
+        self._excluded_arrow = pa.array(sorted(self.excluded_addresses), type=pa.string())
+        self.holders = [0] * (len(self.balance_thresholds) + 1)
+        self.totals = [0] * (len(self.balance_thresholds) + 1)
+        self.liquidity_holders = 0
+        self.liquidity_total = 0
+
+    def excluded_mask(self, addresses):
+        if isinstance(addresses, pa.ChunkedArray):
+            addresses = addresses.combine_chunks()
+        if isinstance(addresses, pa.Array):
+            mask = pc.is_in(addresses, value_set=self._excluded_arrow)
+            return pc.fill_null(mask, False).to_numpy(zero_copy_only=False)
+        excluded = self.excluded_addresses
+        return np.fromiter((address in excluded for address in addresses), dtype=bool, count=len(addresses))
+
+    def bands(self, hi, lo):
+        """Номер когорты каждого баланса: количество границ, не превышающих баланс."""
+        bands = np.searchsorted(self._low_thresholds, lo, side="right")
+        for index in np.flatnonzero(hi):
+            bands[index] = bisect_right(self.balance_thresholds, (int(hi[index]) << 64) | int(lo[index]))
+        return bands
+
+    def add(self, addresses, balances):
+        """Добавляет порцию: адреса (список или массив Arrow) и балансы (список int, массив NumPy или Arrow)."""
+        hi, lo = split_balances(balances)
+        positive = (hi != 0) | (lo != 0)
+        excluded = self.excluded_mask(addresses)
+
+        liquidity = excluded & positive
+        self.liquidity_holders += int(np.count_nonzero(liquidity))
+        self.liquidity_total += exact_sum(hi[liquidity], lo[liquidity])
+
+        rest = ~excluded & positive
+        hi, lo = hi[rest], lo[rest]
+        bands = self.bands(hi, lo)
+        counts = np.bincount(bands, minlength=len(self.holders))
+        for band in np.flatnonzero(counts):
+            in_band = bands == band
+            self.holders[band] += int(counts[band])
+            self.totals[band] += exact_sum(hi[in_band], lo[in_band])
+        return self
+
+    def merge(self, other):
+        for band, (holders, total) in enumerate(zip(other.holders, other.totals)):
+            self.holders[band] += holders
+            self.totals[band] += total
+        self.liquidity_holders += other.liquidity_holders
+        self.liquidity_total += other.liquidity_total
+        return self
+
+    def band_rows(self):
+        """Строки (band, holders, total_balance) в формате cohort_bands_statement (пустые когорты пропускаются)."""
+        rows = [
+            (band, holders, total) for band, (holders, total) in enumerate(zip(self.holders, self.totals)) if holders
+        ]
+        if self.liquidity_holders:
+            rows.append((LIQUIDITY_BAND, self.liquidity_holders, self.liquidity_total))
+        return rows
+
+    def cohorts(self, names=COHORT_NAMES):
+        return cohorts_from_bands(self.band_rows(), self.token_price_usd, self.jetton_decimals, names)
+
+
+def holder_chunks(session, jetton_id=None, chunk_size=COHORT_CHUNK_SIZE):
+    """Порции (адреса, балансы) холдеров из серверного курсора: таблица не материализуется целиком."""
+    statement = select(JettonHolder.holder_address, JettonHolder.balance).where(JettonHolder.balance > 0)
+    if jetton_id is not None:
+        statement = statement.where(JettonHolder.jetton_id == jetton_id)
+    result = session.exec(statement.execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        for rows in result.partitions():
+            addresses, balances = zip(*rows)
+            yield addresses, balances
+    finally:
+        result.close()
+
+
+def parquet_chunks(path, chunk_size=COHORT_CHUNK_SIZE, until=None):
+    """Порции (адреса, балансы) из Parquet: файл или каталог с колонками holder_address и balance.
+
+    Для выгрузки снимков (export.py, колонки snapshot_id и jetton_holder_id) берется последний
+    снимок каждого холдера (до момента until): сначала читаются только id, затем строки
+    фильтруются по множеству последних snapshot_id - в памяти не бывает всех адресов сразу.
+    """
+    if os.path.isdir(path):
+        # Недописанные .tmp и _watermark.json в набор не попадают
+        files = sorted(glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True))
+        dataset = ds.dataset(files, format="parquet", partitioning="hive", partition_base_dir=path)
+    else:
+        dataset = ds.dataset(path, format="parquet")
+
+    condition = None
+    if until is not None:
+        condition = ds.field("snapshot_date") < pa.scalar(to_utc_naive(until), type=pa.timestamp("us"))
+    if "snapshot_id" in dataset.schema.names:
+        latest = dataset.to_table(columns=["jetton_holder_id", "snapshot_id"], filter=condition).group_by(
+            "jetton_holder_id"
+        ).aggregate([("snapshot_id", "max")]).column("snapshot_id_max")
+        is_latest = ds.field("snapshot_id").isin(latest)
+        condition = is_latest if condition is None else condition & is_latest
+
+    for batch in dataset.to_batches(columns=["holder_address", "balance"], filter=condition, batch_size=chunk_size):
+        if batch.num_rows:
+            yield batch.column("holder_address"), batch.column("balance")
+
+
+def stream_cohorts(chunks, token_price_usd, excluded_addresses, jetton_decimals=DEFAULT_JETTON_DECIMALS,
+                   thresholds=COHORT_THRESHOLDS_USD, names=COHORT_NAMES):
+    """Когорты по потоку порций (holder_chunks, parquet_chunks) в формате aggregate_cohorts."""
+    accumulator = CohortAccumulator(token_price_usd, excluded_addresses, jetton_decimals, thresholds)
+    for addresses, balances in chunks:
+        accumulator.add(addresses, balances)
+    return accumulator.cohorts(names)
@@ -0,0 +1,143 @@
+from sqlalchemy import String, and_, any_, bindparam, case, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlmodel import select
+from src.ton_analyze.known_addresses import LIQUIDITY_CATEGORIES
+from src.ton_analyze.models.base import JettonHolder, KnownAddress
+from decimal import ROUND_CEILING, Decimal, localcontext
+
+# Границы когорт по стоимости холдинга в USD (последняя когорта - без верхней границы)
+COHORT_THRESHOLDS_USD = (34, 170, 3400, 34000)
+COHORT_NAMES = (
+    "Микро-держатели ($0 - $34)",
+    "Малые держатели ($34 - $170)",
+    "Средние держатели ($170 - $3400)",
+    "Крупные держатели ($3400 - $34,000)",
+    "Сверх-крупные держатели ($34,000+)",
+)
+# Отдельная когорта для пулов ликвидности и биржевых кошельков
+LIQUIDITY_COHORT = "Liquidity Pools & CEX"
+
+# Номер "когорты" пулов в результате GROUP BY
+LIQUIDITY_BAND = -1
+
+# Количество знаков после запятой, если жетон неизвестен
+DEFAULT_JETTON_DECIMALS = 9
+
+# Точность Decimal для пересчета: балансы в минимальных единицах доходят до 40 знаков
+AMOUNT_PRECISION = 80
+
+# Максимальный баланс, который хранит SQLite (INTEGER), - граница когорт не может быть больше
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+
+def empty_cohorts(names=COHORT_NAMES):
+    cohorts = {name: {"holders": 0, "total_balance": 0, "total_value_usd": 0} for name in names}
+    cohorts[LIQUIDITY_COHORT] = {"holders": 0, "total_balance": 0, "total_value_usd": 0}
+    return cohorts
+
+
+def address_in(column, addresses, dialect_name):
+    """Условие "адрес входит в список": в PostgreSQL список уходит одним параметром-массивом."""
+    if dialect_name == "postgresql":
+        return column == any_(bindparam("excluded_addresses", list(addresses), type_=ARRAY(String)))
+    return column.in_(list(addresses))
+
+
+def cohort_band(value, thresholds):
+    """CASE-выражение с номером когорты: 0 для value < thresholds[0], ..., len(thresholds) для остальных."""
+    return case(
+        *((value < threshold, band) for band, threshold in enumerate(thresholds)),
+        else_=len(thresholds),
+    )
+
+
+def raw_thresholds(thresholds_usd, token_price_usd, jetton_decimals):
+    """Границы когорт в минимальных единицах жетона.
+
+    balance * price / 10 ** decimals < threshold  <=>  balance < ceil(threshold * 10 ** decimals / price),
+    поэтому в базе сравниваются целые балансы без умножения каждой строки на цену.
+    """
+    if token_price_usd <= 0:
+        raise ValueError(f"Token price must be positive, got {token_price_usd}")
+    with localcontext() as context:
+        context.prec = AMOUNT_PRECISION
+        scale = Decimal(10) ** jetton_decimals / Decimal(str(token_price_usd))
+        return tuple(
+            int((Decimal(str(threshold)) * scale).to_integral_value(rounding=ROUND_CEILING))
+            for threshold in thresholds_usd
+        )
+
+
+def scale_amount(raw_amount, jetton_decimals):
+    """Количество в минимальных единицах -> количество жетонов (точный Decimal) для вывода."""
+    with localcontext() as context:
+        context.prec = AMOUNT_PRECISION
+        return Decimal(raw_amount) / Decimal(10) ** jetton_decimals
+
+
+def cohort_bands_statement(session, token_price_usd, excluded_addresses=None, jetton_id=None,
+                           jetton_decimals=DEFAULT_JETTON_DECIMALS, thresholds=COHORT_THRESHOLDS_USD):
+    """GROUP BY по когортам: строки (band, holders, total_balance) с суммой в минимальных единицах.
+
+    Пулы и CEX - адреса known_address с категорией из LIQUIDITY_CATEGORIES (join по первичному
+    ключу known_address) или явный список excluded_addresses.
+    """
+    dialect_name = session.get_bind().dialect.name
+    balance_thresholds = raw_thresholds(thresholds, token_price_usd, jetton_decimals)
+    if dialect_name == "sqlite":
+        balance_thresholds = tuple(min(threshold, SQLITE_MAX_INTEGER) for threshold in balance_thresholds)
+    if excluded_addresses is None:
+        excluded = KnownAddress.address.is_not(None)
+    else:
+        excluded = address_in(JettonHolder.holder_address, excluded_addresses, dialect_name)
+    band = case(
+        (excluded, LIQUIDITY_BAND),
+        else_=cohort_band(JettonHolder.balance, balance_thresholds),
+    ).label("band")
+
+    # Подзапрос нужен, чтобы GROUP BY шел по колонке, а не по повторенному CASE с параметрами.
+    # Вышедшие холдеры (нулевой баланс после record_exits) в когорты не попадают
+    rows = select(band, JettonHolder.balance.label("balance")).where(JettonHolder.balance > 0)
+    if excluded_addresses is None:
+        rows = rows.outerjoin(KnownAddress, and_(
+            KnownAddress.address == JettonHolder.holder_address, KnownAddress.category.in_(LIQUIDITY_CATEGORIES)
+        ))
+    if jetton_id is not None:
+        rows = rows.where(JettonHolder.jetton_id == jetton_id)
+    rows = rows.subquery()
+
+    return select(
+        rows.c.band,
+        func.count(),
+        func.coalesce(func.sum(rows.c.balance), 0),
+    ).group_by(rows.c.band)
+
+
+def cohorts_from_bands(bands, token_price_usd, jetton_decimals=DEFAULT_JETTON_DECIMALS, names=COHORT_NAMES):
+    """Строки (band, holders, total_balance) -> словарь когорт с суммами в жетонах и USD (Decimal)."""
+    price = Decimal(str(token_price_usd))
+    cohorts = empty_cohorts(names)
+    for band_index, holders, total_raw in bands:
+        cohort_key = LIQUIDITY_COHORT if band_index == LIQUIDITY_BAND else names[band_index]
+        total_balance = scale_amount(total_raw, jetton_decimals)
+        cohorts[cohort_key] = {
+            "holders": holders,
+            "total_balance": total_balance,
+            "total_value_usd": total_balance * price,
+        }
+    return cohorts
+
+
+def aggregate_cohorts(session, token_price_usd, excluded_addresses=None, jetton_id=None,
+                      jetton_decimals=DEFAULT_JETTON_DECIMALS, thresholds=COHORT_THRESHOLDS_USD, names=COHORT_NAMES):
+    """Считает когорты одним GROUP BY в базе: в Python возвращается по строке на когорту.
+
+    Пулы/CEX (known_address или явный список excluded_addresses) выделяются в отдельную когорту.
+    Если jetton_id не задан, считаются все холдеры в таблице.
+    Суммы в базе точные (целые минимальные единицы), на 10 ** jetton_decimals они делятся
+    уже здесь: total_balance и total_value_usd - Decimal.
+    """
+    statement = cohort_bands_statement(
+        session, token_price_usd, excluded_addresses, jetton_id, jetton_decimals, thresholds
+    )
+    return cohorts_from_bands(session.exec(statement), token_price_usd, jetton_decimals, names)
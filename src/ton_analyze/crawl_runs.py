@@ -0,0 +1,73 @@
+from sqlalchemy import update
+from sqlmodel import select
+from src.ton_analyze.models.base import CrawlRun
+from dotenv import load_dotenv
+from datetime import datetime, timedelta
+import os
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Незавершенный обход старше этого возраста не продолжается, а начинается заново
+CRAWL_RESUME_MAX_AGE_HOURS = float(os.getenv("CRAWL_RESUME_MAX_AGE_HOURS", 24))
+
+
+def start_or_resume_run(session, jetton_id):
+    """Возвращает обход жетона: последний незавершенный (если он достаточно свежий) или новый."""
+    statement = select(CrawlRun).where(
+        CrawlRun.jetton_id == jetton_id, CrawlRun.status.in_(("running", "failed"))
+    ).order_by(CrawlRun.id.desc())
+    unfinished = session.exec(statement).first()
+
+    if unfinished is not None:
+        if datetime.utcnow() - unfinished.updated_at <= timedelta(hours=CRAWL_RESUME_MAX_AGE_HOURS):
+            unfinished.status = "running"
+            unfinished.updated_at = datetime.utcnow()
+            session.add(unfinished)
+            session.commit()
+            session.refresh(unfinished)
+            console.log(f"[cyan]Resuming crawl run {unfinished.id} from offset {unfinished.last_offset}[/cyan]")
+            return unfinished
+        # Слишком старый обход: данные в нем уже неактуальны
+        unfinished.status = "abandoned"
+        session.add(unfinished)
+
+    run = CrawlRun(jetton_id=jetton_id)
+    session.add(run)
+    session.commit()
+    session.refresh(run)
+    return run
+
+
+def checkpoint_statement(run_id, last_offset, holders_written, balance_changes=0):
+    values = {
+        "holders_seen": CrawlRun.holders_seen + holders_written,
+        "balance_changes": CrawlRun.balance_changes + balance_changes,
+        "updated_at": datetime.utcnow(),
+    }
+    if last_offset is not None:
+        values["last_offset"] = last_offset
+    return update(CrawlRun).where(CrawlRun.id == run_id).values(**values)
+
+
+def checkpoint_run(session, run_id, last_offset, holders_written, balance_changes=0):
+    """Сдвигает чекпоинт обхода. Вызывается в той же транзакции, что и запись пакета.
+
+    last_offset=None - счетчик холдеров растет, а чекпоинт стоит на месте (шарды обхода пишут
+    разные диапазоны offset-ов, общей границы записанных страниц у них нет).
+    balance_changes - сколько балансов изменил пакет (по нему решается, пересчитывать ли сводки).
+    """
+    session.exec(checkpoint_statement(run_id, last_offset, holders_written, balance_changes))
+
+
+async def checkpoint_run_async(session, run_id, last_offset, holders_written, balance_changes=0):
+    await session.exec(checkpoint_statement(run_id, last_offset, holders_written, balance_changes))
+
+
+def finish_run(session, run_id, status):
+    now = datetime.utcnow()
+    session.exec(update(CrawlRun).where(CrawlRun.id == run_id).values(status=status, updated_at=now, finished_at=now))
+    session.commit()
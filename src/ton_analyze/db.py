@@ -0,0 +1,104 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Пул соединений: постоянные соединения, дополнительные при пиках, пересоздание старых (секунды)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Ограничение времени одного запроса в PostgreSQL (миллисекунды, 0 - без ограничения)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+
+# Синхронные драйверы и их асинхронные замены
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+# Engine-ы создаются при первом обращении: импорт модулей не открывает соединений и не выполняет DDL
+_engine = None
+_async_engine = None
+
+
+def database_url():
+    """Адрес БД: DATABASE_URL из окружения или PostgreSQL из DB_*."""
+    return os.getenv("DATABASE_URL") or f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}" \
+                                        f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+
+
+def async_database_url(url):
+    """Тот же адрес с асинхронным драйвером (asyncpg для PostgreSQL, aiosqlite для SQLite)."""
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+def is_async_backend():
+    """Драйвер записи холдеров из DB_BACKEND: sync (psycopg2 в отдельном потоке) или async (asyncpg
+    в цикле событий). Читается при вызове, как и DATABASE_URL: окружение можно задать после импорта."""
+    backend = os.getenv("DB_BACKEND", "sync")
+    if backend not in ("sync", "async"):
+        raise ValueError(f"Unknown DB_BACKEND {backend!r}: expected 'sync' or 'async'")
+    return backend == "async"
+
+
+def engine_options(url):
+    """Настройки пула и таймаута запросов для create_engine/create_async_engine по адресу БД."""
+    if url.startswith("sqlite"):
+        return {}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS:
+        if url.startswith("postgresql+asyncpg"):
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def get_engine():
+    """Общий Engine процесса. Схема БД создается миграциями Alembic (alembic upgrade head)."""
+    global _engine
+    if _engine is None:
+        url = database_url()
+        _engine = create_engine(url, **engine_options(url))
+    return _engine
+
+
+def get_async_engine():
+    """Общий AsyncEngine процесса с теми же настройками пула."""
+    global _async_engine
+    if _async_engine is None:
+        url = async_database_url(database_url())
+        _async_engine = create_async_engine(url, **engine_options(url))
+    return _async_engine
+
+
+def dialect_insert(session):
+    """insert() диалекта сессии: INSERT ... ON CONFLICT есть и в PostgreSQL, и в SQLite (локальные прогоны)."""
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+def get_session():
+    return Session(get_engine())
+
+
+def get_async_session():
+    """AsyncSession на общем AsyncEngine. Атрибуты не сбрасываются после commit: неявная
+    подгрузка в async-сессии невозможна.
+    """
+    return AsyncSession(get_async_engine(), expire_on_commit=False)
@@ -0,0 +1,250 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import and_, func, or_
+from sqlmodel import select
+from src.ton_analyze.db import get_session
+from src.ton_analyze.models.base import CrawlRun, JettonHolder, Snapshot
+from src.ton_analyze.snapshots import to_utc_naive
+from src.ton_analyze.ton_analize import find_jetton
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import shutil
+import time
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Каталог выгрузки и размер порции, которую курсор отдает из БД за раз (ограничивает память)
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 50000))
+EXPORT_COMPRESSION = os.getenv("EXPORT_COMPRESSION", "zstd")
+# Строк в группе Parquet: словарь адресов общий на группу, поэтому чем она больше, тем чаще адрес
+# повторяется внутри одного словаря (500k строк - около 60 МБ в памяти на время записи)
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", 500000))
+# Лимит страницы словаря: при переполнении Parquet молча переходит на PLAIN-кодирование
+EXPORT_DICTIONARY_PAGE_LIMIT = 64 * 1024 * 1024
+
+WATERMARK_FILE = "_watermark.json"
+
+# Баланс жетона в TON - VarUInteger 16 (меньше 2^120), поэтому помещается в decimal128(38, 0) без потерь
+SNAPSHOT_SCHEMA = pa.schema([
+    ("snapshot_id", pa.int64()),
+    ("snapshot_date", pa.timestamp("us")),
+    ("jetton_holder_id", pa.int64()),
+    ("holder_address", pa.string()),
+    ("balance", pa.decimal128(38, 0)),
+])
+
+
+def jetton_export_dir(output_dir, jetton_id, suffix=""):
+    # Служебные каталоги (suffix) начинаются с точки: glob и pyarrow.dataset их не читают
+    return os.path.join(output_dir, f".jetton_id={jetton_id}{suffix}" if suffix else f"jetton_id={jetton_id}")
+
+
+def read_watermark(directory):
+    """Последний выгруженный снимок жетона (каталог jetton_export_dir): (snapshot_date, snapshot_id) или None."""
+    path = os.path.join(directory, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        watermark = json.load(file)
+    return datetime.fromisoformat(watermark["snapshot_date"]), watermark["snapshot_id"]
+
+
+def write_watermark(directory, snapshot_date, snapshot_id):
+    # Через временный файл: после сбоя остается либо старая, либо новая отметка целиком
+    path = os.path.join(directory, WATERMARK_FILE)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump({"snapshot_date": snapshot_date.isoformat(), "snapshot_id": snapshot_id}, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def export_cutoff(session, jetton_id, until=None):
+    """Верхняя граница выгрузки (не включительно).
+
+    Снимки незавершенного обхода еще дописываются (и могут коммититься не по порядку id),
+    поэтому граница не позже начала самого раннего обхода жетона в статусе running.
+    """
+    cutoff = to_utc_naive(until or datetime.now(timezone.utc))
+    running_since = session.exec(select(func.min(CrawlRun.started_at)).where(
+        CrawlRun.jetton_id == jetton_id, CrawlRun.status == "running"
+    )).one()
+    if running_since is not None and running_since < cutoff:
+        console.log(f"[yellow]Crawl of jetton {jetton_id} is running since {running_since}, "
+                    f"exporting snapshots before it[/yellow]")
+        cutoff = running_since
+    return cutoff
+
+
+def snapshot_export_statement(jetton_id, since=None, cutoff=None, watermark=None):
+    statement = select(
+        Snapshot.id, Snapshot.snapshot_date, Snapshot.jetton_holder_id, JettonHolder.holder_address, Snapshot.balance,
+    ).join(JettonHolder, JettonHolder.id == Snapshot.jetton_holder_id).where(Snapshot.jetton_id == jetton_id)
+    if since is not None:
+        statement = statement.where(Snapshot.snapshot_date >= to_utc_naive(since))
+    if cutoff is not None:
+        statement = statement.where(Snapshot.snapshot_date < cutoff)
+    if watermark is not None:
+        watermark_date, watermark_id = watermark
+        statement = statement.where(or_(
+            Snapshot.snapshot_date > watermark_date,
+            and_(Snapshot.snapshot_date == watermark_date, Snapshot.id > watermark_id),
+        ))
+    return statement.order_by(Snapshot.snapshot_date, Snapshot.id)
+
+
+class DailyParquetWriter:
+    """Пишет упорядоченные по времени порции снимков в файлы по дням:
+    <directory>/day=<дата>/part-<первый snapshot_id>-<последний snapshot_id>.parquet.
+
+    Файл пишется под временным именем и переименовывается при закрытии, после чего
+    сдвигается отметка выгрузки - повторный запуск после сбоя продолжит с закрытого дня.
+    Имя определяется диапазоном снимков: повторная выгрузка того же диапазона заменяет файл.
+    """
+
+    def __init__(self, directory, compression=EXPORT_COMPRESSION, row_group_size=EXPORT_ROW_GROUP_SIZE):
+        self.directory = directory
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.batches = []
+        self.buffered = 0
+        self.day = None
+        self.writer = None
+        self.path = None
+        self.first_id = None
+        self.last_row = None
+        self.files = []
+
+    def open(self, day, first_id):
+        directory = os.path.join(self.directory, f"day={day.isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        self.day = day
+        self.first_id = first_id
+        self.path = os.path.join(directory, f"part-{first_id}.parquet.tmp")
+        # Адреса повторяются из снимка в снимок - словарное кодирование сжимает их до номеров в словаре
+        self.writer = pq.ParquetWriter(
+            self.path, SNAPSHOT_SCHEMA, compression=self.compression, use_dictionary=["holder_address"],
+            dictionary_pagesize_limit=EXPORT_DICTIONARY_PAGE_LIMIT,
+        )
+
+    def flush(self):
+        # Каждый вызов write_table - отдельная группа строк, поэтому порции копятся до row_group_size
+        if self.batches:
+            self.writer.write_table(pa.Table.from_batches(self.batches), row_group_size=self.row_group_size)
+            self.batches = []
+            self.buffered = 0
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        snapshot_id, snapshot_date = self.last_row
+        path = os.path.join(os.path.dirname(self.path), f"part-{self.first_id}-{snapshot_id}.parquet")
+        os.replace(self.path, path)
+        self.files.append(path)
+        write_watermark(self.directory, snapshot_date, snapshot_id)
+        self.writer = None
+
+    def write_rows(self, rows):
+        """Порция строк (snapshot_id, snapshot_date, jetton_holder_id, holder_address, balance)."""
+        start = 0
+        while start < len(rows):
+            day = rows[start][1].date()
+            end = start
+            while end < len(rows) and rows[end][1].date() == day:
+                end += 1
+            if day != self.day:
+                self.close()
+                self.open(day, rows[start][0])
+            columns = list(zip(*rows[start:end]))
+            self.batches.append(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, SNAPSHOT_SCHEMA)],
+                schema=SNAPSHOT_SCHEMA,
+            ))
+            self.buffered += end - start
+            if self.buffered >= self.row_group_size:
+                self.flush()
+            self.last_row = rows[end - 1][0], rows[end - 1][1]
+            start = end
+
+
+def export_snapshots(session, jetton_id, output_dir=EXPORT_DIR, since=None, until=None, full=False,
+                     chunk_size=EXPORT_CHUNK_SIZE):
+    """Выгружает снимки балансов жетона в Parquet по дням, продолжая с отметки прошлой выгрузки.
+
+    Строки читаются серверным курсором (stream_results) порциями по chunk_size: в памяти
+    одновременно не больше одной порции.
+
+    full=True игнорирует отметку: выгрузка пишется в отдельный каталог и целиком заменяет прежние
+    файлы жетона (с since в наборе остаются только снимки с этого момента). Прежние файлы не
+    смешиваются с новыми, а читатели до замены видят старый набор.
+    Возвращает (количество строк, список записанных файлов).
+    """
+    start_time = time.perf_counter()
+    target = jetton_export_dir(output_dir, jetton_id)
+    if full:
+        directory = jetton_export_dir(output_dir, jetton_id, ".staging")
+        shutil.rmtree(directory, ignore_errors=True)
+    else:
+        directory = target
+    os.makedirs(directory, exist_ok=True)
+    watermark = None if full else read_watermark(directory)
+    cutoff = export_cutoff(session, jetton_id, until)
+    statement = snapshot_export_statement(jetton_id, since, cutoff, watermark)
+
+    writer = DailyParquetWriter(directory)
+    exported = 0
+    result = session.exec(statement.execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        for rows in result.partitions():
+            writer.write_rows(rows)
+            exported += len(rows)
+    finally:
+        result.close()
+    writer.close()
+
+    files = writer.files
+    if full:
+        replaced = jetton_export_dir(output_dir, jetton_id, ".replaced")
+        shutil.rmtree(replaced, ignore_errors=True)
+        if os.path.exists(target):
+            os.replace(target, replaced)
+        os.replace(directory, target)
+        shutil.rmtree(replaced, ignore_errors=True)
+        files = [os.path.join(target, os.path.relpath(path, directory)) for path in files]
+
+    elapsed_time = time.perf_counter() - start_time
+    speed = exported / elapsed_time if elapsed_time > 0 else 0
+    console.log(f"[bold yellow]Exported {exported} snapshots of jetton {jetton_id} into {len(files)} files "
+                f"in {elapsed_time:.2f} seconds ({speed:.2f} rows/second)[/bold yellow]")
+    return exported, files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export holder balance snapshots into daily Parquet files")
+    parser.add_argument("--jetton", default=os.getenv("TON_JETTON_ADDRESS"),
+                        help="jetton master address (default: TON_JETTON_ADDRESS)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="export snapshots from this UTC time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="export snapshots before this UTC time")
+    parser.add_argument("--output-dir", default=EXPORT_DIR, help="root directory of the Parquet dataset")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="rows fetched from the cursor at once")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and export everything again")
+    args = parser.parse_args()
+
+    with get_session() as session:
+        jetton = find_jetton(session, args.jetton) if args.jetton else None
+        if jetton is None:
+            console.log(f"[red]Jetton {args.jetton} not found in the database[/red]")
+            return
+        export_snapshots(session, jetton.id, args.output_dir, args.since, args.until, args.full, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from pytonapi.exceptions import TONAPIError, TONAPITooManyRequestsError
+from pytonapi.schema.jettons import JettonHolders, JettonInfo
+import asyncio
+import hashlib
+import random
+
+# Адрес мастер-контракта синтетического жетона
+FAKE_JETTON_ADDRESS = "0:" + "be" * 32
+
+# Доля холдеров с именем владельца (биржи, пулы и т.п.)
+NAMED_OWNER_EVERY = 100
+
+
+def holder_address(seed, index):
+    """Детерминированный raw-адрес index-го холдера синтетического набора."""
+    return "0:" + hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=32).hexdigest()
+
+
+class FakeJettons:
+    """Подмена tonapi.jettons: отдает синтетических холдеров страницами, как TonAPI."""
+
+    def __init__(self, tonapi):
+        self.tonapi = tonapi
+
+    async def get_info(self, account_id):
+        tonapi = self.tonapi
+        await tonapi.respond()
+        return JettonInfo.model_validate({
+            "mintable": False,
+            "total_supply": str(tonapi.total_supply),
+            "metadata": {
+                "address": account_id,
+                "name": f"Benchmark Jetton {tonapi.seed}",
+                "symbol": "BENCH",
+                "decimals": str(tonapi.decimals),
+            },
+            "verification": "none",
+            "holders_count": tonapi.holders,
+        })
+
+    async def get_holders(self, account_id, limit=1000, offset=0):
+        tonapi = self.tonapi
+        await tonapi.respond()
+        # Ответ собирается из JSON-подобного словаря тем же pydantic-разбором, что и в настоящем клиенте
+        return JettonHolders.model_validate({
+            "addresses": [tonapi.holder(index) for index in range(offset, min(offset + limit, tonapi.holders))],
+            "total": tonapi.holders,
+        })
+
+
+class FakeTonapi:
+    """Локальная замена AsyncTonapi для бенчмарков: без сети и API-ключа.
+
+    Холдеры генерируются на лету (в памяти ничего не хранится), отсортированы по убыванию
+    баланса, балансы распределены по степенному закону, как у реальных жетонов.
+    latency - средняя задержка ответа в секундах (с разбросом +-50%),
+    error_rate - доля ответов с ошибкой 429 или 5xx.
+    """
+
+    def __init__(self, holders=10000, latency=0.05, error_rate=0.0, decimals=9, seed=0, top_balance=10 ** 8):
+        self.holders = holders
+        self.latency = latency
+        self.error_rate = error_rate
+        self.decimals = decimals
+        self.seed = seed
+        self.top_balance = top_balance
+        self.requests = 0
+        self.errors_injected = 0
+        self.random = random.Random(seed)
+        self.jettons = FakeJettons(self)
+
+    @property
+    def total_supply(self):
+        # Приблизительно: сумма степенного ряда не считается точно ради 5M холдеров
+        return self.top_balance * 10 ** self.decimals * 10
+
+    def balance(self, index):
+        # Закон Ципфа по рангу холдера: у крупнейших - большая часть предложения
+        return max(1, int(self.top_balance * 10 ** self.decimals / (index + 1) ** 1.1))
+
+    def holder(self, index):
+        return {
+            "address": holder_address(self.seed, -index - 1),
+            "owner": {
+                "address": holder_address(self.seed, index),
+                "name": f"Named owner {index}" if index % NAMED_OWNER_EVERY == 0 else None,
+                "is_scam": False,
+                "is_wallet": True,
+            },
+            "balance": str(self.balance(index)),
+        }
+
+    async def respond(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors_injected += 1
+            if self.random.random() < 0.5:
+                raise TONAPITooManyRequestsError()
+            # 502/503/504 pytonapi отдает как голый TONAPIError
+            raise TONAPIError("Bad gateway")
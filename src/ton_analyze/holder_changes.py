@@ -0,0 +1,131 @@
+from sqlalchemy import func, insert, literal, or_, update
+from sqlmodel import select
+from src.ton_analyze.models.base import CrawlRun, HolderChange, JettonHolder, Snapshot
+from src.ton_analyze.snapshots import ensure_snapshot_partition, to_utc_naive
+from dotenv import load_dotenv
+import os
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Минимальное изменение баланса (доля от прежнего баланса), которое попадает в holder_change.
+# 0 - записывается любое изменение; новые и вышедшие холдеры записываются всегда
+HOLDER_CHANGE_MIN_RATIO = float(os.getenv("HOLDER_CHANGE_MIN_RATIO", 0))
+
+
+def holder_change_params(jetton_id, run_id, holder_ids, existing, changed_rows, changed_at,
+                         min_ratio=HOLDER_CHANGE_MIN_RATIO):
+    """События по строкам пакета с изменившимся балансом.
+
+    existing - прежнее состояние холдеров пакета (load_holder_state): адрес -> (id, balance, last_seen_run_id).
+    Холдер без прежней записи или с нулевым прежним балансом - новый.
+    """
+    changes = []
+    for holder_address, _, balance in changed_rows:
+        state = existing.get(holder_address)
+        previous_balance = state[1] if state is not None else 0
+        delta = balance - previous_balance
+        if previous_balance == 0:
+            change_type = "new"
+        elif abs(delta) >= previous_balance * min_ratio:
+            change_type = "delta"
+        else:
+            continue
+        changes.append({
+            "change_type": change_type,
+            "previous_balance": previous_balance,
+            "balance": balance,
+            "delta": delta,
+            "changed_at": changed_at,
+            "jetton_id": jetton_id,
+            "jetton_holder_id": holder_ids[holder_address],
+            "run_id": run_id,
+        })
+    return changes
+
+
+def insert_holder_changes(session, changes):
+    if changes:
+        session.exec(insert(HolderChange), params=changes)
+
+
+async def insert_holder_changes_async(session, changes):
+    if changes:
+        await session.exec(insert(HolderChange), params=changes)
+
+
+def previous_completed_run_id(session, jetton_id, run_id):
+    return session.exec(select(func.max(CrawlRun.id)).where(
+        CrawlRun.jetton_id == jetton_id, CrawlRun.status == "completed", CrawlRun.id < run_id
+    )).one()
+
+
+def record_exits(session, jetton_id, run_id, changed_at):
+    """Отмечает выход холдеров, которых не было ни в завершенном обходе run_id, ни в предыдущем завершенном.
+
+    Страницы TonAPI идут по offset-у, а список холдеров меняется во время обхода: холдер может
+    выпасть между страницами и не попасть в один обход, хотя баланс у него есть. Поэтому выход
+    засчитывается только после двух завершенных обходов подряд без холдера (после первого обхода
+    жетона - никому). Все делается в базе: событие exit, нулевой снимок и обнуление баланса
+    через INSERT ... SELECT и UPDATE ... WHERE, id холдеров в Python не выгружаются. Вызывается
+    только после успешного обхода, иначе непройденные страницы сойдут за массовый выход.
+    Коммит остается за вызывающим кодом. Возвращает количество вышедших холдеров.
+    """
+    previous_run_id = previous_completed_run_id(session, jetton_id, run_id)
+    if previous_run_id is None:
+        return 0
+
+    changed_at = to_utc_naive(changed_at)
+    # До записей: DDL партиции ждал бы блокировок jettonholder и snapshot, взятых этой же транзакцией.
+    # Если вызывающий код уже писал в них в этой транзакции, партицию он создает заранее
+    ensure_snapshot_partition(session, changed_at)
+    # Холдер, увиденный в предыдущем завершенном обходе или позже (например, в брошенном), еще не вышел
+    exited = select(JettonHolder.id).where(
+        JettonHolder.jetton_id == jetton_id,
+        JettonHolder.balance > 0,
+        or_(JettonHolder.last_seen_run_id.is_(None), JettonHolder.last_seen_run_id < previous_run_id),
+    )
+    exited_count = session.exec(select(func.count()).select_from(exited.subquery())).one()
+    if not exited_count:
+        return 0
+
+    exited_holders = JettonHolder.id.in_(exited)
+    session.exec(insert(HolderChange).from_select(
+        ["change_type", "previous_balance", "balance", "delta", "changed_at", "jetton_id", "jetton_holder_id", "run_id"],
+        select(
+            literal("exit"), JettonHolder.balance, literal(0), -JettonHolder.balance, literal(changed_at),
+            JettonHolder.jetton_id, JettonHolder.id, literal(run_id),
+        ).where(exited_holders),
+    ))
+    session.exec(insert(Snapshot).from_select(
+        ["snapshot_date", "balance", "jetton_id", "jetton_holder_id"],
+        select(literal(changed_at), literal(0), JettonHolder.jetton_id, JettonHolder.id).where(exited_holders),
+    ))
+    session.exec(update(JettonHolder).where(exited_holders).values(balance=0))
+    session.exec(update(CrawlRun).where(CrawlRun.id == run_id).values(
+        balance_changes=CrawlRun.balance_changes + exited_count
+    ))
+
+    console.log(f"[cyan]{exited_count} holders left jetton {jetton_id} (missing from two crawls in a row)[/cyan]")
+    return exited_count
+
+
+def holder_changes_since(session, jetton_id, since, min_abs_delta=0, change_types=None, limit=None):
+    """События жетона начиная с момента since, крупнейшие по модулю изменения - первыми.
+
+    Например, движения китов: holder_changes_since(session, jetton_id, since, min_abs_delta=10 ** 15).
+    """
+    statement = select(HolderChange).where(
+        HolderChange.jetton_id == jetton_id, HolderChange.changed_at >= to_utc_naive(since)
+    )
+    if min_abs_delta:
+        statement = statement.where(func.abs(HolderChange.delta) >= min_abs_delta)
+    if change_types:
+        statement = statement.where(HolderChange.change_type.in_(change_types))
+    statement = statement.order_by(func.abs(HolderChange.delta).desc())
+    if limit is not None:
+        statement = statement.limit(limit)
+    return session.exec(statement).all()
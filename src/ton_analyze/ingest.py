@@ -0,0 +1,219 @@
+from sqlalchemy import insert, update
+from sqlmodel import select
+from src.ton_analyze.db import dialect_insert
+from src.ton_analyze.models.base import JettonHolder, Snapshot
+from src.ton_analyze.holder_changes import holder_change_params, insert_holder_changes, insert_holder_changes_async
+from src.ton_analyze.known_addresses import record_owner_labels, record_owner_labels_async
+from src.ton_analyze.metrics import INGEST_BALANCE_CHANGES_TOTAL, INGEST_BATCH_ROWS, INGEST_BATCH_SECONDS, INGEST_ROWS_TOTAL
+from src.ton_analyze.snapshots import ensure_snapshot_partition, ensure_snapshot_partition_async, to_utc_naive
+from dotenv import load_dotenv
+import os
+import time
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Размер пакета для upsert-а холдеров (по умолчанию совпадает с размером страницы API)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", os.getenv("API_LIMIT", 1000)))
+
+
+def holder_to_row(holder):
+    """Преобразует JettonHolder из ответа TonAPI в кортеж (address, owner_name, balance).
+
+    Баланс остается в минимальных единицах, как в блокчейне: на 10 ** decimals делится только при выводе.
+    owner_name - имя владельца от TonAPI (None, если его нет), оно записывается в known_address.
+    """
+    return holder.owner.address.root, holder.owner.name or None, int(holder.balance)
+
+
+def holder_state_statement(jetton_id, addresses):
+    return select(
+        JettonHolder.holder_address, JettonHolder.id, JettonHolder.balance, JettonHolder.last_seen_run_id,
+    ).where(JettonHolder.jetton_id == jetton_id, JettonHolder.holder_address.in_(addresses))
+
+
+def upsert_holders_statement(session, jetton_id, rows, run_id=None):
+    """INSERT ... ON CONFLICT (jetton_id, holder_address) ... RETURNING holder_address, id для пакета."""
+    values = [
+        {
+            "jetton_id": jetton_id,
+            "holder_address": holder_address,
+            "balance": balance,
+            "last_seen_run_id": run_id,
+        }
+        for holder_address, _, balance in rows
+    ]
+    insert_stmt = dialect_insert(session)(JettonHolder).values(values)
+    set_ = {"balance": insert_stmt.excluded.balance}
+    if run_id is not None:
+        # Загрузка вне обхода (process_jetton_holders) не стирает последний обход, в котором холдер был виден:
+        # по нему record_exits решает, вышел ли холдер
+        set_["last_seen_run_id"] = insert_stmt.excluded.last_seen_run_id
+    return insert_stmt.on_conflict_do_update(
+        index_elements=[JettonHolder.jetton_id, JettonHolder.holder_address], set_=set_,
+    ).returning(JettonHolder.holder_address, JettonHolder.id)
+
+
+def mark_holders_seen_statement(holder_ids, run_id):
+    return update(JettonHolder).where(JettonHolder.id.in_(holder_ids)).values(last_seen_run_id=run_id)
+
+
+def snapshot_params(jetton_id, holder_ids, rows, snapshot_date):
+    return [
+        {
+            "jetton_id": jetton_id,
+            "jetton_holder_id": holder_ids[holder_address],
+            "balance": balance,
+            "snapshot_date": snapshot_date,
+        }
+        for holder_address, _, balance in rows
+    ]
+
+
+def plan_batch(rows, existing, run_id):
+    """Разбирает пакет по текущему состоянию холдеров (load_holder_state).
+
+    Возвращает (rows, changed_rows, unchanged_ids): строки пакета без повторов и без уже
+    записанных в обходе run_id, строки для upsert-а и снимка (новые холдеры и изменившийся баланс)
+    и id холдеров без изменений. Имя владельца на холдера не влияет - оно хранится в known_address.
+    """
+    # В одном INSERT ... ON CONFLICT адрес не может встречаться дважды - оставляем последнее значение
+    rows = list({holder_address: (holder_address, owner_name, balance)
+                 for holder_address, owner_name, balance in rows}.values())
+    if run_id is not None:
+        rows = [row for row in rows if row[0] not in existing or existing[row[0]][2] != run_id]
+
+    changed_rows = []
+    unchanged_ids = []
+    for row in rows:
+        state = existing.get(row[0])
+        if state is not None and state[1] == row[2]:
+            unchanged_ids.append(state[0])
+        else:
+            changed_rows.append(row)
+
+    return rows, changed_rows, unchanged_ids
+
+
+def log_batch(rows, changed_rows, start_time):
+    elapsed_time = time.perf_counter() - start_time
+    INGEST_BATCH_ROWS.observe(len(rows))
+    INGEST_BATCH_SECONDS.observe(elapsed_time)
+    INGEST_ROWS_TOTAL.inc(len(rows))
+    INGEST_BALANCE_CHANGES_TOTAL.inc(len(changed_rows))
+    speed = len(rows) / elapsed_time if elapsed_time > 0 else 0
+    console.log(f"[cyan]Processed batch of {len(rows)} holders ({len(changed_rows)} balance changes) "
+                f"in {elapsed_time:.3f} seconds ({speed:.2f} rows/second)[/cyan]")
+
+
+def load_holder_state(session, jetton_id, addresses):
+    """Текущее состояние холдеров пакета одним запросом по ключу (jetton_id, holder_address).
+
+    Возвращает словарь holder_address -> (id, balance, last_seen_run_id).
+    """
+    if not addresses:
+        return {}
+    statement = holder_state_statement(jetton_id, addresses)
+    return {holder_address: tuple(state) for holder_address, *state in session.exec(statement)}
+
+
+def upsert_holders(session, jetton_id, rows, run_id=None):
+    """Пакетный upsert холдеров одним INSERT ... ON CONFLICT (jetton_id, holder_address).
+
+    Возвращает словарь holder_address -> id, включая id только что созданных холдеров.
+    """
+    if not rows:
+        return {}
+    statement = upsert_holders_statement(session, jetton_id, rows, run_id)
+    return {holder_address: holder_id for holder_address, holder_id in session.exec(statement)}
+
+
+def mark_holders_seen(session, holder_ids, run_id):
+    """Отмечает неизменившихся холдеров как увиденных в обходе run_id (без переписывания баланса)."""
+    if holder_ids and run_id is not None:
+        session.exec(mark_holders_seen_statement(holder_ids, run_id))
+
+
+def insert_snapshots(session, jetton_id, holder_ids, rows, snapshot_date):
+    """Пакетная вставка снимков балансов для уже сохраненных холдеров (партиция дня уже создана)."""
+    snapshots = snapshot_params(jetton_id, holder_ids, rows, to_utc_naive(snapshot_date))
+    if snapshots:
+        session.exec(insert(Snapshot), params=snapshots)
+
+
+def ingest_holders_batch(session, jetton_id, rows, snapshot_date, run_id=None):
+    """Запись пакета холдеров: пишутся только изменения. Коммит остается за вызывающим кодом.
+
+    Неизменившиеся холдеры только отмечаются как увиденные в обходе run_id, снимок и событие
+    holder_change (new/delta) пишутся только при изменении баланса. Холдеры, уже записанные в этом обходе (сдвинулись между
+    страницами во время обхода), пропускаются. Новые имена владельцев от TonAPI пишутся в known_address.
+    Возвращает (количество новых для обхода холдеров, количество изменений баланса).
+    """
+    start_time = time.perf_counter()
+    # Партиция создается до записи пакета: ее внешний ключ на jettonholder ждал бы блокировки,
+    # которую держит upsert холдеров этой же транзакции
+    ensure_snapshot_partition(session, snapshot_date)
+
+    existing = load_holder_state(session, jetton_id, list({row[0] for row in rows}))
+    rows, changed_rows, unchanged_ids = plan_batch(rows, existing, run_id)
+
+    record_owner_labels(session, rows)
+    holder_ids = upsert_holders(session, jetton_id, changed_rows, run_id)
+    mark_holders_seen(session, unchanged_ids, run_id)
+    insert_snapshots(session, jetton_id, holder_ids, changed_rows, snapshot_date)
+    insert_holder_changes(session, holder_change_params(
+        jetton_id, run_id, holder_ids, existing, changed_rows, to_utc_naive(snapshot_date)
+    ))
+
+    log_batch(rows, changed_rows, start_time)
+    return len(rows), len(changed_rows)
+
+
+# Те же операции для AsyncSession (DB_BACKEND=async): запросы не блокируют цикл событий
+
+async def load_holder_state_async(session, jetton_id, addresses):
+    if not addresses:
+        return {}
+    result = await session.exec(holder_state_statement(jetton_id, addresses))
+    return {holder_address: tuple(state) for holder_address, *state in result}
+
+
+async def upsert_holders_async(session, jetton_id, rows, run_id=None):
+    if not rows:
+        return {}
+    result = await session.exec(upsert_holders_statement(session, jetton_id, rows, run_id))
+    return {holder_address: holder_id for holder_address, holder_id in result}
+
+
+async def mark_holders_seen_async(session, holder_ids, run_id):
+    if holder_ids and run_id is not None:
+        await session.exec(mark_holders_seen_statement(holder_ids, run_id))
+
+
+async def insert_snapshots_async(session, jetton_id, holder_ids, rows, snapshot_date):
+    snapshots = snapshot_params(jetton_id, holder_ids, rows, to_utc_naive(snapshot_date))
+    if snapshots:
+        await session.exec(insert(Snapshot), params=snapshots)
+
+
+async def ingest_holders_batch_async(session, jetton_id, rows, snapshot_date, run_id=None):
+    """Асинхронный вариант ingest_holders_batch для AsyncSession."""
+    start_time = time.perf_counter()
+    await ensure_snapshot_partition_async(session, snapshot_date)
+
+    existing = await load_holder_state_async(session, jetton_id, list({row[0] for row in rows}))
+    rows, changed_rows, unchanged_ids = plan_batch(rows, existing, run_id)
+
+    await record_owner_labels_async(session, rows)
+    holder_ids = await upsert_holders_async(session, jetton_id, changed_rows, run_id)
+    await mark_holders_seen_async(session, unchanged_ids, run_id)
+    await insert_snapshots_async(session, jetton_id, holder_ids, changed_rows, snapshot_date)
+    await insert_holder_changes_async(session, holder_change_params(
+        jetton_id, run_id, holder_ids, existing, changed_rows, to_utc_naive(snapshot_date)
+    ))
+
+    log_batch(rows, changed_rows, start_time)
+    return len(rows), len(changed_rows)
@@ -0,0 +1,246 @@
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from src.ton_analyze.address_converter import TONAddressConverter
+from src.ton_analyze.db import dialect_insert, get_session
+from src.ton_analyze.models.base import KnownAddress
+from dotenv import load_dotenv
+from datetime import datetime
+from types import MappingProxyType
+import argparse
+import os
+import threading
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+load_dotenv()
+
+# Как часто (секунды) кэш процесса сверяется с таблицей known_address
+KNOWN_ADDRESS_CACHE_TTL = int(os.getenv("KNOWN_ADDRESS_CACHE_TTL", 60))
+
+CATEGORIES = ("dex", "cex", "burn", "staking", "other")
+# Категории, которые в когортах выделяются в группу "Liquidity Pools & CEX"
+LIQUIDITY_CATEGORIES = ("dex", "cex", "burn", "staking")
+
+# Начальный список (раньше - KNOWN_LIQUIDITY_POOLS в ton_analize.py): адрес -> (имя, категория)
+SEED_KNOWN_ADDRESSES = {
+    "0:6bebcc2448012bba42e151f5d140448cf7be8e22a2233d8da3a1423bdc244aac": ("DEX DeDust", "dex"),
+    "0:779dcc815138d9500e449c5291e7f12738c23d575b5310000f6a253bd607384e": ("DEX StonFi", "dex"),
+    "0:45614fee399c43d77bb597558791831bc0ee31754cbb2b5b1fbf5a3488ed9940": ("CEX xRocket Cold Storage", "cex"),
+    "0:011a8f0a0b36b779af033473274966666d1cd6fb4e77df679375fbd6f970d012": ("CEX xRocket Bot", "cex"),
+    "0:d887d0e2d1c4fc4126e71c970d33ab1896940000eae703bb1ab6cecc830777e3": ("MEXC 3", "cex"),
+    "0:0000000000000000000000000000000000000000000000000000000000000000": ("Burned", "burn"),
+    "0:e3fa13950c93bab4f9b7901abd7959f8111e8dabc0aae76e6c6000683068241d": ("Anon Space Staking", "staking"),
+}
+
+
+class KnownAddressRegistry:
+    """Неизменяемый снимок known_address: entries (адрес -> (имя, категория, источник))
+    и liquidity - frozenset адресов пулов и CEX для исключения из когорт."""
+
+    def __init__(self, entries, version=None):
+        self.entries = MappingProxyType(dict(entries))
+        self.liquidity = frozenset(
+            address for address, (_, category, _) in self.entries.items() if category in LIQUIDITY_CATEGORIES
+        )
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def label(self, address):
+        entry = self.entries.get(address)
+        return entry[0] if entry else None
+
+    def with_entries(self, entries):
+        """Новый снимок с добавленными записями (после записи имен при загрузке холдеров).
+
+        Версия сбрасывается: при следующей сверке таблица перечитывается и расхождения кэша исчезают.
+        """
+        registry = KnownAddressRegistry({**self.entries, **entries})
+        registry.loaded_at = self.loaded_at
+        return registry
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry_version(session):
+    # Количество строк и последнее изменение: меняются при любой вставке и правке
+    return tuple(session.exec(select(func.count(), func.max(KnownAddress.updated_at))).one())
+
+
+def known_addresses(session, max_age=KNOWN_ADDRESS_CACHE_TTL):
+    """Кэш известных адресов процесса. Таблица перечитывается, только если с последней сверки
+    прошло больше max_age секунд и ее версия изменилась."""
+    global _registry
+    registry = _registry
+    if registry is not None and time.monotonic() - registry.loaded_at < max_age:
+        return registry
+    with _registry_lock:
+        version = registry_version(session)
+        if _registry is not None and _registry.version == version:
+            _registry.loaded_at = time.monotonic()
+            return _registry
+        rows = session.exec(select(
+            KnownAddress.address, KnownAddress.label, KnownAddress.category, KnownAddress.source
+        ))
+        _registry = KnownAddressRegistry(
+            {address: (label, category, source) for address, label, category, source in rows}, version
+        )
+        return _registry
+
+
+async def known_addresses_async(session, max_age=KNOWN_ADDRESS_CACHE_TTL):
+    registry = _registry
+    if registry is not None and time.monotonic() - registry.loaded_at < max_age:
+        return registry
+    return await session.run_sync(known_addresses, max_age)
+
+
+def invalidate_known_addresses():
+    global _registry
+    _registry = None
+
+
+def new_label_params(registry, rows):
+    """Имена владельцев из строк пакета (address, owner_name, balance), которых еще нет в реестре.
+
+    Имя от TonAPI заменяет только прежнее имя от TonAPI: seed и manual не трогаются.
+    """
+    now = datetime.utcnow()
+    labels = {}
+    for holder_address, owner_name, _ in rows:
+        if not owner_name:
+            continue
+        entry = registry.entries.get(holder_address)
+        if entry is None or (entry[2] == "tonapi" and entry[0] != owner_name):
+            labels[holder_address] = owner_name
+    # Порядок адресов одинаков во всех процессах: параллельные upsert-ы не блокируют друг друга накрест
+    return [
+        {"address": address, "label": label, "category": "other", "source": "tonapi", "updated_at": now}
+        for address, label in sorted(labels.items())
+    ]
+
+
+def upsert_labels_statement(session, params):
+    insert_stmt = dialect_insert(session)(KnownAddress).values(params)
+    return insert_stmt.on_conflict_do_update(
+        index_elements=[KnownAddress.address],
+        set_={"label": insert_stmt.excluded.label, "updated_at": insert_stmt.excluded.updated_at},
+        where=KnownAddress.source == "tonapi",
+    )
+
+
+def registry_entries(params):
+    return {param["address"]: (param["label"], param["category"], param["source"]) for param in params}
+
+
+# Ключ session.info: имена, записанные в еще не закоммиченной транзакции
+PENDING_LABELS_KEY = "known_address_pending"
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_labels(session):
+    """После коммита записанные имена попадают в кэш процесса: следующие пакеты их не пишут повторно."""
+    global _registry
+    entries = session.info.pop(PENDING_LABELS_KEY, None)
+    registry = _registry
+    if entries and registry is not None:
+        _registry = registry.with_entries(entries)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_labels(session):
+    # Откаченные имена в кэш не попадают: таблица их не содержит
+    session.info.pop(PENDING_LABELS_KEY, None)
+
+
+def pending_label_params(session, registry, rows):
+    """Новые имена пакета с учетом уже записанных в текущей транзакции; запоминает их до коммита."""
+    pending = session.info.setdefault(PENDING_LABELS_KEY, {})
+    params = new_label_params(registry.with_entries(pending) if pending else registry, rows)
+    pending.update(registry_entries(params))
+    return params
+
+
+def record_owner_labels(session, rows):
+    """Записывает новые имена владельцев из пакета в known_address. Коммит остается за вызывающим кодом,
+    кэш процесса дополняется только после успешного коммита."""
+    params = pending_label_params(session, known_addresses(session), rows)
+    if params:
+        session.exec(upsert_labels_statement(session, params))
+    return len(params)
+
+
+async def record_owner_labels_async(session, rows):
+    params = pending_label_params(session.sync_session, await known_addresses_async(session), rows)
+    if params:
+        await session.exec(upsert_labels_statement(session, params))
+    return len(params)
+
+
+def seed_known_addresses(session):
+    """Добавляет начальный список адресов (существующие записи не меняются). Коммит - здесь же."""
+    now = datetime.utcnow()
+    insert_stmt = dialect_insert(session)(KnownAddress).values([
+        {"address": address, "label": label, "category": category, "source": "seed", "updated_at": now}
+        for address, (label, category) in SEED_KNOWN_ADDRESSES.items()
+    ])
+    session.exec(insert_stmt.on_conflict_do_nothing(index_elements=[KnownAddress.address]))
+    session.commit()
+
+
+def set_known_address(session, address, label=None, category=None):
+    """Ручная правка: имя и/или категория адреса (source=manual, TonAPI ее больше не перезаписывает)."""
+    if category is not None and category not in CATEGORIES:
+        raise ValueError(f"Unknown category {category!r}: expected one of {', '.join(CATEGORIES)}")
+    address = TONAddressConverter.to_raw(address)
+    known = session.get(KnownAddress, address)
+    if known is None:
+        if label is None:
+            raise ValueError(f"Address {address} is not known yet: a label is required")
+        known = KnownAddress(address=address, label=label)
+    if label is not None:
+        known.label = label
+    if category is not None:
+        known.category = category
+    known.source = "manual"
+    known.updated_at = datetime.utcnow()
+    session.add(known)
+    session.commit()
+    invalidate_known_addresses()
+    return known
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or edit known addresses (pools, exchanges, named owners)")
+    parser.add_argument("--seed", action="store_true", help="add the initial list of pools and exchanges")
+    parser.add_argument("--set", metavar="ADDRESS", help="address to label or categorise")
+    parser.add_argument("--label", help="new label for --set")
+    parser.add_argument("--category", choices=CATEGORIES, help="new category for --set")
+    parser.add_argument("--all", action="store_true", help="list every address, not only pools and exchanges")
+    args = parser.parse_args()
+
+    with get_session() as session:
+        if args.seed:
+            seed_known_addresses(session)
+        if args.set:
+            set_known_address(session, args.set, args.label, args.category)
+
+        statement = select(KnownAddress).order_by(KnownAddress.category, KnownAddress.label)
+        if not args.all:
+            statement = statement.where(KnownAddress.category.in_(LIQUIDITY_CATEGORIES))
+        table = Table(title="Known addresses")
+        for column in ("Address", "Label", "Category", "Source"):
+            table.add_column(column)
+        for known in session.exec(statement):
+            table.add_row(known.address, known.label, known.category, known.source)
+        console.print(table)
+
+
+if __name__ == "__main__":
+    main()
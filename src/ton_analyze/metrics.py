@@ -0,0 +1,302 @@
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from dotenv import load_dotenv
+from bisect import bisect_left
+import asyncio
+import math
+import os
+import threading
+import time
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Порт HTTP-эндпоинта /metrics в формате Prometheus (0 - не поднимать)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Файл для textfile-коллектора node_exporter (пусто - не писать) и период его перезаписи (секунды)
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", 15))
+
+# Границы гистограмм задержек (секунды) и размеров пакетов (строки)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Ответы бота из кэша - доли миллисекунды, поэтому у них своя шкала
+BOT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+BATCH_SIZE_BUCKETS = (10, 100, 500, 1000, 2000, 5000, 10000, 50000)
+
+
+class Metric(ABC):
+    """Метрика с метками. Значения меняются под собственным lock-ом: пакеты пишутся и из потоков.
+
+    Обновления - O(1) (гистограмма - O(log числа границ)), поэтому метрики включены всегда.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self.reset()
+        REGISTRY.append(self)
+
+    def _initial(self):
+        return 0
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+            if not self.labels:
+                # Метрика без меток видна со значением 0 с момента старта, а не с первого события
+                self._values[()] = self._initial()
+
+    def snapshot(self):
+        """Копия значений для передачи в другой процесс (pickle): ключ меток -> значение."""
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{label}="{escape_label_value(value)}"' for label, value in pairs) + "}"
+
+    @abstractmethod
+    def samples(self):
+        """Строки экспозиции: (имя, текст меток, значение)."""
+
+    @abstractmethod
+    def merge(self, values):
+        """Добавляет значения snapshot() метрики другого процесса."""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [(self.name, self._label_text(key), value) for key, value in values]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def merge(self, values):
+        # Мгновенное значение другого процесса к значению этого не прибавляется
+        pass
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labels)
+
+    def _initial(self):
+        # Счетчики по границам (последний - +Inf), сумма, количество
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def _copy(self, value):
+        return [[*value[0]], value[1], value[2]]
+
+    def merge(self, values):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = self._initial()
+                state[0] = [current + added for current, added in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = self._initial()
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                bucket_labels = self._label_text(key, [("le", format_value(bound))])
+                samples.append((f"{self.name}_bucket", bucket_labels, cumulative))
+            samples.append((f"{self.name}_sum", self._label_text(key), total))
+            samples.append((f"{self.name}_count", self._label_text(key), count))
+        return samples
+
+
+def format_value(value):
+    return "+Inf" if value == math.inf else str(value)
+
+
+def escape_label_value(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = []
+
+
+# Загрузка из TonAPI
+PAGE_FETCH_SECONDS = Histogram(
+    "tonapi_page_fetch_seconds", "Holder page fetch time including rate limiter waits and retries", LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram("tonapi_request_seconds", "Latency of a single TonAPI request attempt", LATENCY_BUCKETS)
+REQUESTS_TOTAL = Counter("tonapi_requests_total", "TonAPI request attempts by outcome (ok, error)", ("outcome",))
+ERRORS_TOTAL = Counter(
+    "tonapi_errors_total", "Failed TonAPI request attempts by reason (rate_limited, server_error, network, other)",
+    ("reason",),
+)
+RETRIES_TOTAL = Counter("tonapi_retries_total", "TonAPI requests scheduled for a retry")
+IN_FLIGHT = Gauge("tonapi_in_flight", "TonAPI requests currently in flight")
+CONCURRENCY_LIMIT = Gauge("tonapi_concurrency_limit", "Current adaptive window of concurrent TonAPI requests")
+
+# Запись в БД
+INGEST_BATCH_ROWS = Histogram("ingest_batch_rows", "Holder rows per ingest batch", BATCH_SIZE_BUCKETS)
+INGEST_BATCH_SECONDS = Histogram(
+    "ingest_batch_seconds", "Time to write an ingest batch, without commit", LATENCY_BUCKETS,
+)
+INGEST_COMMIT_SECONDS = Histogram("ingest_commit_seconds", "Time to commit an ingest batch", LATENCY_BUCKETS)
+INGEST_ROWS_TOTAL = Counter("ingest_rows_total", "Holder rows written by ingest")
+INGEST_BALANCE_CHANGES_TOTAL = Counter("ingest_balance_changes_total", "Holder rows whose balance changed")
+
+# Конвейер загрузки
+PIPELINE_QUEUE_DEPTH = Gauge("pipeline_queue_depth", "Items waiting in a holder pipeline queue", ("queue",))
+PIPELINE_ROWS_PER_SECOND = Gauge("pipeline_rows_per_second", "Throughput of the last finished holder pipeline run")
+
+# Telegram-бот
+BOT_COMMAND_SECONDS = Histogram(
+    "bot_command_seconds", "Time to answer a bot command by command and cache result (hit, miss, coalesced)",
+    BOT_LATENCY_BUCKETS, ("command", "cache"),
+)
+BOT_INVALIDATIONS_TOTAL = Counter("bot_cache_invalidations_total", "Bot response cache invalidations after new data")
+
+
+def metrics_snapshot():
+    """Значения всех метрик процесса: имя -> snapshot(). Шард обхода возвращает их родителю."""
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def merge_metrics(snapshot):
+    """Добавляет к метрикам процесса значения metrics_snapshot() другого процесса (кроме Gauge)."""
+    metrics = {metric.name: metric for metric in REGISTRY}
+    for name, values in snapshot.items():
+        if name in metrics:
+            metrics[name].merge(values)
+
+
+def reset_metrics():
+    for metric in REGISTRY:
+        metric.reset()
+
+
+def render_metrics():
+    """Все метрики процесса в текстовом формате Prometheus (version 0.0.4)."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def write_metrics_file(path):
+    # Через временный файл: коллектор никогда не читает наполовину записанный файл
+    with open(f"{path}.tmp", "w") as file:
+        file.write(render_metrics())
+    os.replace(f"{path}.tmp", path)
+
+
+async def _handle_metrics_request(reader, writer):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()).strip():
+            pass  # заголовки запроса не нужны
+        if request_line.split(b" ")[1:2] == [b"/metrics"]:
+            status, body = "200 OK", render_metrics().encode()
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _write_metrics_periodically(path, interval):
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(write_metrics_file, path)
+
+
+@asynccontextmanager
+async def metrics_exporter(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_FILE_INTERVAL, host=METRICS_HOST):
+    """Отдает метрики на время работы: HTTP /metrics на port и/или периодическая запись в файл path.
+
+    При выходе файл записывается последний раз - в нем остаются итоги запуска.
+    """
+    server = await asyncio.start_server(_handle_metrics_request, host, port) if port else None
+    writer_task = asyncio.create_task(_write_metrics_periodically(path, interval)) if path else None
+    if server:
+        console.log(f"[cyan]Serving metrics on http://{host}:{port}/metrics[/cyan]")
+    try:
+        yield
+    finally:
+        if writer_task:
+            writer_task.cancel()
+            write_metrics_file(path)
+        if server:
+            server.close()
+            await server.wait_closed()
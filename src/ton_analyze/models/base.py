@@ -1,15 +1,61 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import BigInteger, Index, Numeric, PrimaryKeyConstraint, UniqueConstraint
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.types import TypeDecorator
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
+
+
+# Количество жетонов в минимальных единицах (как в блокчейне, без деления на 10 ** decimals).
+# В PostgreSQL - NUMERIC(40,0): точные суммы для любых балансов. В SQLite (локальные прогоны)
+# Numeric ушел бы во float, поэтому там хранится INTEGER (до 2^63)
+class TokenAmount(TypeDecorator):
+    impl = Numeric(40, 0)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(BigInteger())
+        return dialect.type_descriptor(Numeric(40, 0))
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else int(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else int(value)
+
+
+# Составной первичный ключ с автоинкрементным id (как у партиционированной snapshot) SQLite не умеет:
+# там ключом остается один id - псевдоним rowid, который и выдает значения. Колонка помечается
+# info={"sqlite_rowid_key": True}, остальные диалекты создают таблицу как есть
+def is_sqlite_rowid_key(column):
+    return column.info.get("sqlite_rowid_key", False)
+
+
+@compiles(CreateColumn, "sqlite")
+def _create_sqlite_column(element, compiler, **kw):
+    column = element.element
+    if is_sqlite_rowid_key(column):
+        return f"{compiler.preparer.format_column(column)} INTEGER NOT NULL PRIMARY KEY"
+    return compiler.visit_create_column(element, **kw)
+
+
+@compiles(PrimaryKeyConstraint, "sqlite")
+def _create_sqlite_primary_key(constraint, compiler, **kw):
+    if any(is_sqlite_rowid_key(column) for column in constraint.columns):
+        return None  # ключ уже объявлен в колонке id
+    return compiler.visit_primary_key_constraint(constraint, **kw)
 
 
 # Модель для Jetton (Жетон)
 class Jetton(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     jetton_name: str
-    jetton_symbol: str
+    jetton_symbol: str = Field(index=True)
+    master_address: Optional[str] = Field(default=None, index=True, unique=True)  # Адрес мастер-контракта (raw)
     jetton_decimals: int
-    total_supply: Optional[float]
+    total_supply: Optional[int] = Field(default=None, sa_type=TokenAmount)  # В минимальных единицах
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     # Связь с таблицей jetton_holders (один ко многим)
@@ -18,10 +64,15 @@ class Jetton(SQLModel, table=True):
 
 # Модель для JettonHolder (Держатель жетонов)
 class JettonHolder(SQLModel, table=True):
+    # Уникальный ключ нужен для пакетного upsert-а (INSERT ... ON CONFLICT)
+    __table_args__ = (
+        UniqueConstraint("jetton_id", "holder_address", name="uq_jettonholder_jetton_id_holder_address"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    holder_address: str  # Адрес холдера (владеет жетоном)
-    owner_name: Optional[str] = None  # Имя владельца (если известно)
-    balance: float = 0.0  # Баланс жетонов
+    holder_address: str  # Адрес холдера (владеет жетоном); имя владельца - в known_address
+    balance: int = Field(default=0, sa_type=TokenAmount)  # Баланс в минимальных единицах
+    last_seen_run_id: Optional[int] = None  # Последний обход (CrawlRun), в котором холдер был виден
 
     jetton_id: Optional[int] = Field(default=None, foreign_key="jetton.id")
     
@@ -29,10 +80,159 @@ class JettonHolder(SQLModel, table=True):
 
 
 # Модель для Snapshot (снимок балансов)
+# Строка пишется только при изменении баланса холдера. В PostgreSQL таблица партиционирована
+# по snapshot_date (дневные партиции, первичный ключ (id, snapshot_date) - см. миграции)
 class Snapshot(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    snapshot_date: datetime = Field(default_factory=datetime.utcnow)
-    balance: float = 0.0  # Баланс жетонов в момент снимка
+    # История балансов холдера по времени; balance в INCLUDE дает index-only scan.
+    # jetton_id продублирован из jettonholder, чтобы выборки по жетону шли без join-а
+    __table_args__ = (
+        Index(
+            "ix_snapshot_jetton_holder_id_snapshot_date", "jetton_holder_id", "snapshot_date",
+            postgresql_include=["balance"],
+        ),
+        Index("ix_snapshot_jetton_id_snapshot_date", "jetton_id", "snapshot_date"),
+    )
 
+    # Первичный ключ (id, snapshot_date), как в партиционированной таблице миграции b71e0d3a5c48:
+    # ключ секционирования обязан входить в PK. id по-прежнему выдает последовательность (в SQLite - rowid)
+    id: Optional[int] = Field(
+        default=None, primary_key=True, sa_column_kwargs={"autoincrement": True, "info": {"sqlite_rowid_key": True}},
+    )
+    snapshot_date: datetime = Field(default_factory=datetime.utcnow, primary_key=True)
+    balance: int = Field(default=0, sa_type=TokenAmount)  # Баланс в минимальных единицах в момент снимка
+
+    jetton_id: Optional[int] = Field(default=None, foreign_key="jetton.id")
     jetton_holder_id: Optional[int] = Field(default=None, foreign_key="jettonholder.id")
-    jetton_holder: Optional[JettonHolder] = Relationship()  # Связь с держателем
\ No newline at end of file
+    jetton_holder: Optional[JettonHolder] = Relationship()  # Связь с держателем
+
+
+# Модель для SnapshotDaily (дневной сверток старых снимков)
+class SnapshotDaily(SQLModel, table=True):
+    __tablename__ = "snapshot_daily"
+    __table_args__ = (
+        UniqueConstraint("jetton_holder_id", "snapshot_day", name="uq_snapshot_daily_jetton_holder_id_snapshot_day"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    snapshot_day: date
+    snapshot_date: datetime  # Время последнего изменения баланса за день
+    balance: int = Field(default=0, sa_type=TokenAmount)  # Баланс на конец дня в минимальных единицах
+
+    jetton_holder_id: int = Field(foreign_key="jettonholder.id")
+
+
+# Модель для CrawlRun (обход холдеров жетона с чекпоинтом для продолжения после сбоя)
+class CrawlRun(SQLModel, table=True):
+    __tablename__ = "crawl_run"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    jetton_id: int = Field(foreign_key="jetton.id", index=True)
+    status: str = "running"  # running / completed / failed / abandoned
+    last_offset: int = 0  # Все страницы до этого offset-а уже записаны в БД
+    holders_seen: int = 0
+    balance_changes: int = 0  # Изменения баланса в обходе (в том числе ниже HOLDER_CHANGE_MIN_RATIO и выходы)
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+
+# Модель для HolderChange (событие изменения холдера между обходами)
+# Пишется при записи пакета (новые холдеры и изменения баланса) и по завершении обхода (вышедшие)
+class HolderChange(SQLModel, table=True):
+    __tablename__ = "holder_change"
+    __table_args__ = (
+        Index("ix_holder_change_jetton_id_changed_at", "jetton_id", "changed_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    change_type: str  # new / delta / exit
+    previous_balance: int = Field(default=0, sa_type=TokenAmount)  # В минимальных единицах
+    balance: int = Field(default=0, sa_type=TokenAmount)
+    delta: int = Field(default=0, sa_type=TokenAmount)  # balance - previous_balance, со знаком
+    changed_at: datetime = Field(default_factory=datetime.utcnow)
+
+    jetton_id: int = Field(foreign_key="jetton.id")
+    # Индекс и для истории холдера, и для проверки внешнего ключа при удалении холдеров
+    jetton_holder_id: int = Field(foreign_key="jettonholder.id", index=True)
+    run_id: Optional[int] = None  # Обход (CrawlRun), в котором замечено изменение
+
+
+# Сводные таблицы аналитики по жетону. Пересчитываются целиком для жетона в конце обхода
+# (только если в обходе были изменения), читаются по первичному ключу без сканирования jettonholder
+
+# Модель для CohortSummary (когорта холдеров жетона по стоимости холдинга)
+class CohortSummary(SQLModel, table=True):
+    __tablename__ = "cohort_summary"
+
+    jetton_id: int = Field(foreign_key="jetton.id", primary_key=True)
+    band: int = Field(primary_key=True)  # Номер когорты (см. cohorts.cohort_band), -1 - пулы ликвидности и CEX
+    holders: int = 0
+    total_balance: int = Field(default=0, sa_type=TokenAmount)  # В минимальных единицах
+
+
+# Модель для TopHolder (крупнейшие холдеры жетона)
+class TopHolder(SQLModel, table=True):
+    __tablename__ = "top_holder"
+
+    jetton_id: int = Field(foreign_key="jetton.id", primary_key=True)
+    rank: int = Field(primary_key=True)  # 1 - крупнейший холдер
+    jetton_holder_id: int = Field(foreign_key="jettonholder.id")
+    holder_address: str
+    owner_name: Optional[str] = None
+    balance: int = Field(default=0, sa_type=TokenAmount)  # В минимальных единицах
+
+
+# Модель для JettonStats (концентрация владения жетоном)
+class JettonStats(SQLModel, table=True):
+    __tablename__ = "jetton_stats"
+
+    jetton_id: int = Field(foreign_key="jetton.id", primary_key=True)
+    holders: int = 0  # Холдеры с ненулевым балансом
+    total_balance: int = Field(default=0, sa_type=TokenAmount)  # Сумма балансов в минимальных единицах
+    top10_share: float = 0.0  # Доля 10 крупнейших холдеров
+    top100_share: float = 0.0
+    liquidity_share: float = 0.0  # Доля пулов ликвидности и CEX
+    gini: float = 0.0  # Коэффициент Джини (0 - поровну, 1 - все у одного)
+    hhi: float = 0.0  # Индекс Херфиндаля-Хиршмана: сумма квадратов долей (0..1)
+    price_usd: float = 0.0  # Цена, по которой посчитаны когорты в cohort_summary
+    run_id: Optional[int] = None  # Обход, после которого пересчитана аналитика
+    refreshed_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# Модель для HolderCountHistory (количество холдеров жетона по дням)
+class HolderCountHistory(SQLModel, table=True):
+    __tablename__ = "holder_count_history"
+
+    jetton_id: int = Field(foreign_key="jetton.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    holders: int = 0  # Последнее значение за день
+    total_balance: int = Field(default=0, sa_type=TokenAmount)
+
+
+# Модель для JettonPrice (цена жетона по интервалам времени)
+# Одна строка на интервал PRICE_BUCKET_SECONDS: повторные запросы цены в интервале ее перезаписывают
+class JettonPrice(SQLModel, table=True):
+    __tablename__ = "jetton_price"
+    __table_args__ = (
+        UniqueConstraint("jetton_id", "bucket", name="uq_jetton_price_jetton_id_bucket"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    jetton_id: int = Field(foreign_key="jetton.id")
+    bucket: datetime  # Начало интервала (UTC)
+    price_usd: float  # Цена одного жетона (10 ** decimals минимальных единиц) в USD
+    source: str  # tonapi / file / stub
+    fetched_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# Модель для KnownAddress (известные адреса: пулы, биржи, сжигание, стейкинг и подписанные TonAPI владельцы)
+# Одна строка на адрес для всех жетонов. Пулы и CEX (категории из known_addresses.LIQUIDITY_CATEGORIES)
+# выделяются в когортах в отдельную группу
+class KnownAddress(SQLModel, table=True):
+    __tablename__ = "known_address"
+
+    address: str = Field(primary_key=True)  # Адрес владельца (raw)
+    label: str  # Имя: из начального списка, от TonAPI (owner.name) или заданное вручную
+    category: str = "other"  # dex / cex / burn / staking / other
+    source: str = "tonapi"  # seed / tonapi / manual - имя от TonAPI не перезаписывает seed и manual
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,194 @@
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.ton_analyze.ingest import INGEST_BATCH_SIZE, holder_to_row, ingest_holders_batch, ingest_holders_batch_async
+from src.ton_analyze.crawl_runs import checkpoint_run, checkpoint_run_async
+from src.ton_analyze.metrics import INGEST_COMMIT_SECONDS, PIPELINE_QUEUE_DEPTH, PIPELINE_ROWS_PER_SECOND
+from dotenv import load_dotenv
+from contextlib import AsyncExitStack, nullcontext
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+from rich.console import Console
+from rich.progress import Progress
+
+console = Console()
+
+load_dotenv()
+
+# Глубина очередей между стадиями (в страницах) - ограничивает пиковую память
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 20))
+
+
+async def fetch_stage(fetch_page, page_size, pages, workers, start_offset=0, end_offset=None):
+    """Стадия загрузки: скользящее окно offset-ов - освободившийся воркер сразу берет следующий
+    свободный offset (без ожидания всей "волны") и кладет страницу в очередь.
+
+    Первая пустая или неполная страница задает конец данных: offset-ы за ней больше не запрашиваются.
+    end_offset - граница диапазона шарда (None - до конца данных).
+    """
+    next_offset = start_offset
+
+    async def worker():
+        nonlocal next_offset, end_offset
+        while end_offset is None or next_offset < end_offset:
+            offset = next_offset
+            next_offset += page_size
+
+            page = await fetch_page(offset)
+            addresses = page.addresses if page else []
+            if len(addresses) < page_size:
+                end_offset = offset + page_size if end_offset is None else min(end_offset, offset + page_size)
+            if addresses:
+                await pages.put((offset, page))
+
+    worker_tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*worker_tasks)
+    except Exception:
+        for worker_task in worker_tasks:
+            worker_task.cancel()
+        # Закрываем очередь, чтобы следующие стадии дописали уже загруженные страницы
+        await pages.put(None)
+        raise
+    await pages.put(None)
+
+
+async def convert_stage(pages, batches, progress, task):
+    """Стадия преобразования: страницы TonAPI -> (offset, кортежи строк) для записи в БД."""
+    total_known = False
+    while (item := await pages.get()) is not None:
+        PIPELINE_QUEUE_DEPTH.set(pages.qsize(), queue="pages")
+        offset, page = item
+        if not total_known:
+            # Общее число холдеров приходит с каждой страницей - берем из первой
+            progress.update(task, total=page.total)
+            total_known = True
+        await batches.put((offset, [holder_to_row(holder) for holder in page.addresses]))
+    await batches.put(None)
+
+
+def _write_batch(session, jetton_id, rows, snapshot_date, run_id, checkpoint_offset):
+    written, balance_changes = ingest_holders_batch(session, jetton_id, rows, snapshot_date, run_id)
+    # Чекпоинт коммитится вместе с пакетом: после сбоя обход продолжится ровно отсюда
+    checkpoint_run(session, run_id, checkpoint_offset, written, balance_changes)
+    with INGEST_COMMIT_SECONDS.time():
+        session.commit()
+
+
+async def _write_batch_async(session, jetton_id, rows, snapshot_date, run_id, checkpoint_offset):
+    written, balance_changes = await ingest_holders_batch_async(session, jetton_id, rows, snapshot_date, run_id)
+    await checkpoint_run_async(session, run_id, checkpoint_offset, written, balance_changes)
+    with INGEST_COMMIT_SECONDS.time():
+        await session.commit()
+
+
+async def write_stage(batches, engine, jetton_id, snapshot_date, progress, task, run_id, page_size, start_offset,
+                      checkpoint_offsets=True):
+    """Стадия записи: копит строки до INGEST_BATCH_SIZE и пишет пакет. С синхронным engine
+    пакет пишется в отдельном потоке, чтобы драйвер не блокировал загрузку следующих страниц,
+    с AsyncEngine - прямо в цикле событий.
+
+    Страницы приходят не по порядку, поэтому чекпоинт - это граница непрерывно записанных
+    страниц: все offset-ы ниже нее уже в БД. checkpoint_offsets=False - чекпоинт не сдвигается
+    (шард обхода), растет только счетчик холдеров.
+    """
+    written = 0
+    pending = []
+    pending_offsets = []
+    done_offsets = set()
+    checkpoint_offset = start_offset
+
+    async def flush():
+        nonlocal written, pending, pending_offsets, checkpoint_offset
+        done_offsets.update(pending_offsets)
+        while checkpoint_offset in done_offsets:
+            done_offsets.remove(checkpoint_offset)
+            checkpoint_offset += page_size
+        last_offset = checkpoint_offset if checkpoint_offsets else None
+        if async_backend:
+            await _write_batch_async(session, jetton_id, pending, snapshot_date, run_id, last_offset)
+        else:
+            await asyncio.to_thread(_write_batch, session, jetton_id, pending, snapshot_date, run_id, last_offset)
+        progress.update(task, advance=len(pending))
+        written += len(pending)
+        pending = []
+        pending_offsets = []
+
+    async_backend = isinstance(engine, AsyncEngine)
+    async with AsyncExitStack() as stack:
+        if async_backend:
+            session = await stack.enter_async_context(AsyncSession(engine, expire_on_commit=False))
+        else:
+            session = stack.enter_context(Session(engine))
+
+        while (item := await batches.get()) is not None:
+            PIPELINE_QUEUE_DEPTH.set(batches.qsize(), queue="batches")
+            offset, rows = item
+            pending.extend(rows)
+            pending_offsets.append(offset)
+            if len(pending) >= INGEST_BATCH_SIZE:
+                await flush()
+
+        if pending:
+            await flush()
+    return written
+
+
+async def run_holders_pipeline(fetch_page, engine, jetton_id, page_size, fetch_workers,
+                               run_id, start_offset=0, progress=None, description="holders",
+                               end_offset=None, snapshot_date=None, checkpoint_offsets=True):
+    """Потоковая загрузка холдеров: fetch -> convert -> write через ограниченные очереди.
+
+    Загрузка начинается со start_offset (чекпоинт обхода run_id), каждая записанная страница
+    сдвигает чекпоинт.
+
+    Шард обхода загружает только диапазон [start_offset, end_offset) (у последнего шарда end_offset=None)
+    с checkpoint_offsets=False: общей границы записанных страниц у шардов нет. snapshot_date - общий
+    для всех шардов момент снимка.
+
+    fetch_page(offset) - корутина, возвращающая страницу JettonHolders; ошибка загрузки останавливает конвейер.
+    engine - синхронный Engine или AsyncEngine (DB_BACKEND=async), от него зависит способ записи.
+    progress - общий Progress, если несколько конвейеров работают одновременно (rich допускает
+    только один активный live-вывод).
+    Возвращает количество записанных холдеров.
+    """
+    pages = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    batches = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    start_time = time.time()
+    snapshot_date = snapshot_date or datetime.now(timezone.utc)
+
+    with Progress() if progress is None else nullcontext(progress) as progress:
+        task = progress.add_task(f"[green]Streaming {description} into database...", total=None)
+        tasks = [
+            asyncio.create_task(fetch_stage(fetch_page, page_size, pages, fetch_workers, start_offset, end_offset)),
+            asyncio.create_task(convert_stage(pages, batches, progress, task)),
+            asyncio.create_task(write_stage(
+                batches, engine, jetton_id, snapshot_date, progress, task, run_id, page_size, start_offset,
+                checkpoint_offsets,
+            )),
+        ]
+        try:
+            _, _, total_records = await asyncio.gather(*tasks)
+        except BaseException as error:
+            try:
+                fetch_task = tasks[0]
+                if fetch_task.done() and not fetch_task.cancelled() and fetch_task.exception() is error:
+                    # Упала загрузка: страницы, полученные до сбоя, дописываются - чекпоинт доходит до места сбоя
+                    await asyncio.gather(*tasks[1:])
+            finally:
+                # Если упала запись, остальные стадии иначе навсегда зависнут на очередях
+                for pipeline_task in tasks:
+                    pipeline_task.cancel()
+            raise
+        finally:
+            progress.remove_task(task)
+
+    elapsed_time = time.time() - start_time
+    speed = total_records / elapsed_time if elapsed_time > 0 else 0
+    PIPELINE_ROWS_PER_SECOND.set(speed)
+    console.log(f"[bold yellow]Streamed {total_records} {description} records in {elapsed_time:.2f} seconds "
+                f"({speed:.2f} records/second)[/bold yellow]")
+    return total_records
@@ -0,0 +1,212 @@
+from pytonapi import Tonapi
+from pytonapi.exceptions import TONAPIError
+from sqlalchemy import Float, cast
+from sqlmodel import Session, select
+from src.ton_analyze.address_converter import TONAddressConverter
+from src.ton_analyze.db import dialect_insert
+from src.ton_analyze.models.base import Jetton, JettonHolder, JettonPrice, Snapshot
+from src.ton_analyze.snapshots import to_utc_naive
+from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
+import httpx
+import json
+import os
+import time
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Источник цены: tonapi (курсы TonAPI), file (JSON-файл для офлайн-прогонов) или stub (фиксированная цена)
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "tonapi")
+# JSON-файл {"адрес мастер-контракта": цена в USD} для PRICE_PROVIDER=file
+PRICE_FILE = os.getenv("PRICE_FILE", "prices.json")
+# Цена PRICE_PROVIDER=stub и цена для когорт без конкретного жетона
+PRICE_STUB_USD = float(os.getenv("PRICE_STUB_USD", 0.000061))
+# Сколько секунд цена живет в кэше процесса, прежде чем провайдер будет спрошен снова
+PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", 300))
+# Ширина интервала в jetton_price (секунды): одна цена на жетон за интервал
+PRICE_BUCKET_SECONDS = int(os.getenv("PRICE_BUCKET_SECONDS", 3600))
+
+
+class TonapiPriceProvider:
+    """Цена жетона в USD из /v2/rates TonAPI."""
+
+    source = "tonapi"
+
+    def __init__(self, tonapi=None):
+        self.tonapi = tonapi or Tonapi(api_key=os.getenv("TON_API_KEY"))
+
+    def get_price(self, master_address):
+        rates = self.tonapi.rates.get_prices(tokens=[master_address], currencies=["usd"]).rates
+        # Запрошен один токен: ключ ответа - его адрес в той форме, в которой его вернул TonAPI
+        token_rates = rates.get(master_address) or next(iter(rates.values()), {})
+        prices = {currency.upper(): price for currency, price in (token_rates.get("prices") or {}).items()}
+        return float(prices["USD"]) if "USD" in prices else None
+
+
+class FilePriceProvider:
+    """Цены из локального JSON-файла {"адрес мастер-контракта": цена в USD} - для прогонов без сети."""
+
+    source = "file"
+
+    def __init__(self, path=PRICE_FILE):
+        self.path = path
+
+    def get_price(self, master_address):
+        with open(self.path) as file:
+            prices = {TONAddressConverter.to_raw(address): price for address, price in json.load(file).items()}
+        price = prices.get(TONAddressConverter.to_raw(master_address))
+        return float(price) if price is not None else None
+
+
+class StubPriceProvider:
+    """Фиксированные цены без сети: price для всех жетонов или prices по адресу мастер-контракта."""
+
+    source = "stub"
+
+    def __init__(self, price=PRICE_STUB_USD, prices=None):
+        self.price = price
+        self.prices = {TONAddressConverter.to_raw(address): price for address, price in (prices or {}).items()}
+        self.requests = 0
+
+    def get_price(self, master_address):
+        self.requests += 1
+        return self.prices.get(TONAddressConverter.to_raw(master_address), self.price)
+
+
+PRICE_PROVIDERS = {
+    "tonapi": TonapiPriceProvider,
+    "file": FilePriceProvider,
+    "stub": StubPriceProvider,
+}
+
+
+# Провайдеры процесса по имени: клиент TonAPI создается один раз, а не на каждый промах кэша
+_providers = {}
+
+
+def price_provider(name=None):
+    """Провайдер цены по имени (по умолчанию PRICE_PROVIDER), один на процесс."""
+    name = name or PRICE_PROVIDER
+    if name not in PRICE_PROVIDERS:
+        raise ValueError(f"Unknown PRICE_PROVIDER {name!r}: expected one of {', '.join(PRICE_PROVIDERS)}")
+    if name not in _providers:
+        _providers[name] = PRICE_PROVIDERS[name]()
+    return _providers[name]
+
+
+class PriceCache:
+    """Кэш цен процесса с временем жизни ttl секунд: jetton_id -> цена."""
+
+    def __init__(self, ttl=PRICE_CACHE_TTL):
+        self.ttl = ttl
+        self._prices = {}
+
+    def get(self, jetton_id):
+        entry = self._prices.get(jetton_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, jetton_id, price):
+        self._prices[jetton_id] = (time.monotonic() + self.ttl, price)
+
+    def clear(self):
+        self._prices.clear()
+
+
+# Общий кэш процесса: бот и аналитика не ходят к провайдеру чаще раза в PRICE_CACHE_TTL
+price_cache = PriceCache()
+
+
+def price_bucket(moment, bucket_seconds=PRICE_BUCKET_SECONDS):
+    """Начало интервала jetton_price, в который попадает moment (UTC без часового пояса)."""
+    moment = to_utc_naive(moment)
+    offset = (moment - datetime(1970, 1, 1)).total_seconds() % bucket_seconds
+    return moment - timedelta(seconds=offset)
+
+
+def save_price(session, jetton_id, price_usd, source, moment=None):
+    """Записывает цену в интервал jetton_price (повторная запись в том же интервале ее заменяет)."""
+    moment = to_utc_naive(moment or datetime.now(timezone.utc))
+    insert_stmt = dialect_insert(session)(JettonPrice).values(
+        jetton_id=jetton_id, bucket=price_bucket(moment), price_usd=price_usd, source=source, fetched_at=moment,
+    )
+    session.exec(insert_stmt.on_conflict_do_update(
+        index_elements=[JettonPrice.jetton_id, JettonPrice.bucket],
+        set_={
+            "price_usd": insert_stmt.excluded.price_usd,
+            "source": insert_stmt.excluded.source,
+            "fetched_at": insert_stmt.excluded.fetched_at,
+        },
+    ))
+
+
+def price_at_statement(jetton_id, moment):
+    """Цена из ближайшего интервала не позже moment. Аргументы - значения или колонки
+    (тогда это коррелированный подзапрос для оценки строк прямо в SQL)."""
+    return select(JettonPrice.price_usd).where(
+        JettonPrice.jetton_id == jetton_id, JettonPrice.bucket <= moment
+    ).order_by(JettonPrice.bucket.desc()).limit(1)
+
+
+def price_at(session, jetton_id, moment=None):
+    """Сохраненная цена жетона на момент moment (по умолчанию - последняя); None, если цен еще нет."""
+    moment = to_utc_naive(moment or datetime.now(timezone.utc))
+    return session.exec(price_at_statement(jetton_id, moment)).first()
+
+
+def current_price(session, jetton, provider=None, cache=price_cache):
+    """Текущая цена жетона в USD: из кэша процесса, иначе у провайдера (с записью в jetton_price).
+
+    Цена провайдера сохраняется в отдельной сессии: транзакция вызывающего кода не фиксируется.
+    Если провайдер недоступен, не знает жетон или у жетона нет адреса мастер-контракта,
+    возвращается последняя сохраненная цена, а если цен нет совсем - None.
+    """
+    price = cache.get(jetton.id)
+    if price is not None:
+        return price
+
+    provider = provider or price_provider()
+    price = None
+    if jetton.master_address is not None:
+        try:
+            price = provider.get_price(jetton.master_address)
+        except (TONAPIError, httpx.HTTPError, OSError, ValueError) as error:
+            console.log(f"[yellow]Price provider {provider.source} failed for {jetton.jetton_symbol}: {error}[/yellow]")
+
+    if price is None:
+        price = price_at(session, jetton.id)
+        if price is None:
+            return None
+    else:
+        with Session(session.get_bind()) as price_session:
+            save_price(price_session, jetton.id, price, provider.source)
+            price_session.commit()
+    cache.put(jetton.id, price)
+    return price
+
+
+def snapshot_valuations(session, jetton_id, since=None, until=None):
+    """Снимки балансов жетона с оценкой в USD по цене ближайшего интервала не позже снимка.
+
+    Цена подбирается и умножается на баланс в SQL, в Python приходят готовые строки
+    (holder_address, snapshot_date, balance, price_usd, value_usd). Для снимков раньше
+    первой сохраненной цены price_usd и value_usd - None.
+    """
+    jetton = session.get(Jetton, jetton_id)
+    price = price_at_statement(Snapshot.jetton_id, Snapshot.snapshot_date).scalar_subquery()
+    value = cast(Snapshot.balance, Float) * price / 10 ** jetton.jetton_decimals
+
+    statement = select(
+        JettonHolder.holder_address, Snapshot.snapshot_date, Snapshot.balance,
+        price.label("price_usd"), value.label("value_usd"),
+    ).join(JettonHolder, JettonHolder.id == Snapshot.jetton_holder_id).where(Snapshot.jetton_id == jetton_id)
+    if since is not None:
+        statement = statement.where(Snapshot.snapshot_date >= to_utc_naive(since))
+    if until is not None:
+        statement = statement.where(Snapshot.snapshot_date <= to_utc_naive(until))
+    return session.exec(statement.order_by(Snapshot.snapshot_date)).all()
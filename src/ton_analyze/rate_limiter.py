@@ -0,0 +1,233 @@
+from contextlib import asynccontextmanager
+from pytonapi.exceptions import TONAPIError, TONAPIServerError, TONAPITooManyRequestsError
+from src.ton_analyze.metrics import (
+    CONCURRENCY_LIMIT, ERRORS_TOTAL, IN_FLIGHT, REQUEST_SECONDS, REQUESTS_TOTAL, RETRIES_TOTAL,
+)
+from dotenv import load_dotenv
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Ограничение по количеству запросов в секунду (тариф TonAPI)
+TON_API_RATELIMIT = float(os.getenv("TON_API_RATELIMIT", 1))
+
+# Максимальное количество одновременных запросов (верхняя граница адаптивного окна)
+TON_API_MAX_IN_FLIGHT = int(os.getenv("TON_API_MAX_IN_FLIGHT", 10))
+
+# Количество повторов запроса при 429/5xx/сетевых ошибках
+TON_API_MAX_RETRIES = int(os.getenv("TON_API_MAX_RETRIES", 5))
+
+# Базовая и максимальная задержка экспоненциального backoff-а (секунды)
+TON_API_BACKOFF_BASE = float(os.getenv("TON_API_BACKOFF_BASE", 0.5))
+TON_API_BACKOFF_MAX = float(os.getenv("TON_API_BACKOFF_MAX", 30))
+
+# Во сколько раз сглаженная задержка может превышать минимальную, прежде чем окно начнет сужаться
+LATENCY_TOLERANCE = 2.0
+
+
+class RateLimiter:
+    """Общий ограничитель запросов к TonAPI: token bucket (запросов в секунду)
+    плюс адаптивное окно одновременных запросов (AIMD по наблюдаемой задержке).
+    """
+
+    def __init__(self, rate=TON_API_RATELIMIT, max_in_flight=TON_API_MAX_IN_FLIGHT, min_in_flight=1):
+        self.rate = rate
+        self.capacity = max(1.0, rate)  # допускаем всплеск не больше секундного бюджета
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight
+        self.limit = float(max_in_flight)  # текущий размер окна
+        self.in_flight = 0
+        CONCURRENCY_LIMIT.set(self.limit)
+
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._bucket_lock = asyncio.Lock()
+        self._slots = asyncio.Condition()
+
+        self._latency_ewma = None
+        self._latency_min = None
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def _take_token(self):
+        # Ожидающие встают в очередь на lock-е, поэтому токены раздаются по порядку
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _adapt(self, latency):
+        if self._latency_min is None or latency < self._latency_min:
+            self._latency_min = latency
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+
+        if self._latency_ewma > self._latency_min * LATENCY_TOLERANCE:
+            # Сервер начинает захлебываться - сужаем окно
+            self.limit = max(self.min_in_flight, self.limit * 0.9)
+        else:
+            # Аддитивное расширение: примерно +1 за каждое полное окно успешных запросов
+            self.limit = min(self.max_in_flight, self.limit + 1 / self.limit)
+        CONCURRENCY_LIMIT.set(self.limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Место в окне одновременных запросов и токен из bucket-а на время одного запроса."""
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            IN_FLIGHT.set(self.in_flight)
+
+        latency = None
+        try:
+            await self._take_token()
+            start_time = time.monotonic()
+            yield
+            latency = time.monotonic() - start_time
+        finally:
+            async with self._slots:
+                self.in_flight -= 1
+                IN_FLIGHT.set(self.in_flight)
+                if latency is not None:
+                    self._adapt(latency)
+                self._slots.notify_all()
+
+    def throttle(self, delay):
+        """Реакция на 429/5xx: окно уменьшается вдвое, bucket встает на паузу на delay секунд."""
+        self.limit = max(self.min_in_flight, self.limit / 2)
+        CONCURRENCY_LIMIT.set(self.limit)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+
+class RateBudget:
+    """Общий бюджет запросов для нескольких процессов (шардов обхода): родитель пополняет
+    межпроцессный семафор со скоростью rate, процессы берут из него токены (SharedRateLimiter).
+
+    Семафор ограничен секундным бюджетом, как bucket RateLimiter-а; paused_until - общая пауза
+    после 429/5xx в любом из процессов (time.time(), одинаковое для всех процессов).
+    """
+
+    def __init__(self, context, rate=TON_API_RATELIMIT):
+        self.rate = rate
+        self.capacity = max(1, int(rate))
+        self.tokens = context.BoundedSemaphore(self.capacity)
+        self.paused_until = context.Value("d", 0.0)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _refill(self):
+        interval = max(1 / self.rate, 0.01)
+        credit = 0.0
+        updated_at = time.monotonic()
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            credit = min(self.capacity, credit + (now - updated_at) * self.rate)
+            updated_at = now
+            while credit >= 1:
+                credit -= 1
+                try:
+                    self.tokens.release()
+                except ValueError:
+                    # Бюджет полон - лишние токены сгорают
+                    credit = 0
+                    break
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._refill, name="rate-budget", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter процесса-шарда: окно одновременных запросов - свое, а токены и пауза
+    после 429/5xx - из общего RateBudget родителя.
+    """
+
+    def __init__(self, tokens, paused_until, max_in_flight=TON_API_MAX_IN_FLIGHT, min_in_flight=1):
+        super().__init__(max_in_flight=max_in_flight, min_in_flight=min_in_flight)
+        self.tokens = tokens
+        self.paused_until = paused_until
+
+    async def _take_token(self):
+        async with self._bucket_lock:
+            while True:
+                delay = self.paused_until.value - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                # Ожидание с таймаутом: пауза, объявленная другим процессом, проверяется снова
+                if await asyncio.to_thread(self.tokens.acquire, True, 0.5):
+                    return
+
+    def throttle(self, delay):
+        super().throttle(delay)
+        with self.paused_until.get_lock():
+            self.paused_until.value = max(self.paused_until.value, time.time() + delay)
+
+
+def is_retryable(error):
+    # 429, 5xx (в том числе 502/503/504, которые pytonapi отдает как голый TONAPIError) и сетевые сбои
+    return (
+        isinstance(error, (TONAPITooManyRequestsError, TONAPIServerError, httpx.TransportError))
+        or type(error) is TONAPIError
+    )
+
+
+def error_reason(error):
+    """Причина ошибки для метрики tonapi_errors_total."""
+    if isinstance(error, TONAPITooManyRequestsError):
+        return "rate_limited"
+    if isinstance(error, TONAPIServerError) or type(error) is TONAPIError:
+        return "server_error"
+    if isinstance(error, httpx.TransportError):
+        return "network"
+    return "other"
+
+
+async def call_with_retries(limiter, request, description, max_retries=TON_API_MAX_RETRIES):
+    """Выполняет request() через limiter с повторами и jittered экспоненциальным backoff-ом.
+
+    Неповторяемые ошибки и исчерпание попыток пробрасываются вызывающему коду.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            async with limiter.slot():
+                with REQUEST_SECONDS.time():
+                    result = await request()
+            REQUESTS_TOTAL.inc(outcome="ok")
+            return result
+        except Exception as e:
+            REQUESTS_TOTAL.inc(outcome="error")
+            ERRORS_TOTAL.inc(reason=error_reason(e))
+            if attempt == max_retries or not is_retryable(e):
+                console.log(f"[red]Failed to fetch {description} after {attempt + 1} attempts: {e}[/red]")
+                raise
+            # Full jitter: случайная задержка до экспоненциальной границы
+            delay = random.uniform(0, min(TON_API_BACKOFF_MAX, TON_API_BACKOFF_BASE * 2 ** attempt))
+            limiter.throttle(delay)
+            RETRIES_TOTAL.inc()
+            console.log(f"[yellow]Retrying {description} in {delay:.2f}s "
+                        f"({attempt + 1}/{max_retries}): {e}[/yellow]")
+            await asyncio.sleep(delay)
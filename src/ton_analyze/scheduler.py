@@ -0,0 +1,187 @@
+from pytonapi import AsyncTonapi
+from src.ton_analyze.rate_limiter import RateLimiter
+from src.ton_analyze.metrics import metrics_exporter
+from src.ton_analyze.ton_get_data import stream_jetton_holders
+from dotenv import load_dotenv
+from dataclasses import dataclass
+from typing import Optional
+import argparse
+import asyncio
+import os
+import time
+
+from rich.console import Console
+from rich.progress import Progress
+from rich.table import Table
+
+console = Console()
+
+load_dotenv()
+
+# Список жетонов: "адрес[:интервал в минутах[:приоритет]]" через запятую
+TON_JETTONS = os.getenv("TON_JETTONS", "")
+
+# Интервал обновления по умолчанию и пауза перед повтором после ошибки
+SCHEDULER_DEFAULT_INTERVAL_MINUTES = float(os.getenv("SCHEDULER_DEFAULT_INTERVAL_MINUTES", 60))
+SCHEDULER_RETRY_MINUTES = float(os.getenv("SCHEDULER_RETRY_MINUTES", 5))
+
+# Сколько жетонов обходится одновременно (запросы к API при этом делят общий RateLimiter)
+SCHEDULER_MAX_CONCURRENT_JETTONS = int(os.getenv("SCHEDULER_MAX_CONCURRENT_JETTONS", 3))
+
+
+@dataclass
+class JettonSchedule:
+    master_address: str
+    interval: float  # секунды между запусками
+    priority: int = 0  # больше - раньше среди одновременно готовых к запуску (жетоны с высоким оборотом)
+    next_run_at: float = 0.0
+    running: bool = False
+    runs: int = 0
+    last_status: Optional[str] = None
+    last_started_at: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_holders: Optional[int] = None
+    last_error: Optional[str] = None
+
+
+def parse_jetton_schedules(spec, default_interval_minutes=SCHEDULER_DEFAULT_INTERVAL_MINUTES):
+    """Разбирает "адрес[:интервал в минутах[:приоритет]],..." в список JettonSchedule.
+
+    Адрес в raw-форме сам содержит двоеточие ("0:abc..."), поэтому параметры отделяются справа.
+    """
+    schedules = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        parts = entry.split(":")
+        # raw-адрес - это "workchain:hex", user-friendly адрес двоеточий не содержит
+        address_parts = 2 if len(parts) >= 2 and parts[0].lstrip("-").isdigit() and len(parts[1]) == 64 else 1
+        master_address = ":".join(parts[:address_parts])
+        options = parts[address_parts:]
+        interval_minutes = float(options[0]) if len(options) > 0 and options[0] else default_interval_minutes
+        priority = int(options[1]) if len(options) > 1 and options[1] else 0
+        schedules.append(JettonSchedule(master_address, interval_minutes * 60, priority))
+    return schedules
+
+
+class JettonScheduler:
+    """Периодический обход нескольких жетонов одновременно.
+
+    Все обходы делят один клиент AsyncTonapi, один RateLimiter (общий бюджет запросов)
+    и пул соединений общего engine (db.get_engine).
+    """
+
+    def __init__(self, tonapi, schedules, limiter=None, max_concurrent=SCHEDULER_MAX_CONCURRENT_JETTONS):
+        self.tonapi = tonapi
+        self.schedules = schedules
+        self.limiter = limiter or RateLimiter()
+        self.max_concurrent = max_concurrent
+        self.progress = Progress(console=console)
+
+    async def run_jetton(self, schedule):
+        schedule.last_started_at = time.time()
+        start_time = time.monotonic()
+        try:
+            jetton = await self.tonapi.jettons.get_info(account_id=schedule.master_address)
+            schedule.last_holders = await stream_jetton_holders(
+                self.tonapi, schedule.master_address, jetton, self.limiter, progress=self.progress
+            )
+            schedule.last_status = "completed"
+            schedule.last_error = None
+            schedule.next_run_at = start_time + schedule.interval
+        except Exception as e:
+            schedule.last_status = "failed"
+            schedule.last_error = str(e)
+            schedule.next_run_at = time.monotonic() + min(schedule.interval, SCHEDULER_RETRY_MINUTES * 60)
+            console.log(f"[red]Crawl of {schedule.master_address} failed: {e}[/red]")
+        finally:
+            schedule.running = False
+            schedule.runs += 1
+            schedule.last_duration = time.monotonic() - start_time
+
+    def due_schedules(self, now):
+        due = [schedule for schedule in self.schedules if not schedule.running and schedule.next_run_at <= now]
+        return sorted(due, key=lambda schedule: (-schedule.priority, schedule.next_run_at))
+
+    def timings(self):
+        """Тайминги последнего запуска по каждому жетону."""
+        return [
+            {
+                "master_address": schedule.master_address,
+                "priority": schedule.priority,
+                "interval": schedule.interval,
+                "runs": schedule.runs,
+                "last_status": schedule.last_status,
+                "last_started_at": schedule.last_started_at,
+                "last_duration": schedule.last_duration,
+                "last_holders": schedule.last_holders,
+                "last_error": schedule.last_error,
+            }
+            for schedule in self.schedules
+        ]
+
+    def print_timings(self):
+        table = Table(title="Jetton crawls")
+        for column in ("Jetton", "Priority", "Runs", "Status", "Duration, s", "Holders", "Next run in, s"):
+            table.add_column(column)
+        now = time.monotonic()
+        for schedule in self.schedules:
+            table.add_row(
+                schedule.master_address,
+                str(schedule.priority),
+                str(schedule.runs),
+                schedule.last_status or "-",
+                f"{schedule.last_duration:.1f}" if schedule.last_duration is not None else "-",
+                str(schedule.last_holders) if schedule.last_holders is not None else "-",
+                "running" if schedule.running else f"{max(0.0, schedule.next_run_at - now):.0f}",
+            )
+        console.print(table)
+
+    async def run(self, once=False):
+        """Запускает обходы по расписанию. С once=True каждый жетон обходится один раз."""
+        running = set()
+        with self.progress:
+            while True:
+                now = time.monotonic()
+                for schedule in self.due_schedules(now):
+                    if len(running) >= self.max_concurrent:
+                        break
+                    if once and schedule.runs > 0:
+                        continue
+                    schedule.running = True
+                    running.add(asyncio.create_task(self.run_jetton(schedule)))
+
+                if once and not running and all(schedule.runs > 0 for schedule in self.schedules):
+                    break
+
+                # Ждем завершения любого обхода или наступления следующего запуска
+                waiting = [schedule.next_run_at for schedule in self.schedules if not schedule.running]
+                if once or not waiting or len(running) >= self.max_concurrent:
+                    timeout = None
+                else:
+                    timeout = max(0.0, min(waiting) - now)
+                if running:
+                    done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if done:
+                        self.print_timings()
+                elif timeout is not None:
+                    await asyncio.sleep(timeout)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Crawl holders of several jettons on a schedule")
+    parser.add_argument("--once", action="store_true", help="crawl every jetton once and exit")
+    args = parser.parse_args()
+
+    schedules = parse_jetton_schedules(TON_JETTONS or os.getenv("TON_JETTON_ADDRESS", ""))
+    if not schedules:
+        console.log("[red]No jettons configured: set TON_JETTONS or TON_JETTON_ADDRESS[/red]")
+        return
+
+    tonapi = AsyncTonapi(api_key=os.getenv("TON_API_KEY"))
+    scheduler = JettonScheduler(tonapi, schedules)
+    async with metrics_exporter():
+        await scheduler.run(once=args.once)
+    scheduler.print_timings()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+from sqlalchemy import delete, func, update
+from sqlmodel import select
+from src.ton_analyze.models.base import CrawlRun, HolderChange, JettonHolder, Snapshot
+from src.ton_analyze.snapshots import to_utc_naive
+from dotenv import load_dotenv
+import os
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Сколько процессов делят диапазон offset-ов обхода (1 - обычный обход в одном процессе)
+INGEST_SHARDS = int(os.getenv("INGEST_SHARDS", 1))
+
+
+def shard_ranges(total, page_size, shards):
+    """Разбивает offset-ы [0, total) на диапазоны (start, end), кратные странице.
+
+    У последнего диапазона end=None: холдеры, появившиеся за время обхода, дочитывает он.
+    """
+    pages = max(1, -(-total // page_size))
+    shards = max(1, min(shards, pages))
+    pages_per_shard = -(-pages // shards)
+    starts = range(0, pages, pages_per_shard)
+    return [
+        (start * page_size, (start + pages_per_shard) * page_size if start + pages_per_shard < pages else None)
+        for start in starts
+    ]
+
+
+def duplicate_rows(statement, holder_id, row_id):
+    """(оставляемые, лишние) id строк statement-а для холдеров, записанных больше одного раза:
+    остается последняя по id строка холдера.
+
+    Один проход с оконными функциями: соединение строк с агрегатом по ним же на свежих строках
+    без статистики планировщик выполняет вложенным циклом.
+    """
+    ranked = statement.with_only_columns(
+        row_id.label("row_id"),
+        func.row_number().over(partition_by=holder_id, order_by=row_id.desc()).label("position"),
+        func.count().over(partition_by=holder_id).label("copies"),
+    ).subquery()
+    kept = select(ranked.c.row_id).where(ranked.c.position == 1, ranked.c.copies > 1)
+    return kept, select(ranked.c.row_id).where(ranked.c.position > 1)
+
+
+def merge_duplicates(session, model, statement, holder_id, row_id, extra_filter):
+    """Удаляет лишние строки холдеров-дублей, в оставленных баланс - итоговый из jettonholder."""
+    kept, extra = duplicate_rows(statement, holder_id, row_id)
+    merged = session.exec(select(func.count()).select_from(extra.subquery())).one()
+    if not merged:
+        return 0
+    final_balance = select(JettonHolder.balance).where(JettonHolder.id == holder_id).scalar_subquery()
+    values = {"balance": final_balance}
+    if model is HolderChange:
+        values["delta"] = final_balance - HolderChange.previous_balance
+    session.exec(update(model).where(extra_filter, row_id.in_(kept.scalar_subquery())).values(**values)
+                 .execution_options(synchronize_session=False))
+    session.exec(delete(model).where(extra_filter, row_id.in_(extra.scalar_subquery()))
+                 .execution_options(synchronize_session=False))
+    return merged
+
+
+def merge_shards(session, jetton_id, run_id, snapshot_date):
+    """Сводит результаты шардов обхода run_id. Коммит остается за вызывающим кодом.
+
+    Холдер, сдвинувшийся на границу шардов во время обхода, может попасть в два шарда
+    одновременно: оба прочитали его прежнее состояние до записи другого и записали свой снимок
+    и событие holder_change. Остается по одной строке на холдера с итоговым балансом из
+    jettonholder (upsert по адресу уже оставил там одну запись). Счетчики обхода поправляются
+    в той же транзакции: holders_seen пересчитывается по холдерам, увиденным в обходе, из
+    balance_changes вычитаются удаленные дубли снимков. Возвращает количество удаленных дублей.
+    """
+    snapshot_date = to_utc_naive(snapshot_date)
+    run_changes = HolderChange.run_id == run_id
+    merged_changes = merge_duplicates(
+        session, HolderChange, select(HolderChange).where(run_changes),
+        HolderChange.jetton_holder_id, HolderChange.id, run_changes,
+    )
+    # snapshot секционирована по дате: условие на snapshot_date оставляет одну секцию
+    run_snapshots = (Snapshot.jetton_id == jetton_id) & (Snapshot.snapshot_date == snapshot_date)
+    merged_snapshots = merge_duplicates(
+        session, Snapshot, select(Snapshot).where(run_snapshots), Snapshot.jetton_holder_id, Snapshot.id, run_snapshots,
+    )
+
+    seen = select(func.count()).where(JettonHolder.jetton_id == jetton_id, JettonHolder.last_seen_run_id == run_id)
+    # Снимок пишется на каждое изменение баланса в пакете - дубль снимка был посчитан в balance_changes дважды
+    session.exec(update(CrawlRun).where(CrawlRun.id == run_id).values(
+        holders_seen=seen.scalar_subquery(),
+        balance_changes=CrawlRun.balance_changes - merged_snapshots,
+    ))
+    if merged_changes or merged_snapshots:
+        console.log(f"[cyan]Merged shards of crawl run {run_id}: removed {merged_changes} duplicate holder changes "
+                    f"and {merged_snapshots} duplicate snapshots[/cyan]")
+    return merged_changes + merged_snapshots
@@ -0,0 +1,197 @@
+from sqlalchemy import func, text, union_all
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import select
+from src.ton_analyze.db import get_session
+from src.ton_analyze.models.base import JettonHolder, Snapshot, SnapshotDaily
+from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
+import os
+
+from rich.console import Console
+
+console = Console()
+
+load_dotenv()
+
+# Через сколько дней дневные партиции snapshot сворачиваются в snapshot_daily
+SNAPSHOT_RETENTION_DAYS = int(os.getenv("SNAPSHOT_RETENTION_DAYS", 30))
+
+# SQLSTATE ошибок, когда партицию одновременно создал другой процесс: duplicate_table и, при гонке
+# двух CREATE TABLE IF NOT EXISTS, unique_violation в каталоге pg_type. Остальные ошибки DDL
+# (права, пересечение диапазона со snapshot_default) пробрасываются
+DUPLICATE_PARTITION_SQLSTATES = ("42P07", "23505")
+
+# Уже созданные в этом процессе партиции, чтобы не ходить в каталог на каждый пакет
+_known_partitions = set()
+
+
+def partition_name(day):
+    return f"snapshot_p{day:%Y%m%d}"
+
+
+def to_utc_naive(moment):
+    # snapshot_date хранится как timestamp without time zone в UTC
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+IS_PARTITIONED_SQL = text("SELECT relkind = 'p' FROM pg_class WHERE relname = 'snapshot'")
+
+
+def is_partitioned(session):
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    return session.exec(IS_PARTITIONED_SQL).scalar() or False
+
+
+async def is_partitioned_async(session):
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    return (await session.exec(IS_PARTITIONED_SQL)).scalar() or False
+
+
+def partition_ddl(day):
+    return text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF snapshot "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+def is_duplicate_partition_error(error):
+    return getattr(error.orig, "pgcode", None) in DUPLICATE_PARTITION_SQLSTATES
+
+
+def ensure_snapshot_partition(session, snapshot_date):
+    """Создает дневную партицию snapshot под snapshot_date, если ее еще нет.
+
+    DDL выполняется в отдельной autocommit-транзакции, чтобы не держать блокировку
+    родительской таблицы до конца пакета. На непартиционированной таблице (SQLite,
+    база без миграций) ничего не делает.
+    """
+    day = to_utc_naive(snapshot_date).date()
+    if day in _known_partitions:
+        return
+    if not is_partitioned(session):
+        _known_partitions.add(day)
+        return
+
+    statement = partition_ddl(day)
+    with session.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        try:
+            connection.execute(statement)
+        except DBAPIError as error:
+            if not is_duplicate_partition_error(error):
+                raise
+    _known_partitions.add(day)
+
+
+async def ensure_snapshot_partition_async(session, snapshot_date):
+    """Асинхронный вариант ensure_snapshot_partition для AsyncSession."""
+    day = to_utc_naive(snapshot_date).date()
+    if day in _known_partitions:
+        return
+    if not await is_partitioned_async(session):
+        _known_partitions.add(day)
+        return
+
+    async with session.bind.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            await connection.execute(partition_ddl(day))
+        except DBAPIError as error:
+            if not is_duplicate_partition_error(error):
+                raise
+    _known_partitions.add(day)
+
+
+def snapshot_partitions(session):
+    """Дневные партиции snapshot: список (день, имя таблицы), по возрастанию дня."""
+    names = session.exec(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'snapshot'"
+    )).scalars()
+    partitions = []
+    for name in names:
+        try:
+            partitions.append((datetime.strptime(name, "snapshot_p%Y%m%d").date(), name))
+        except ValueError:
+            continue  # snapshot_default и прочие партиции не по дням
+    return sorted(partitions)
+
+
+def compact_snapshot_partitions(session, older_than_days=SNAPSHOT_RETENTION_DAYS):
+    """Сворачивает дневные партиции старше older_than_days в snapshot_daily и удаляет их.
+
+    Для каждого холдера за день остается одна строка - последнее изменение баланса.
+    """
+    if not is_partitioned(session):
+        console.log("[yellow]Snapshot table is not partitioned, nothing to compact[/yellow]")
+        return 0
+
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=older_than_days)
+    compacted = 0
+    for day, name in snapshot_partitions(session):
+        if day >= cutoff:
+            break
+        session.exec(text(
+            f"INSERT INTO snapshot_daily (jetton_holder_id, snapshot_day, snapshot_date, balance) "
+            f"SELECT DISTINCT ON (p.jetton_holder_id) p.jetton_holder_id, p.snapshot_date::date, p.snapshot_date, p.balance "
+            f"FROM {name} p ORDER BY p.jetton_holder_id, p.snapshot_date DESC "
+            f"ON CONFLICT (jetton_holder_id, snapshot_day) DO UPDATE "
+            f"SET snapshot_date = excluded.snapshot_date, balance = excluded.balance"
+        ))
+        session.exec(text(f"ALTER TABLE snapshot DETACH PARTITION {name}"))
+        session.exec(text(f"DROP TABLE {name}"))
+        session.commit()
+        _known_partitions.discard(day)
+        compacted += 1
+        console.log(f"[cyan]Compacted snapshot partition {name} into daily rollups[/cyan]")
+    return compacted
+
+
+def balances_as_of(session, jetton_id, as_of):
+    """Восстанавливает балансы всех холдеров жетона на момент as_of.
+
+    Берется последнее изменение баланса каждого холдера не позже as_of - из сырых дельт
+    и из дневных свертков (для свернутых дней точность - день). Холдеры с нулевым
+    балансом (вышедшие) в результат не попадают. Возвращает словарь holder_address -> balance
+    (в минимальных единицах).
+    """
+    as_of = to_utc_naive(as_of)
+    deltas = select(
+        Snapshot.jetton_holder_id, Snapshot.snapshot_date, Snapshot.balance
+    ).where(Snapshot.jetton_id == jetton_id, Snapshot.snapshot_date <= as_of)
+    rollups = select(
+        SnapshotDaily.jetton_holder_id, SnapshotDaily.snapshot_date, SnapshotDaily.balance
+    ).join(JettonHolder, JettonHolder.id == SnapshotDaily.jetton_holder_id).where(
+        JettonHolder.jetton_id == jetton_id, SnapshotDaily.snapshot_date <= as_of
+    )
+    history = union_all(deltas, rollups).subquery()
+
+    ranked = select(
+        history.c.jetton_holder_id,
+        history.c.balance,
+        func.row_number().over(
+            partition_by=history.c.jetton_holder_id, order_by=history.c.snapshot_date.desc()
+        ).label("rn"),
+    ).subquery()
+
+    statement = select(JettonHolder.holder_address, ranked.c.balance).join(
+        ranked, JettonHolder.id == ranked.c.jetton_holder_id
+    ).where(ranked.c.rn == 1, ranked.c.balance > 0)
+    return {holder_address: balance for holder_address, balance in session.exec(statement)}
+
+
+def main():
+    with get_session() as session:
+        # Заранее создаем партицию на завтра, чтобы первый пакет после полуночи не ждал DDL
+        ensure_snapshot_partition(session, datetime.now(timezone.utc) + timedelta(days=1))
+        compacted = compact_snapshot_partitions(session)
+        console.log(f"[bold yellow]Compacted {compacted} snapshot partitions[/bold yellow]")
+
+
+if __name__ == "__main__":
+    main()
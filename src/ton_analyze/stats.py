@@ -0,0 +1,6 @@
+def percentile(values, q):
+    """Перцентиль q (0-100) методом ближайшего ранга."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
@@ -1,75 +1,90 @@
-from sqlmodel import SQLModel, create_engine, Session, select
-from src.ton_analyze.models.base import JettonHolder
+from sqlmodel import select
+from src.ton_analyze.address_converter import TONAddressConverter
+from src.ton_analyze.analytics import cohort_summary, jetton_stats, needs_refresh, refresh_jetton_analytics, top_holders
+from src.ton_analyze.cohorts import COHORT_THRESHOLDS_USD, DEFAULT_JETTON_DECIMALS, aggregate_cohorts
+from src.ton_analyze.db import get_session
+from src.ton_analyze.known_addresses import known_addresses
+from src.ton_analyze.models.base import Jetton
 from dotenv import load_dotenv
 import os
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
-# Подключение к базе данных
-# DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
-DATABASE_URL = f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}" \
-               f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-engine = create_engine(DATABASE_URL)
+# Цена токена в USD от провайдера PRICE_PROVIDER (через кэш процесса и таблицу jetton_price).
+# Без конкретного жетона - фиксированная PRICE_STUB_USD
+def get_token_price_in_usd(session=None, jetton_id=None):
+    # pytonapi (клиент провайдера tonapi) импортируется только там, где нужна цена
+    from src.ton_analyze.prices import PRICE_STUB_USD, current_price
 
-# Список известных адресов пулов и CEX, DEX
-KNOWN_LIQUIDITY_POOLS = {
-    "DEX DeDust": "0:6bebcc2448012bba42e151f5d140448cf7be8e22a2233d8da3a1423bdc244aac",
-    "DEX StonFi": "0:779dcc815138d9500e449c5291e7f12738c23d575b5310000f6a253bd607384e",
-    "CEX xRocket Cold Storage": "0:45614fee399c43d77bb597558791831bc0ee31754cbb2b5b1fbf5a3488ed9940",
-    "CEX xRocket Bot": "0:011a8f0a0b36b779af033473274966666d1cd6fb4e77df679375fbd6f970d012",
-    "MEXC 3": "0:d887d0e2d1c4fc4126e71c970d33ab1896940000eae703bb1ab6cecc830777e3",
-    "Burned": "0:0000000000000000000000000000000000000000000000000000000000000000",
-    "Anon Space Staking": "0:e3fa13950c93bab4f9b7901abd7959f8111e8dabc0aae76e6c6000683068241d"
-}
-
-# Функция для получения фиксированной цены токена (пока установлена вручную)
-def get_token_price_in_usd():
-    return 0.000061  # Установленная цена токена в USD
+    if session is None or jetton_id is None:
+        return PRICE_STUB_USD
+    return current_price(session, session.get(Jetton, jetton_id))
 
 # Функция для создания когорт с учетом пулов ликвидности
-def create_cohorts(session):
-    cohorts = {
-        "Микро-держатели ($0 - $34)": {"holders": 0, "total_balance": 0, "total_value_usd": 0},
-        "Малые держатели ($34 - $170)": {"holders": 0, "total_balance": 0, "total_value_usd": 0},
-        "Средние держатели ($170 - $3400)": {"holders": 0, "total_balance": 0, "total_value_usd": 0},
-        "Крупные держатели ($3400 - $34,000)": {"holders": 0, "total_balance": 0, "total_value_usd": 0},
-        "Сверх-крупные держатели ($34,000+)": {"holders": 0, "total_balance": 0, "total_value_usd": 0},
-        "Liquidity Pools & CEX": {"holders": 0, "total_balance": 0, "total_value_usd": 0}  # Отдельная когорта для пулов
-    }
+def create_cohorts(session, jetton_id=None, token_price_usd=None, thresholds=COHORT_THRESHOLDS_USD):
+    if token_price_usd is None:
+        token_price_usd = get_token_price_in_usd(session, jetton_id)
+        if token_price_usd is None:
+            raise ValueError(f"No price available for jetton {jetton_id}")
+
+    # Сводка, пересчитанная после последнего обхода по той же цене, читается без сканирования холдеров
+    if jetton_id is not None and thresholds == COHORT_THRESHOLDS_USD:
+        stats = jetton_stats(session, jetton_id)
+        if stats is not None and stats.price_usd == token_price_usd:
+            return cohort_summary(session, jetton_id)
 
-    token_price_usd = get_token_price_in_usd()
+    # Балансы хранятся в минимальных единицах - для пересчета в жетоны нужны decimals жетона
+    jetton = session.get(Jetton, jetton_id) if jetton_id is not None else None
+    jetton_decimals = jetton.jetton_decimals if jetton else DEFAULT_JETTON_DECIMALS
 
-    # Запрос к базе данных, чтобы получить всех холдеров
-    statement = select(JettonHolder)
-    holders = session.exec(statement).all()
+    # Разбиение на когорты и суммы считаются в базе одним GROUP BY - в Python приходят только итоги.
+    # Пулы и CEX - адреса известных категорий из known_address
+    return aggregate_cohorts(
+        session,
+        token_price_usd,
+        jetton_id=jetton_id,
+        jetton_decimals=jetton_decimals,
+        thresholds=thresholds,
+    )
 
-    for holder in holders:
-        balance = holder.balance
-        value_usd = balance * token_price_usd
+# Когорты по порциям холдеров вне SQL: серверный курсор (cohort_engine.holder_chunks) или
+# Parquet-выгрузка (cohort_engine.parquet_chunks). Результат - как у create_cohorts.
+# Пулы и CEX проверяются по frozenset из кэша known_address
+def create_cohorts_from_chunks(session, chunks, token_price_usd, jetton_decimals=DEFAULT_JETTON_DECIMALS,
+                               thresholds=COHORT_THRESHOLDS_USD):
+    # numpy и pyarrow нужны только векторному расчету - обходу и SQL-когортам они не нужны
+    from src.ton_analyze.cohort_engine import stream_cohorts
 
-        # Проверяем, является ли адрес холдера пулом ликвидности или CEX
-        if holder.holder_address in KNOWN_LIQUIDITY_POOLS.values():
-            cohort_key = "Liquidity Pools & CEX"
-        else:
-            # Формируем когорты по стоимости холдингов в USD
-            if 0 <= value_usd < 34:
-                cohort_key = "Микро-держатели ($0 - $34)"
-            elif 34 <= value_usd < 170:
-                cohort_key = "Малые держатели ($34 - $170)"
-            elif 170 <= value_usd < 3400:
-                cohort_key = "Средние держатели ($170 - $3400)"
-            elif 3400 <= value_usd < 34000:
-                cohort_key = "Крупные держатели ($3400 - $34,000)"
-            else:
-                cohort_key = "Сверх-крупные держатели ($34,000+)"
+    return stream_cohorts(
+        chunks,
+        token_price_usd,
+        known_addresses(session).liquidity,
+        jetton_decimals=jetton_decimals,
+        thresholds=thresholds,
+    )
 
-        # Обновляем данные для текущей когорты
-        cohorts[cohort_key]["holders"] += 1
-        cohorts[cohort_key]["total_balance"] += balance
-        cohorts[cohort_key]["total_value_usd"] += value_usd
+# Пересчет сводных таблиц жетона после обхода (только если в обходе run_id что-то изменилось)
+def refresh_analytics(session, jetton_id, run_id=None):
+    token_price_usd = get_token_price_in_usd(session, jetton_id)
+    if token_price_usd is None:
+        print(f"No price available for jetton {jetton_id}, analytics are not refreshed")
+        return None
+    if not needs_refresh(session, jetton_id, token_price_usd, run_id):
+        return None
+    jetton = session.get(Jetton, jetton_id)
+    return refresh_jetton_analytics(
+        session,
+        jetton_id,
+        token_price_usd,
+        jetton_decimals=jetton.jetton_decimals,
+        run_id=run_id,
+    )
 
-    return cohorts
+# Жетон по адресу мастер-контракта в любой форме (в базе адрес хранится в raw-форме)
+def find_jetton(session, master_address):
+    raw_address = TONAddressConverter.to_raw(master_address)
+    return session.exec(select(Jetton).where(Jetton.master_address == raw_address)).first()
 
 # Функция для отображения результатов
 def display_cohort_data(cohorts):
@@ -78,12 +93,29 @@ def display_cohort_data(cohorts):
     for cohort, data in cohorts.items():
         print(f"{cohort:<35} {data['holders']:<10} {data['total_balance']:<15,.2f} {data['total_value_usd']:<15,.2f}")
 
+# Концентрация и крупнейшие холдеры из сводных таблиц
+def display_jetton_stats(session, jetton_id, top=10):
+    stats = jetton_stats(session, jetton_id)
+    if stats is None:
+        return
+    jetton = session.get(Jetton, jetton_id)
+    print(f"Holders: {stats.holders}, Gini: {stats.gini:.4f}, HHI: {stats.hhi:.4f}")
+    print(f"Top 10 share: {stats.top10_share:.2%}, Top 100 share: {stats.top100_share:.2%}, "
+          f"Liquidity Pools & CEX share: {stats.liquidity_share:.2%}")
+    for holder in top_holders(session, jetton_id, top):
+        balance = holder.balance / 10 ** jetton.jetton_decimals
+        print(f"{holder.rank:>3}. {holder.holder_address} {holder.owner_name or '':<25} {balance:,.2f}")
+
 # Основная функция для работы с базой и создания когорт
 def main():
     # Создаем сессию для работы с базой данных
-    with Session(engine) as session:
-        cohorts = create_cohorts(session)
+    with get_session() as session:
+        jetton_address = os.getenv("TON_JETTON_ADDRESS")
+        jetton = find_jetton(session, jetton_address) if jetton_address else None
+        cohorts = create_cohorts(session, jetton_id=jetton.id if jetton else None)
         display_cohort_data(cohorts)
+        if jetton:
+            display_jetton_stats(session, jetton.id)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
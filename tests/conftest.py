@@ -0,0 +1,78 @@
+import os
+import pytest
+from sqlalchemy import text
+from sqlmodel import SQLModel
+from src.ton_analyze import db, known_addresses, prices, snapshots
+from src.ton_analyze.models.base import Jetton
+
+# PostgreSQL с примененными миграциями только для тестов (тесты очищают его таблицы). Без него
+# тесты партиций snapshot пропускаются, остальные идут на SQLite
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def use_database(monkeypatch, url):
+    """get_engine()/get_session() модулей смотрят в базу url."""
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.setenv("DB_BACKEND", "sync")
+    monkeypatch.setattr(db, "_engine", None)
+    monkeypatch.setattr(db, "_async_engine", None)
+    # Без сети: цены для сводок - фиксированные
+    monkeypatch.setattr(prices, "PRICE_PROVIDER", "stub")
+    prices.price_cache.clear()
+    known_addresses.invalidate_known_addresses()
+    snapshots._known_partitions.clear()
+    return db.get_engine()
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Пустая SQLite-база в каталоге теста."""
+    engine = use_database(monkeypatch, f"sqlite:///{tmp_path / 'test.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    known_addresses.invalidate_known_addresses()
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_engine(monkeypatch):
+    """TEST_DATABASE_URL (партиционированная snapshot из миграций); после теста таблицы очищаются."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = use_database(monkeypatch, TEST_DATABASE_URL)
+    yield engine
+    known_addresses.invalidate_known_addresses()
+    with db.get_session() as session:
+        tables = ", ".join(table.name for table in SQLModel.metadata.sorted_tables)
+        session.exec(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+        for _, name in snapshots.snapshot_partitions(session):
+            session.exec(text(f"DROP TABLE {name}"))
+        session.commit()
+    snapshots._known_partitions.clear()
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with db.get_session() as session:
+        yield session
+
+
+@pytest.fixture
+def pg_session(pg_engine):
+    with db.get_session() as session:
+        yield session
+
+
+def create_jetton(session, symbol="TEST", master_address="0:" + "ab" * 32):
+    jetton = Jetton(jetton_name=f"{symbol} Jetton", jetton_symbol=symbol, master_address=master_address,
+                    jetton_decimals=9)
+    session.add(jetton)
+    session.commit()
+    session.refresh(jetton)
+    return jetton
+
+
+@pytest.fixture
+def jetton(session):
+    return create_jetton(session)
@@ -0,0 +1,42 @@
+import pytest
+from src.ton_analyze.address_converter import TONAddressConverter
+
+RAW_ADDRESS = "0:779dcc815138d9500e449c5291e7f12738c23d575b5310000f6a253bd607384e"
+
+
+def test_crc16_xmodem_check_value():
+    # Контрольное значение CRC-16/XMODEM для "123456789"
+    assert TONAddressConverter.calcCRC(b"123456789") == bytes.fromhex("31c3")
+
+
+@pytest.mark.parametrize("raw_form", [RAW_ADDRESS, "-1:" + "0f" * 32, "0:" + "00" * 32])
+def test_friendly_forms_round_trip(raw_form):
+    forms = TONAddressConverter.account_forms(raw_form)
+    for kind in ("bounceable", "non_bounceable"):
+        for encoding in ("b64", "b64url"):
+            address = forms[kind][encoding]
+            assert len(address) == 48
+            assert TONAddressConverter.to_raw(address) == raw_form
+            assert TONAddressConverter.read_friendly_address(address)["given_type"] == f"friendly_{kind}"
+
+
+def test_test_only_flag_round_trip():
+    address = TONAddressConverter.account_forms(RAW_ADDRESS, test_only=True)["bounceable"]["b64url"]
+    forms = TONAddressConverter.read_friendly_address(address)
+    assert forms["test_only"] is True
+    assert forms["raw_form"] == RAW_ADDRESS
+
+
+def test_wrong_checksum_is_rejected():
+    address = TONAddressConverter.account_forms(RAW_ADDRESS)["bounceable"]["b64url"]
+    # Последние символы - CRC: меняем символ hash-части, CRC остается прежним
+    broken = address[:10] + ("A" if address[10] != "A" else "B") + address[11:]
+    with pytest.raises(ValueError, match="checksum"):
+        TONAddressConverter.to_raw(broken)
+
+
+def test_convert_many_keeps_order():
+    addresses = [RAW_ADDRESS, TONAddressConverter.account_forms("-1:" + "0f" * 32)["non_bounceable"]["b64"]]
+    assert [forms["raw_form"] for forms in TONAddressConverter.convert_many(addresses)] == [
+        RAW_ADDRESS, "-1:" + "0f" * 32,
+    ]
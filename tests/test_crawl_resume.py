@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from sqlmodel import func, select
+from src.ton_analyze import ton_get_data
+from src.ton_analyze.fake_tonapi import FAKE_JETTON_ADDRESS, FakeTonapi
+from src.ton_analyze.models.base import CrawlRun, HolderChange, JettonHolder, Snapshot
+from src.ton_analyze.rate_limiter import RateLimiter
+
+HOLDERS = 1000
+PAGE_SIZE = 100
+FAILING_OFFSET = 500
+
+
+class FailingTonapi(FakeTonapi):
+    """FakeTonapi, у которого страница fail_offset падает неповторяемой ошибкой."""
+
+    def __init__(self, fail_offset=None, **kwargs):
+        super().__init__(**kwargs)
+        get_holders = self.jettons.get_holders
+
+        async def failing_get_holders(account_id, limit=1000, offset=0):
+            if offset == fail_offset:
+                raise RuntimeError(f"injected failure at offset {offset}")
+            return await get_holders(account_id, limit=limit, offset=offset)
+
+        self.jettons.get_holders = failing_get_holders
+
+
+def crawl(tonapi):
+    jetton_info = asyncio.run(tonapi.jettons.get_info(account_id=FAKE_JETTON_ADDRESS))
+    # Один запрос за раз: страницы до сбоя записаны, после него - нет
+    limiter = RateLimiter(rate=10000, max_in_flight=1)
+    return asyncio.run(ton_get_data.stream_jetton_holders(tonapi, FAKE_JETTON_ADDRESS, jetton_info, limiter))
+
+
+def test_crawl_resumes_from_checkpoint_after_failure(session, monkeypatch):
+    monkeypatch.setattr(ton_get_data, "API_LIMIT", PAGE_SIZE)
+
+    with pytest.raises(RuntimeError, match="injected failure"):
+        crawl(FailingTonapi(fail_offset=FAILING_OFFSET, holders=HOLDERS, latency=0))
+    failed = session.exec(select(CrawlRun)).one()
+    assert failed.status == "failed"
+    assert failed.last_offset == FAILING_OFFSET
+    assert failed.holders_seen == FAILING_OFFSET
+
+    tonapi = FailingTonapi(holders=HOLDERS, latency=0)
+    assert crawl(tonapi) == HOLDERS - FAILING_OFFSET
+    # Повторный запуск продолжает тот же обход с чекпоинта и не запрашивает записанные страницы заново
+    assert tonapi.requests == 1 + (HOLDERS - FAILING_OFFSET) // PAGE_SIZE + 1
+    session.expire_all()
+    run = session.exec(select(CrawlRun)).one()
+    assert (run.id, run.status, run.holders_seen) == (failed.id, "completed", HOLDERS)
+
+    assert session.exec(select(func.count()).select_from(JettonHolder)).one() == HOLDERS
+    assert session.exec(select(func.count()).select_from(Snapshot)).one() == HOLDERS
+    assert session.exec(select(func.count()).select_from(HolderChange)).one() == HOLDERS
+    assert set(session.exec(select(JettonHolder.last_seen_run_id))) == {run.id}
@@ -0,0 +1,40 @@
+from datetime import datetime
+import os
+import pyarrow.dataset as ds
+from src.ton_analyze.crawl_runs import finish_run, start_or_resume_run
+from src.ton_analyze.export import export_snapshots, jetton_export_dir
+from src.ton_analyze.ingest import ingest_holders_batch
+
+HOLDERS = ["0:" + digit * 64 for digit in "123"]
+
+
+def crawl(session, jetton_id, balances, moment):
+    run_id = start_or_resume_run(session, jetton_id).id
+    ingest_holders_batch(session, jetton_id, list(zip(HOLDERS, [None] * len(balances), balances)), moment, run_id)
+    session.commit()
+    finish_run(session, run_id, "completed")
+
+
+def exported_ids(output_dir, jetton_id):
+    table = ds.dataset(jetton_export_dir(output_dir, jetton_id), format="parquet", partitioning="hive").to_table()
+    return sorted(table.column("snapshot_id").to_pylist())
+
+
+def test_full_export_replaces_files_without_duplicates(session, jetton, tmp_path):
+    output_dir = str(tmp_path / "exports")
+    crawl(session, jetton.id, [100, 200, 300], datetime(2026, 1, 1, 12))
+    assert export_snapshots(session, jetton.id, output_dir)[0] == 3
+    crawl(session, jetton.id, [100, 250, 300], datetime(2026, 1, 2, 12))
+    # Инкрементальная выгрузка дописывает только новый снимок
+    assert export_snapshots(session, jetton.id, output_dir)[0] == 1
+    assert exported_ids(output_dir, jetton.id) == [1, 2, 3, 4]
+
+    for _ in range(2):
+        exported, files = export_snapshots(session, jetton.id, output_dir, full=True)
+        assert exported == 4
+        assert all(os.path.exists(path) for path in files)
+        assert exported_ids(output_dir, jetton.id) == [1, 2, 3, 4]
+    # Служебные каталоги замены не остаются
+    assert sorted(os.listdir(output_dir)) == [f"jetton_id={jetton.id}"]
+    # После полной выгрузки отметка стоит на последнем снимке: инкрементальной выгрузке добавить нечего
+    assert export_snapshots(session, jetton.id, output_dir)[0] == 0
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+import asyncio
+from sqlmodel import select
+from src.ton_analyze import ton_get_data
+from src.ton_analyze.crawl_runs import finish_run, start_or_resume_run
+from src.ton_analyze.fake_tonapi import FAKE_JETTON_ADDRESS, FakeTonapi
+from src.ton_analyze.holder_changes import record_exits
+from src.ton_analyze.ingest import holder_to_row, ingest_holders_batch
+from src.ton_analyze.models.base import HolderChange, JettonHolder
+
+ALICE, BOB = ("0:" + digit * 64 for digit in "12")
+
+
+def crawl(session, jetton_id, rows, moment):
+    run_id = start_or_resume_run(session, jetton_id).id
+    ingest_holders_batch(session, jetton_id, rows, moment, run_id)
+    session.commit()
+    exited = record_exits(session, jetton_id, run_id, moment)
+    finish_run(session, run_id, "completed")
+    return run_id, exited
+
+
+def test_exit_needs_two_completed_crawls_without_the_holder(session, jetton):
+    moment = datetime(2026, 1, 1)
+    assert crawl(session, jetton.id, [(ALICE, None, 100), (BOB, None, 200)], moment)[1] == 0
+    # BOB выпал между страницами одного обхода - это еще не выход
+    assert crawl(session, jetton.id, [(ALICE, None, 100)], moment + timedelta(hours=1))[1] == 0
+    assert session.exec(select(JettonHolder.balance).where(JettonHolder.holder_address == BOB)).one() == 200
+
+    run_id, exited = crawl(session, jetton.id, [(ALICE, None, 100)], moment + timedelta(hours=2))
+    assert exited == 1
+    assert session.exec(select(JettonHolder.balance).where(JettonHolder.holder_address == BOB)).one() == 0
+    exit_change = session.exec(select(HolderChange).where(HolderChange.change_type == "exit")).one()
+    assert (exit_change.previous_balance, exit_change.delta, exit_change.run_id) == (200, -200, run_id)
+    # Повторный обход без BOB не создает второго выхода: баланс уже нулевой
+    assert crawl(session, jetton.id, [(ALICE, None, 100)], moment + timedelta(hours=3))[1] == 0
+
+
+def holders_page(tonapi):
+    return asyncio.run(tonapi.jettons.get_holders(FAKE_JETTON_ADDRESS, limit=tonapi.holders)).addresses
+
+
+def test_full_reload_does_not_turn_live_holders_into_exits(session):
+    before, after = FakeTonapi(holders=30, latency=0), FakeTonapi(holders=30, latency=0, top_balance=2 * 10 ** 8)
+    jetton_info = asyncio.run(before.jettons.get_info(account_id=FAKE_JETTON_ADDRESS))
+    jetton_id = ton_get_data.get_or_create_jetton(session, jetton_info).id
+    moment = datetime(2026, 1, 1)
+    crawl(session, jetton_id, [holder_to_row(holder) for holder in holders_page(before)], moment)
+
+    # Полная перезагрузка вне обхода меняет балансы всех холдеров
+    reloaded = holders_page(after)
+    asyncio.run(ton_get_data.process_jetton_holders(reloaded, jetton_info))
+    session.expire_all()
+    assert set(session.exec(select(JettonHolder.last_seen_run_id))) == {1}
+
+    rows = [holder_to_row(holder) for holder in reloaded]
+    # Последние холдеры выпали между страницами следующего обхода - они не вышли
+    assert crawl(session, jetton_id, rows[:-5], moment + timedelta(hours=1))[1] == 0
+    assert crawl(session, jetton_id, rows, moment + timedelta(hours=2))[1] == 0
+    assert session.exec(select(HolderChange).where(HolderChange.change_type == "exit")).all() == []
+    assert session.exec(select(JettonHolder).where(JettonHolder.balance == 0)).all() == []
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from sqlmodel import select
+from src.ton_analyze.crawl_runs import finish_run, start_or_resume_run
+from src.ton_analyze.ingest import ingest_holders_batch, plan_batch
+from src.ton_analyze.models.base import HolderChange, JettonHolder, Snapshot
+
+ALICE, BOB, CAROL = ("0:" + digit * 64 for digit in "123")
+
+
+def crawl(session, jetton_id, rows, moment):
+    run_id = start_or_resume_run(session, jetton_id).id
+    ingest_holders_batch(session, jetton_id, rows, moment, run_id)
+    session.commit()
+    finish_run(session, run_id, "completed")
+    return run_id
+
+
+def test_plan_batch_splits_new_changed_and_unchanged():
+    existing = {ALICE: (1, 100, None), BOB: (2, 200, None)}
+    rows = [(ALICE, None, 100), (BOB, None, 250), (CAROL, "Carol", 300)]
+    rows, changed_rows, unchanged_ids = plan_batch(rows, existing, run_id=None)
+    assert len(rows) == 3
+    assert changed_rows == [(BOB, None, 250), (CAROL, "Carol", 300)]
+    assert unchanged_ids == [1]
+
+
+def test_plan_batch_keeps_last_duplicate():
+    rows, changed_rows, _ = plan_batch([(BOB, None, 1), (ALICE, None, 5), (BOB, None, 2)], {}, run_id=None)
+    assert rows == [(BOB, None, 2), (ALICE, None, 5)]
+    assert changed_rows == rows
+
+
+def test_ingest_writes_only_balance_changes(session, jetton):
+    moment = datetime(2026, 1, 1)
+    crawl(session, jetton.id, [(ALICE, None, 100), (BOB, None, 200)], moment)
+    crawl(session, jetton.id, [(ALICE, None, 100), (BOB, None, 150)], moment + timedelta(hours=1))
+
+    assert session.exec(select(JettonHolder.holder_address, JettonHolder.balance)
+                        .order_by(JettonHolder.holder_address)).all() == [(ALICE, 100), (BOB, 150)]
+    # Снимок неизменившегося ALICE во втором обходе не пишется
+    assert len(session.exec(select(Snapshot)).all()) == 3
+    changes = session.exec(select(HolderChange.change_type, HolderChange.delta).order_by(HolderChange.id)).all()
+    assert changes == [("new", 100), ("new", 200), ("delta", -50)]
@@ -0,0 +1,15 @@
+from sqlmodel import select
+from src.ton_analyze.models.base import Jetton, JettonPrice
+from src.ton_analyze.prices import PriceCache, StubPriceProvider, current_price
+
+
+def test_current_price_does_not_commit_caller_session(session, jetton):
+    # Несохраненное изменение вызывающего кода
+    session.add(Jetton(jetton_name="Pending Jetton", jetton_symbol="PEND", jetton_decimals=9))
+
+    price = current_price(session, jetton, provider=StubPriceProvider(price=1.5), cache=PriceCache())
+    session.rollback()
+
+    assert price == 1.5
+    assert session.exec(select(JettonPrice.price_usd)).all() == [1.5]
+    assert session.exec(select(Jetton).where(Jetton.jetton_symbol == "PEND")).first() is None
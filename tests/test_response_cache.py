@@ -0,0 +1,65 @@
+import asyncio
+from src.telegram_bot.response_cache import ResponseCache
+
+
+def test_concurrent_requests_share_one_load():
+    async def scenario():
+        cache = ResponseCache()
+        loads = 0
+        release = asyncio.Event()
+
+        async def loader():
+            nonlocal loads
+            loads += 1
+            await release.wait()
+            return "top holders", {1}
+
+        requests = [asyncio.create_task(cache.get_or_load("top:1", loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*requests)
+        return loads, results, await cache.get_or_load("top:1", loader), cache
+
+    loads, results, cached, cache = asyncio.run(scenario())
+    assert loads == 1
+    assert sorted(source for _, source in results) == ["coalesced"] * 4 + ["miss"]
+    assert {value for value, _ in results} == {"top holders"}
+    assert cached == ("top holders", "hit")
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 4, 1)
+
+
+def test_invalidation_during_load_is_not_cached():
+    async def scenario():
+        cache = ResponseCache()
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_loader():
+            started.set()
+            await release.wait()
+            return "stale", {1}
+
+        async def fresh_loader():
+            return "fresh", {1}
+
+        pending = asyncio.create_task(cache.get_or_load("top:1", slow_loader))
+        # Загрузка уже читает данные, когда они меняются
+        await started.wait()
+        cache.invalidate(1)
+        # Новый запрос после инвалидации не ждет начатую до нее загрузку
+        fresh = await cache.get_or_load("top:1", fresh_loader)
+        release.set()
+        return await pending, fresh, cache.get("top:1")
+
+    stale, fresh, cached = asyncio.run(scenario())
+    assert stale == ("stale", "miss")
+    assert fresh == ("fresh", "miss")
+    assert cached == "fresh"
+
+
+def test_invalidate_drops_only_entries_of_the_jetton():
+    cache = ResponseCache()
+    cache.put("top:1", "one", {1})
+    cache.put("top:2", "two", {2})
+    cache.put("holder:x", "all jettons")
+    cache.invalidate(1)
+    assert (cache.get("top:1"), cache.get("top:2"), cache.get("holder:x")) == (None, "two", None)
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from sqlmodel import select
+from src.ton_analyze import ingest
+from src.ton_analyze.crawl_runs import checkpoint_run, finish_run, start_or_resume_run
+from src.ton_analyze.ingest import ingest_holders_batch, load_holder_state
+from src.ton_analyze.models.base import CrawlRun, HolderChange, JettonHolder, Snapshot
+from src.ton_analyze.shards import merge_shards, shard_ranges
+
+ALICE, BOB, CAROL = ("0:" + digit * 64 for digit in "123")
+
+
+def ingest_shard(session, jetton_id, rows, moment, run_id):
+    written, balance_changes = ingest_holders_batch(session, jetton_id, rows, moment, run_id)
+    checkpoint_run(session, run_id, None, written, balance_changes)
+    session.commit()
+    return written, balance_changes
+
+
+def previous_crawl(session, jetton_id, moment):
+    run_id = start_or_resume_run(session, jetton_id).id
+    ingest_shard(session, jetton_id, [(ALICE, None, 100), (BOB, None, 200)], moment, run_id)
+    finish_run(session, run_id, "completed")
+
+
+def test_shard_ranges_leave_the_tail_to_the_last_shard():
+    assert shard_ranges(1000, 100, 3) == [(0, 400), (400, 800), (800, None)]
+    assert shard_ranges(0, 100, 4) == [(0, None)]
+
+
+def test_holder_written_by_another_shard_is_skipped(session, jetton):
+    moment = datetime(2026, 1, 1)
+    previous_crawl(session, jetton.id, moment)
+
+    run_id = start_or_resume_run(session, jetton.id).id
+    assert ingest_shard(session, jetton.id, [(ALICE, None, 110), (BOB, None, 200)], moment + timedelta(hours=1),
+                        run_id) == (2, 1)
+    # BOB сдвинулся на границу шардов: второй шард читает его уже после записи первого
+    assert ingest_shard(session, jetton.id, [(BOB, None, 200), (CAROL, None, 5)], moment + timedelta(hours=1),
+                        run_id) == (1, 1)
+
+    run = session.get(CrawlRun, run_id)
+    session.refresh(run)
+    assert (run.holders_seen, run.balance_changes) == (3, 2)
+
+
+def test_merge_shards_removes_duplicates_and_fixes_counters(session, jetton, monkeypatch):
+    moment = datetime(2026, 1, 1)
+    previous_crawl(session, jetton.id, moment)
+
+    run_id = start_or_resume_run(session, jetton.id).id
+    crawl_moment = moment + timedelta(hours=1)
+    # Оба шарда прочитали прежнее состояние BOB до записи другого
+    stale_state = load_holder_state(session, jetton.id, [BOB])
+    ingest_shard(session, jetton.id, [(BOB, None, 250)], crawl_moment, run_id)
+    monkeypatch.setattr(ingest, "load_holder_state", lambda *args: stale_state)
+    ingest_shard(session, jetton.id, [(BOB, None, 300)], crawl_moment, run_id)
+
+    assert merge_shards(session, jetton.id, run_id, crawl_moment) == 2
+    session.commit()
+
+    bob_id = session.exec(select(JettonHolder.id).where(JettonHolder.holder_address == BOB)).one()
+    assert session.exec(select(Snapshot.balance).where(
+        Snapshot.jetton_holder_id == bob_id, Snapshot.snapshot_date == crawl_moment
+    )).all() == [300]
+    changes = session.exec(select(HolderChange.previous_balance, HolderChange.balance, HolderChange.delta)
+                           .where(HolderChange.run_id == run_id)).all()
+    assert changes == [(200, 300, 100)]
+    run = session.get(CrawlRun, run_id)
+    session.refresh(run)
+    assert (run.holders_seen, run.balance_changes) == (1, 1)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import func, select
+from src.ton_analyze import snapshots
+from src.ton_analyze.ingest import ingest_holders_batch
+from src.ton_analyze.models.base import JettonHolder, Snapshot, SnapshotDaily
+from src.ton_analyze.snapshots import balances_as_of, compact_snapshot_partitions, ensure_snapshot_partition
+from tests.conftest import create_jetton
+
+ALICE, BOB = ("0:" + digit * 64 for digit in "12")
+
+
+def ingest(session, jetton_id, rows, moment):
+    ingest_holders_batch(session, jetton_id, rows, moment)
+    session.commit()
+
+
+def test_balances_as_of_combines_deltas_and_daily_rollups(session, jetton):
+    day = datetime(2026, 1, 1, 12)
+    ingest(session, jetton.id, [(ALICE, None, 100), (BOB, None, 200)], day)
+    ingest(session, jetton.id, [(ALICE, None, 150), (BOB, None, 0)], day + timedelta(days=1))
+    # Свернутый день раньше сырых дельт
+    alice_id = session.exec(select(JettonHolder.id).where(JettonHolder.holder_address == ALICE)).one()
+    session.add(SnapshotDaily(jetton_holder_id=alice_id, snapshot_day=(day - timedelta(days=5)).date(),
+                              snapshot_date=day - timedelta(days=5), balance=50))
+    session.commit()
+
+    assert balances_as_of(session, jetton.id, day - timedelta(days=1)) == {ALICE: 50}
+    assert balances_as_of(session, jetton.id, day) == {ALICE: 100, BOB: 200}
+    # Нулевой баланс - холдер вышел
+    assert balances_as_of(session, jetton.id, day + timedelta(days=2)) == {ALICE: 150}
+
+
+def test_failed_partition_ddl_is_raised_and_retried(session, monkeypatch):
+    monkeypatch.setattr(snapshots, "is_partitioned", lambda session: True)
+    moment = datetime(2026, 1, 1)
+    # SQLite не знает PARTITION OF: ошибка DDL, не связанная с уже созданной партицией
+    for _ in range(2):
+        with pytest.raises(DBAPIError):
+            ensure_snapshot_partition(session, moment)
+    assert moment.date() not in snapshots._known_partitions
+
+
+def test_partition_created_concurrently_is_not_an_error(pg_session, monkeypatch):
+    moment = datetime.now(timezone.utc)
+    ensure_snapshot_partition(pg_session, moment)
+    snapshots._known_partitions.clear()
+    # Без IF NOT EXISTS: так выглядит партиция, созданная другим процессом между проверкой и DDL
+    create_ddl = snapshots.partition_ddl
+    monkeypatch.setattr(snapshots, "partition_ddl", lambda day: text(create_ddl(day).text.replace(" IF NOT EXISTS", "")))
+    ensure_snapshot_partition(pg_session, moment)
+    assert moment.date() in snapshots._known_partitions
+
+
+def test_overlapping_partition_is_an_error(pg_session, monkeypatch):
+    moment = datetime.now(timezone.utc)
+    ensure_snapshot_partition(pg_session, moment)
+    snapshots._known_partitions.clear()
+    monkeypatch.setattr(snapshots, "partition_name", lambda day: f"snapshot_overlap_{day:%Y%m%d}")
+    with pytest.raises(DBAPIError):
+        ensure_snapshot_partition(pg_session, moment)
+    assert moment.date() not in snapshots._known_partitions
+
+
+def test_compaction_keeps_last_balance_of_the_day(pg_session):
+    jetton = create_jetton(pg_session)
+    old_day = datetime.now(timezone.utc).replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=40)
+    ingest(pg_session, jetton.id, [(ALICE, None, 100), (BOB, None, 200)], old_day)
+    ingest(pg_session, jetton.id, [(ALICE, None, 120)], old_day + timedelta(hours=8))
+    recent = datetime.now(timezone.utc) - timedelta(hours=1)
+    ingest(pg_session, jetton.id, [(BOB, None, 50)], recent)
+    before = balances_as_of(pg_session, jetton.id, datetime.now(timezone.utc))
+
+    assert compact_snapshot_partitions(pg_session, older_than_days=30) == 1
+    assert old_day.date() not in dict(snapshots.snapshot_partitions(pg_session))
+    daily = pg_session.exec(select(SnapshotDaily.balance).order_by(SnapshotDaily.balance)).all()
+    assert daily == [120, 200]
+    assert pg_session.exec(select(func.count()).select_from(Snapshot)).one() == 1
+    # Балансы восстанавливаются так же, для свернутого дня - на его конец
+    assert balances_as_of(pg_session, jetton.id, datetime.now(timezone.utc)) == before == {ALICE: 120, BOB: 50}
+    assert balances_as_of(pg_session, jetton.id, old_day + timedelta(hours=12)) == {ALICE: 120, BOB: 200}
@@ -0,0 +1,37 @@
+from src.telegram_bot.telegram_bot import resolve_jetton, top_reply
+from src.ton_analyze.address_converter import TONAddressConverter
+from src.ton_analyze.models.base import Jetton
+
+
+def add_jetton(session, symbol, master_address, name=None):
+    jetton = Jetton(jetton_name=name or f"{symbol} Jetton", jetton_symbol=symbol, master_address=master_address,
+                    jetton_decimals=9)
+    session.add(jetton)
+    session.commit()
+    session.refresh(jetton)
+    return jetton
+
+
+def test_hex_like_symbol_is_looked_up_as_symbol(session):
+    ace = add_jetton(session, "ACE", "0:" + "ac" * 32)
+    assert resolve_jetton(session, "ace") == (ace, None)
+    assert resolve_jetton(session, "CAFE") == (None, ("Jetton CAFE not found", None))
+
+
+def test_master_address_in_any_form(session):
+    jetton = add_jetton(session, "TEST", "0:" + "ab" * 32)
+    friendly = TONAddressConverter.account_forms(jetton.master_address)["non_bounceable"]["b64url"]
+    assert resolve_jetton(session, friendly) == (jetton, None)
+    assert resolve_jetton(session, jetton.master_address) == (jetton, None)
+
+
+def test_shared_symbol_lists_candidates(session):
+    first = add_jetton(session, "USDT", "0:" + "11" * 32, "Tether USD")
+    second = add_jetton(session, "USDT", "0:" + "22" * 32, "Fake USDT")
+    text, tags = top_reply(session, "usdt", 10)
+    assert tags is None
+    assert text.startswith("Several jettons have symbol usdt")
+    for jetton in (first, second):
+        assert TONAddressConverter.account_forms(jetton.master_address)["bounceable"]["b64url"] in text
+    # По адресу мастер-контракта жетон находится однозначно
+    assert resolve_jetton(session, second.master_address) == (second, None)